@@ -20,11 +20,19 @@ Change Log  :
 """
 
 import time
+import queue
+import base64
 import random
+import threading
 
-from gmssl import sm3, func
+from contextlib import contextmanager
+from dylr.util import sm3_utils
 from typing import Union, Callable, List, Dict
 
+_STANDARD_BASE64_ALPHABET = (
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+)
+
 
 class StringProcessor:
     """
@@ -146,31 +154,31 @@ class StringProcessor:
         return (val % 0x100000000) >> n
 
     @staticmethod
-    def generate_random_bytes(length: int = 3) -> str:
+    def generate_random_bytes(length: int = 3, rng=random) -> bytes:
         """
-        生成一组伪随机字节字符串，用于混淆数据 (Generate a pseudo-random byte string to obfuscate the data).
+        生成一组伪随机字节，用于混淆数据 (Generate pseudo-random bytes to obfuscate the data).
 
         Args:
             length (int): 生成的字节序列长度 (Length of the byte sequence to generate).
+            rng: 随机数来源，需要提供 random() 方法 (Random source providing random()).
 
         Returns:
-            str: 生成的伪随机字节字符串 (Generated pseudo-random byte string).
+            bytes: 生成的伪随机字节 (Generated pseudo-random bytes).
         """
-
-        def generate_byte_sequence() -> List[str]:
-            _rd = int(random.random() * 10000)
-            return [
-                chr(((_rd & 255) & 170) | 1),
-                chr(((_rd & 255) & 85) | 2),
-                chr((StringProcessor.js_shift_right(_rd, 8) & 170) | 5),
-                chr((StringProcessor.js_shift_right(_rd, 8) & 85) | 40),
-            ]
-
-        result = []
+        result = bytearray()
         for _ in range(length):
-            result.extend(generate_byte_sequence())
-
-        return "".join(result)
+            _rd = int(rng.random() * 10000)
+            low = _rd & 255
+            high = (_rd >> 8) & 255
+            result += bytes(
+                (
+                    (low & 170) | 1,
+                    (low & 85) | 2,
+                    (high & 170) | 5,
+                    (high & 85) | 40,
+                )
+            )
+        return bytes(result)
 
 
 class CryptoUtility:
@@ -194,16 +202,16 @@ class CryptoUtility:
         params_to_array(param: Union[str, List[int]], add_salt: bool = True) -> List[int]:
             获取输入参数的哈希数组。
 
-        transform_bytes(bytes_list: List[int]) -> str:
-            对输入的字节列表进行加密/解密操作，返回处理后的字符串。
+        transform_bytes(bytes_list: Union[bytes, List[int]]) -> List[int]:
+            对输入的字节列表进行加密/解密操作，返回处理后的整数列表。
 
-        base64_encode(input_string: str, selected_alphabet: int = 0) -> str:
+        base64_encode(input_string: Union[str, bytes], selected_alphabet: int = 0) -> str:
             使用自定义字符表对输入字符串进行 Base64 编码。
 
-        abogus_encode(abogus_bytes_str: str, selected_alphabet: int) -> str:
+        abogus_encode(abogus_bytes_str: Union[str, bytes, List[int]], selected_alphabet: int) -> str:
             对输入的字节字符串进行自定义 Base64 编码，并添加位移和填充。
 
-        rc4_encrypt(key: bytes, plaintext: str) -> bytes:
+        rc4_encrypt(key: bytes, plaintext: Union[str, bytes]) -> bytes:
             使用 RC4 算法加密数据。
 
     使用示例:
@@ -251,6 +259,11 @@ class CryptoUtility:
         """
         self.salt = salt
         self.base64_alphabet = custom_base64_alphabet
+        # 标准 Base64 字符表到各自定义字符表的转换表，编码时先用 base64 模块编码再转换字符
+        self.base64_tables = [
+            bytes.maketrans(_STANDARD_BASE64_ALPHABET, alphabet.encode("ascii"))
+            for alphabet in custom_base64_alphabet
+        ]
 
         # fmt: off
         self.big_array = [
@@ -269,6 +282,7 @@ class CryptoUtility:
               9,  94, 179, 107,  35,   7, 142, 131, 239, 203, 149, 136,  61, 249,  14, 156
         ]
         # fmt: on
+        self.big_array_bytes = bytes(self.big_array)
 
     @staticmethod
     def sm3_to_array(input_data: Union[str, List[int]]) -> List[int]:
@@ -287,11 +301,8 @@ class CryptoUtility:
         else:
             input_data_bytes = bytes(input_data)  # 将 List[int] 转换为字节数组
 
-        # 将字节数组转换为适合 sm3.sm3_hash 函数处理的列表格式
-        hex_result = sm3.sm3_hash(func.bytes_to_list(input_data_bytes))
-
-        # 将十六进制字符串结果转换为十进制整数列表
-        return [int(hex_result[i : i + 2], 16) for i in range(0, len(hex_result), 2)]
+        # 直接对字节数组计算摘要，摘要的每个字节即为结果中的整数
+        return list(sm3_utils.sm3_digest(input_data_bytes))
 
     def add_salt(self, param: str) -> str:
         """
@@ -338,147 +349,133 @@ class CryptoUtility:
         processed_param = self.process_param(param, add_salt)
         return self.sm3_to_array(processed_param)
 
-    def transform_bytes(self, bytes_list: List[int]) -> str:
+    def transform_bytes(self, bytes_list: Union[bytes, List[int]]) -> List[int]:
         """
-        对输入的字节列表进行加密/解密操作，返回处理后的字符串 (Encrypt/decrypt the input byte list and return the processed string).
+        对输入的字节列表进行加密/解密操作，返回处理后的整数列表 (Encrypt/decrypt the input byte list and return the processed integers).
+        输入中的时间戳高位可能大于 255，异或后仍大于 255，因此结果不一定能放入 bytes。
 
         Args:
-            bytes_list (List[int]): 输入的字节列表 (Input byte list).
+            bytes_list (Union[bytes, List[int]]): 输入的字节列表 (Input byte list).
 
         Returns:
-            str: 处理后的字符串 (Processed string).
-        """
-        # 将字节列表转换为字符字符串
-        bytes_str = StringProcessor.to_char_str(bytes_list)
-        result_str = []
-        index_b = self.big_array[1]
-        initial_value = 0
-
-        for index, char in enumerate(bytes_str):
-            if index == 0:
-                initial_value = self.big_array[index_b]
-                sum_initial = index_b + initial_value
-
-                self.big_array[1] = initial_value
-                self.big_array[index_b] = index_b
-            else:
+            List[int]: 处理后的整数列表 (Processed integers).
+        """
+        # 每次都从初始状态的副本开始，不修改 self.big_array，使同一实例可以重复使用且线程安全
+        # big_array 长度为 256，取模均可用 & 255 代替
+        big_array = bytearray(self.big_array_bytes)
+        result = [0] * len(bytes_list)
+        index_b = big_array[1]
+        initial_value = big_array[index_b]
+        sum_initial = index_b + initial_value
+        big_array[1] = initial_value
+        big_array[index_b] = index_b
+
+        for index, char_value in enumerate(bytes_list):
+            if index:
                 sum_initial = initial_value + value_e
-
-            char_value = ord(char)
-            sum_initial %= len(self.big_array)
-            value_f = self.big_array[sum_initial]
-            encrypted_char = char_value ^ value_f
-            result_str.append(chr(encrypted_char))
+            result[index] = char_value ^ big_array[sum_initial & 255]
 
             # 交换数组元素
-            value_e = self.big_array[(index + 2) % len(self.big_array)]
-            sum_initial = (index_b + value_e) % len(self.big_array)
-            initial_value = self.big_array[sum_initial]
-            self.big_array[sum_initial] = self.big_array[
-                (index + 2) % len(self.big_array)
-            ]
-            self.big_array[(index + 2) % len(self.big_array)] = initial_value
+            index_c = (index + 2) & 255
+            value_e = big_array[index_c]
+            sum_initial = (index_b + value_e) & 255
+            initial_value = big_array[sum_initial]
+            big_array[sum_initial] = value_e
+            big_array[index_c] = initial_value
             index_b = sum_initial
 
-        return "".join(result_str)
+        return result
 
-    def base64_encode(self, input_string: str, selected_alphabet: int = 0) -> str:
+    def base64_encode(self, input_string: Union[str, bytes], selected_alphabet: int = 0) -> str:
         """
         使用自定义字符表对输入字符串进行 Base64 编码 (Encode the input string using a custom Base64 alphabet).
 
         Args:
-            input_string (str): 输入字符串 (Input string).
+            input_string (Union[str, bytes]): 输入字符串，字符串中每个字符视为一个字节 (Input string, one byte per character).
             selected_alphabet (int): 选择的自定义 Base64 字符表索引 (Selected custom Base64 alphabet index).
 
         Returns:
             str: 编码后的字符串 (Encoded string).
         """
-
-        # 将输入字符串转换为ASCII码的二进制形式
-        binary_string = "".join(["{:08b}".format(ord(char)) for char in input_string])
-
-        # 补全二进制字符串使其长度为6的倍数
-        padding_length = (6 - len(binary_string) % 6) % 6
-        binary_string += "0" * padding_length
-
-        # 将二进制字符串分割为6位一组
-        base64_indices = [
-            int(binary_string[i : i + 6], 2) for i in range(0, len(binary_string), 6)
-        ]
-
-        # 根据自定义字符表生成输出字符串
-        output_string = "".join(
-            [self.base64_alphabet[selected_alphabet][index] for index in base64_indices]
+        if isinstance(input_string, str):
+            input_string = input_string.encode("latin-1")
+        return (
+            base64.b64encode(input_string)
+            .translate(self.base64_tables[selected_alphabet])
+            .decode("ascii")
         )
 
-        # 添加等号填充，使符合 Base64 编码规范
-        output_string += "=" * (padding_length // 2)
-
-        return output_string
-
-    def abogus_encode(self, abogus_bytes_str: str, selected_alphabet: int) -> str:
+    def abogus_encode(self, abogus_bytes_str: Union[str, bytes, List[int]], selected_alphabet: int) -> str:
         """
         对输入的字节字符串进行自定义 Base64 编码，并添加位移和填充 (Encode the input byte string using a custom Base64 alphabet, and add shifts and padding).
+        每 3 个值编码为 4 个字符，不足 3 个值的部分补 = 。值都不超过 255 时与标准 Base64 一致，
+        超过 255 时按原算法的位移和掩码处理，高位会被丢弃或与相邻值重叠。
 
         Args:
-            abogus_bytes_str (str): 输入的字节字符串 (Input byte string).
+            abogus_bytes_str (Union[str, bytes, List[int]]): 输入的字节字符串或整数列表 (Input byte string or integers).
             selected_alphabet (int): 选择的自定义 Base64 字符表索引 (Selected custom Base64 alphabet index).
 
         Returns:
             str: 编码后的字符串 (Encoded string).
         """
-        abogus = []
-
-        for i in range(0, len(abogus_bytes_str), 3):
-            if i + 2 < len(abogus_bytes_str):
-                n = (
-                    (ord(abogus_bytes_str[i]) << 16)
-                    | (ord(abogus_bytes_str[i + 1]) << 8)
-                    | ord(abogus_bytes_str[i + 2])
-                )
-            elif i + 1 < len(abogus_bytes_str):
-                n = (ord(abogus_bytes_str[i]) << 16) | (
-                    ord(abogus_bytes_str[i + 1]) << 8
-                )
-            else:
-                n = ord(abogus_bytes_str[i]) << 16
-
-            for j, k in zip(range(18, -1, -6), (0xFC0000, 0x03F000, 0x0FC0, 0x3F)):
-                if j == 6 and i + 1 >= len(abogus_bytes_str):
-                    break
-                if j == 0 and i + 2 >= len(abogus_bytes_str):
-                    break
-                abogus.append(self.base64_alphabet[selected_alphabet][(n & k) >> j])
+        if isinstance(abogus_bytes_str, str):
+            abogus_bytes_str = [ord(char) for char in abogus_bytes_str]
+        if isinstance(abogus_bytes_str, bytes) or max(abogus_bytes_str, default=0) < 256:
+            return self.base64_encode(bytes(abogus_bytes_str), selected_alphabet)
 
-        abogus.append("=" * ((4 - len(abogus) % 4) % 4))
+        alphabet = self.base64_alphabet[selected_alphabet]
+        values = abogus_bytes_str
+        length = len(values)
+        full_length = length - length % 3
+        abogus = []
+        for i in range(0, full_length, 3):
+            n = (values[i] << 16) | (values[i + 1] << 8) | values[i + 2]
+            abogus.append(alphabet[(n & 0xFC0000) >> 18])
+            abogus.append(alphabet[(n & 0x03F000) >> 12])
+            abogus.append(alphabet[(n & 0x0FC0) >> 6])
+            abogus.append(alphabet[n & 0x3F])
+
+        if length - full_length == 1:
+            n = values[full_length] << 16
+            abogus.append(alphabet[(n & 0xFC0000) >> 18])
+            abogus.append(alphabet[(n & 0x03F000) >> 12])
+            abogus.append("==")
+        elif length - full_length == 2:
+            n = (values[full_length] << 16) | (values[full_length + 1] << 8)
+            abogus.append(alphabet[(n & 0xFC0000) >> 18])
+            abogus.append(alphabet[(n & 0x03F000) >> 12])
+            abogus.append(alphabet[(n & 0x0FC0) >> 6])
+            abogus.append("=")
         return "".join(abogus)
 
     @staticmethod
-    def rc4_encrypt(key: bytes, plaintext: str) -> bytes:
+    def rc4_encrypt(key: bytes, plaintext: Union[str, bytes]) -> bytes:
         """
         使用 RC4 算法加密数据 (Encrypt data using the RC4 algorithm).
 
         Args:
             key (bytes): 加密密钥 (Encryption key).
-            plaintext (str): 明文数据 (Plaintext data).
+            plaintext (Union[str, bytes]): 明文数据，字符串中每个字符视为一个字节 (Plaintext data, one byte per character).
 
         Returns:
             bytes: 加密后的数据 (Encrypted data).
         """
-        S = list(range(256))
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode("latin-1")
+        S = bytearray(range(256))
         j = 0
+        key_length = len(key)
         for i in range(256):
-            j = (j + S[i] + key[i % len(key)]) % 256
+            j = (j + S[i] + key[i % key_length]) & 255
             S[i], S[j] = S[j], S[i]
 
         i = j = 0
-        ciphertext = []
-        for char in plaintext:
-            i = (i + 1) % 256
-            j = (j + S[i]) % 256
+        ciphertext = bytearray(len(plaintext))
+        for index, char in enumerate(plaintext):
+            i = (i + 1) & 255
+            j = (j + S[i]) & 255
             S[i], S[j] = S[j], S[i]
-            K = S[(S[i] + S[j]) % 256]
-            ciphertext.append(ord(char) ^ K)
+            ciphertext[index] = char ^ S[(S[i] + S[j]) & 255]
 
         return bytes(ciphertext)
 
@@ -517,12 +514,13 @@ class BrowserFingerprintGenerator:
     """
 
     @classmethod
-    def generate_fingerprint(cls, browser_type: str = "Edge") -> str:
+    def generate_fingerprint(cls, browser_type: str = "Edge", rng=random) -> str:
         """
         根据指定的浏览器类型生成浏览器指纹。 (Generate a browser fingerprint based on the specified browser type.)
 
         Args:
             browser_type (str): 浏览器类型 (Browser type).
+            rng: 随机数来源，需要提供 randint() 和 choice() 方法 (Random source).
 
         Returns:
             str: 生成的浏览器指纹字符串 (Generated browser fingerprint string).
@@ -533,45 +531,46 @@ class BrowserFingerprintGenerator:
             "Safari": cls.generate_safari_fingerprint,
             "Edge": cls.generate_edge_fingerprint,
         }
-        return cls.browsers.get(browser_type, cls.generate_chrome_fingerprint)()
+        return cls.browsers.get(browser_type, cls.generate_chrome_fingerprint)(rng)
 
     @classmethod
-    def generate_chrome_fingerprint(cls) -> str:
-        return cls._generate_fingerprint(platform="Win32")
+    def generate_chrome_fingerprint(cls, rng=random) -> str:
+        return cls._generate_fingerprint(platform="Win32", rng=rng)
 
     @classmethod
-    def generate_firefox_fingerprint(cls) -> str:
-        return cls._generate_fingerprint(platform="Win32")
+    def generate_firefox_fingerprint(cls, rng=random) -> str:
+        return cls._generate_fingerprint(platform="Win32", rng=rng)
 
     @classmethod
-    def generate_safari_fingerprint(cls) -> str:
-        return cls._generate_fingerprint(platform="MacIntel")
+    def generate_safari_fingerprint(cls, rng=random) -> str:
+        return cls._generate_fingerprint(platform="MacIntel", rng=rng)
 
     @classmethod
-    def generate_edge_fingerprint(cls) -> str:
-        return cls._generate_fingerprint(platform="Win32")
+    def generate_edge_fingerprint(cls, rng=random) -> str:
+        return cls._generate_fingerprint(platform="Win32", rng=rng)
 
     @staticmethod
-    def _generate_fingerprint(platform: str) -> str:
+    def _generate_fingerprint(platform: str, rng=random) -> str:
         """
         根据给定的参数生成浏览器指纹字符串。 (Generate a browser fingerprint string based on the given parameters.)
 
         Args:
             platform (str): 操作系统平台 (Operating system platform).
+            rng: 随机数来源 (Random source).
 
         Returns:
             str: 生成的浏览器指纹字符串 (Generated browser fingerprint string).
         """
-        inner_width = random.randint(1024, 1920)
-        inner_height = random.randint(768, 1080)
-        outer_width = inner_width + random.randint(24, 32)
-        outer_height = inner_height + random.randint(75, 90)
+        inner_width = rng.randint(1024, 1920)
+        inner_height = rng.randint(768, 1080)
+        outer_width = inner_width + rng.randint(24, 32)
+        outer_height = inner_height + rng.randint(75, 90)
         screen_x = 0
-        screen_y = random.choice([0, 30])
-        size_width = random.randint(1024, 1920)
-        size_height = random.randint(768, 1080)
-        avail_width = random.randint(1280, 1920)
-        avail_height = random.randint(800, 1080)
+        screen_y = rng.choice([0, 30])
+        size_width = rng.randint(1024, 1920)
+        size_height = rng.randint(768, 1080)
+        avail_width = rng.randint(1280, 1920)
+        avail_height = rng.randint(800, 1080)
 
         fingerprint = (
             f"{inner_width}|{inner_height}|{outer_width}|{outer_height}|"
@@ -628,7 +627,19 @@ class ABogus:
         fp: str = "",
         user_agent: str = "",
         options: List[int] = [0, 1, 14],
+        clock: Callable[[], float] = None,
+        rng=None,
     ):
+        """
+        Args:
+            fp (str): 自定义浏览器指纹，为空则随机生成 (Custom browser fingerprint).
+            user_agent (str): 自定义 UA，为空则使用默认 UA (Custom User-Agent).
+            options (List[int]): 请求选项 (Request options).
+            clock (Callable[[], float]): 时间来源，返回秒级时间戳，默认 time.time (Clock, defaults to time.time).
+            rng: 随机数来源，默认 random 模块，传入固定种子的 random.Random 可使结果可复现 (Random source, defaults to the random module).
+        """
+        self.clock = clock if clock is not None else time.time
+        self.rng = rng if rng is not None else random
         self.aid = 6383
         self.pageId = 0  # 1.0.1.19 ->  6241
         self.salt = "cus"  # 1.0.1.19 -> 加密盐 # dhzx
@@ -671,9 +682,20 @@ class ABogus:
         self.browser_fp = (
             fp
             if fp is not None and fp != ""
-            else BrowserFingerprintGenerator.generate_fingerprint("Edge")
+            else BrowserFingerprintGenerator.generate_fingerprint("Edge", self.rng)
         )  # 自定义浏览器指纹，为空则生成Edge指纹
 
+        # 与请求无关的部分只需计算一次：UA 加密结果、空请求体的哈希、浏览器指纹的 ASCII 码列表
+        self.array3 = self.crypto_utility.params_to_array(
+            self.crypto_utility.base64_encode(
+                self.crypto_utility.rc4_encrypt(self.ua_key, self.user_agent),
+                1,
+            ),
+            add_salt=False,
+        )
+        self.empty_body_array = self.body_to_array("")
+        self.browser_fp_array = StringProcessor.to_char_array(self.browser_fp)
+
         # fmt: off
         self.sort_index = [
             18, 20, 52, 26, 30, 34, 58, 38, 40, 53, 42, 21, 27, 54, 55, 31, 35, 57, 39, 41, 43, 22, 28,
@@ -698,6 +720,20 @@ class ABogus:
         """
         return self.crypto_utility.abogus_encode(data, alphabet_index)
 
+    def body_to_array(self, data: str) -> List[int]:
+        """
+        对请求参数或请求体进行两次加盐 SM3 哈希 (Hash the request params or body twice with salt).
+
+        Args:
+            data (str): 请求参数或请求体 (Request params or body).
+
+        Returns:
+            List[int]: 哈希数组 (Hash array).
+        """
+        return self.crypto_utility.params_to_array(
+            self.crypto_utility.params_to_array(data)
+        )
+
     def generate_abogus(self, params: str, body: str = "") -> tuple:
         """
         生成 abogus 参数 (Generate the ABogus parameter).
@@ -730,27 +766,15 @@ class ABogus:
         }
 
         # 开始加密时间
-        start_encryption = int(time.time() * 1000)
+        start_encryption = int(self.clock() * 1000)
 
         # params参数加盐加密
-        array1 = self.crypto_utility.params_to_array(
-            self.crypto_utility.params_to_array(params)
-        )
-        array2 = self.crypto_utility.params_to_array(
-            self.crypto_utility.params_to_array(body)
-        )
-        array3 = self.crypto_utility.params_to_array(
-            self.crypto_utility.base64_encode(
-                StringProcessor.to_ord_str(
-                    self.crypto_utility.rc4_encrypt(self.ua_key, self.user_agent)
-                ),
-                1,
-            ),
-            add_salt=False,
-        )
+        array1 = self.body_to_array(params)
+        array2 = self.empty_body_array if body == "" else self.body_to_array(body)
+        array3 = self.array3
 
         # 结束加密时间
-        end_encryption = int(time.time() * 1000)
+        end_encryption = int(self.clock() * 1000)
 
         # 插入加密开始时间
         ab_dir[20] = (start_encryption >> 24) & 255
@@ -816,8 +840,8 @@ class ABogus:
         # 获取 ab_dir 中 sort_index 的值
         sorted_values = [ab_dir.get(i, 0) for i in self.sort_index]
 
-        # 将浏览器指纹转换为 ASCII 码列表
-        edge_fp_array = StringProcessor.to_char_array(self.browser_fp)
+        # 浏览器指纹的 ASCII 码列表
+        edge_fp_array = self.browser_fp_array
 
         # 将浏览器指纹长度的低 8 位作为异或值
         ab_xor = (len(self.browser_fp) & 255) >> 8 & 255
@@ -831,16 +855,94 @@ class ABogus:
         sorted_values.extend(edge_fp_array)
         sorted_values.append(ab_xor)
 
-        abogus_bytes_str = (
-            StringProcessor.generate_random_bytes()
-            + self.crypto_utility.transform_bytes(sorted_values)
-        )
+        abogus_bytes = list(
+            StringProcessor.generate_random_bytes(rng=self.rng)
+        ) + self.crypto_utility.transform_bytes(sorted_values)
 
-        abogus = self.crypto_utility.abogus_encode(abogus_bytes_str, 0)
+        abogus = self.crypto_utility.abogus_encode(abogus_bytes, 0)
         params = "%s&a_bogus=%s" % (params, abogus)
         return (params, abogus, self.user_agent, body)
 
+    def generate_abogus_batch(self, params_list: List[str], body: str = "") -> List[tuple]:
+        """
+        批量生成 abogus 参数，所有请求共用同一个 UA、浏览器指纹和请求体 (Generate ABogus parameters in batch).
 
+        Args:
+            params_list (List[str]): 请求参数列表 (List of request parameters).
+            body (str): 请求体，GET接口则为空 (Request body, empty for GET interfaces).
+
+        Returns:
+            List[tuple]: 与 params_list 一一对应的 generate_abogus 返回值 (Results of generate_abogus, in order).
+        """
+        return [self.generate_abogus(params, body) for params in params_list]
+
+
+class ABogusPool:
+    """
+    ABogusPool 为同一个 UA 缓存多个 ABogus 实例，供多个线程同时取用。
+    每个实例在创建时完成 UA、浏览器指纹等与请求无关部分的计算，之后每次签名只需计算请求参数相关的部分。
+
+    使用示例:
+    ```python
+        pool = get_abogus_pool(user_agent)
+        with pool.signer() as abogus:
+            signed_params = abogus.generate_abogus(params)[0]
+    ```
+    """
+
+    def __init__(self, user_agent: str = "", size: int = 16):
+        """
+        Args:
+            user_agent (str): 自定义 UA (Custom User-Agent).
+            size (int): 最多缓存的空闲实例数，取用时没有空闲实例则新建 (Maximum number of idle signers kept).
+        """
+        self.user_agent = user_agent
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def signer(self):
+        """
+        取出一个空闲的 ABogus 实例，用完后放回池中 (Borrow an idle ABogus instance and return it after use).
+        """
+        try:
+            abogus = self._idle.get_nowait()
+        except queue.Empty:
+            abogus = ABogus(user_agent=self.user_agent)
+        try:
+            yield abogus
+        finally:
+            try:
+                self._idle.put_nowait(abogus)
+            except queue.Full:
+                pass
+
+    def generate_abogus(self, params: str, body: str = "") -> tuple:
+        with self.signer() as abogus:
+            return abogus.generate_abogus(params, body)
+
+    def generate_abogus_batch(self, params_list: List[str], body: str = "") -> List[tuple]:
+        with self.signer() as abogus:
+            return abogus.generate_abogus_batch(params_list, body)
+
+
+_pools: Dict[str, ABogusPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_abogus_pool(user_agent: str = "") -> ABogusPool:
+    """
+    获取指定 UA 的 ABogusPool，同一 UA 只创建一次 (Get the memoized ABogusPool of the user agent).
+    """
+    with _pools_lock:
+        pool = _pools.get(user_agent)
+        if pool is None:
+            pool = _pools[user_agent] = ABogusPool(user_agent)
+        return pool
+
+
+# 用法: python -m dylr.core.abogus  (从项目根目录运行，打印示例签名和每秒生成个数)
+# 签名结果的正确性由 tests/test_abogus.py 中的固定向量检查: python -m pytest tests/test_abogus.py
 if __name__ == "__main__":
     # 24/06/16 晚点开源自定义ua
     # 24/07/08 支持自定义ua和浏览器指纹
@@ -863,6 +965,12 @@ if __name__ == "__main__":
     body = "aweme_type=0&item_id=7467485482314763572&play_delta=1&source=0"
     print(url + abogus.generate_abogus(params=params, body=body)[0])
 
+    # 每秒可生成的签名数，原实现(每次新建实例、gmssl、逐字符编码)约 136 个/秒
+    start = time.time()
+    for _ in range(1000):
+        abogus.generate_abogus(params=params, body=body)
+    print("每秒生成abogus参数个数:", int(1000 / (time.time() - start)))
+
     # # 测试生成100个abogus参数 和 100个指纹所需时间
     # start = time.time()
     # for _ in range(100):
@@ -870,6 +978,15 @@ if __name__ == "__main__":
     # end = time.time()
     # print("生成100个abogus参数和指纹所需时间:", end - start)  # 生成100个abogus参数和指纹所需时间: 2.203000783920288
 
+    # # 每次新建实例与从缓存池取用实例的耗时对比
+    # start = time.time()
+    # for _ in range(100):
+    #     ABogus(user_agent=user_agent).generate_abogus(params=params)
+    # print("每次新建实例生成100个abogus参数所需时间:", time.time() - start)
+    # start = time.time()
+    # get_abogus_pool(user_agent).generate_abogus_batch([params] * 100)
+    # print("从缓存池取用实例生成100个abogus参数所需时间:", time.time() - start)
+
     # start = time.time()
     # for _ in range(100):
     #     BrowserFingerprintGenerator.generate_fingerprint("Chrome")
@@ -4,22 +4,25 @@
 :date: 2023.04.23
 :brief: 通过 Web_Rid、直播间地址、直播间短链、主播主页 获取主播房间信息
 """
-import json
 import random
 import re
 import time
 import threading
 import traceback
 from functools import partial
-from tkinter import messagebox
-
-import requests
 
 # Web_Rid 纯数字
 from dylr.core import record_manager, app, dy_api, config, monitor
 from dylr.core.room import Room
 from dylr.util import logger
 
+
+def _message(title, message):
+    # tkinter 只在 GUI 模式下需要，命令行模式不导入
+    from tkinter import messagebox
+    return messagebox.askokcancel(title, message)
+
+
 re_num = re.compile(r'^\d*$')
 # 使用 Web_Rid 的网址
 re_live = re.compile(r'^(http:|https:)?(//)?live.douyin.com/\d*')
@@ -47,7 +50,7 @@ def try_add_room(info):
         logger.error_and_print("添加主播失败，请确认输入的内容是否符合要求\n如果符合要求，可能是接口失效，请换种方式。")
         logger.error_and_print(traceback.format_exc())
     if app.win_mode:
-        messagebox.askokcancel("添加主播失败", "请确认输入的内容是否符合要求\n如果符合要求，可能是接口失效，请换种方式。")
+        _message("添加主播失败", "请确认输入的内容是否符合要求\n如果符合要求，可能是接口失效，请换种方式。")
 
 
 def find_live(info):
@@ -64,12 +67,10 @@ def find_by_web_rid(web_rid):
     if room is not None:
         logger.error_and_print(f'重复获取主播房间: {room.room_name}({web_rid})')
         if app.win_mode:
-            messagebox.askokcancel("房间已存在", f"重复获取主播房间: {room.room_name}({web_rid})")
+            _message("房间已存在", f"重复获取主播房间: {room.room_name}({web_rid})")
         return
 
-    api_url = dy_api.get_api_url(web_rid)
-    req = requests.get(api_url, headers=dy_api.get_request_headers(), proxies=dy_api.get_proxies())
-    json_info = json.loads(req.text)
+    json_info = dy_api.get_live_state_response(web_rid)
     name = json_info['data']['user']['nickname']
 
     if name is None or len(name) == 0:
@@ -81,7 +82,7 @@ def find_by_web_rid(web_rid):
     logger.info_and_print(f'成功获取到房间{name}({web_rid})')
     if app.win_mode:
         app.win.add_room(room)
-        messagebox.askokcancel("添加主播成功", f"房间Web_Sid: {web_rid} \n 主播名: {name}")
+        _message("添加主播成功", f"房间Web_Sid: {web_rid} \n 主播名: {name}")
 
     # 添加完房间立刻检查是否开播
     threading.Thread(target=partial(monitor.check_room, room)).start()
@@ -98,7 +99,7 @@ def find_user(info: str):
     nickname, web_rid = dy_api.get_user_info(sec_user_id)
     if nickname is None:
         if app.win_mode:
-            messagebox.askokcancel("添加主播失败", f'无法获取{sec_user_id}的信息，请您稍后重试\n若一直不行，可能是接口已封禁，请通过其他方式添加主播')
+            _message("添加主播失败", f'无法获取{sec_user_id}的信息，请您稍后重试\n若一直不行，可能是接口已封禁，请通过其他方式添加主播')
             return
     if web_rid is not None:
         find_by_web_rid(web_rid)
@@ -108,4 +109,4 @@ def find_user(info: str):
         config.save_rooms()
         if app.win_mode:
             app.win.add_room(room)
-            messagebox.askokcancel("添加主播成功", f'获取到主播{nickname}，但未开播。将会在开播时获取其直播间链接。')
+            _message("添加主播成功", f'获取到主播{nickname}，但未开播。将会在开播时获取其直播间链接。')
@@ -0,0 +1,182 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 预签名的直播间状态接口地址池
+        后台线程提前为每个直播间生成好带 msToken 和 a_bogus 的接口地址，检测时直接取用，不必现场签名
+"""
+import heapq
+import threading
+import time
+import traceback
+from collections import deque
+
+from dylr.core import app, config
+from dylr.util import logger
+
+
+class ApiUrlPool:
+    # 多久没有取用的直播间不再预先生成，为 max_age 的倍数
+    idle_factor = 10
+    # 地址到达 max_age 的多少比例时提前生成新地址替换，保证取用时总有未过期的地址
+    refresh_ratio = 0.8
+
+    def __init__(self, build_func):
+        """
+        :param build_func: 生成一个接口地址的函数，参数为 web_rid
+        """
+        self.build_func = build_func
+        # web_rid -> deque[(生成时间, 地址)]，旧的在左边
+        self.urls = {}
+        # web_rid -> 最后一次取用的时间
+        self.last_take = {}
+        # 需要补充的直播间，web_rid -> 开始需要补充的时间(用于统计补充延迟)，按加入顺序补充
+        self.refill_queue = {}
+        # 地址需要替换的时间(最小堆)，元素: (替换时间, web_rid)
+        # 每个直播间只有 deadlines 中记录的那一项有效，其余为已被替换的旧项，取出时跳过
+        self.expire_heap = []
+        # web_rid -> 下一次替换的时间
+        self.deadlines = {}
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.thread = None
+        self.stopped = False
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_lag_total = 0.0
+        self.refill_lag_max = 0.0
+
+    def get(self, room_id):
+        """ 取出一个未过期的地址，地址池为空时现场生成 """
+        key = str(room_id)
+        now = time.monotonic()
+        url = None
+        with self.lock:
+            self.last_take[key] = now
+            urls = self.urls.setdefault(key, deque())
+            self._drop_expired(urls, now)
+            if urls:
+                url = urls.popleft()[1]
+                self.hits += 1
+            else:
+                self.misses += 1
+            if len(urls) < config.get_api_url_pool_size() and key not in self.refill_queue:
+                self.refill_queue[key] = now
+                self.cond.notify()
+        self._ensure_thread()
+        if url is None:
+            url = self.build_func(room_id)
+        return url
+
+    def stop(self):
+        """ 停止后台生成线程 """
+        with self.lock:
+            self.stopped = True
+            self.cond.notify_all()
+            thread = self.thread
+        if thread is not None:
+            thread.join()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'rooms': len(self.urls),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0,
+                'refill_lag_avg': self.refill_lag_total / self.refills if self.refills else 0,
+                'refill_lag_max': self.refill_lag_max,
+            }
+
+    def get_stats_str(self) -> str:
+        stats = self.get_stats()
+        return f'预签名地址池: {stats["rooms"]} 个直播间, 命中率 {stats["hit_rate"]:.1%}' \
+               f'({stats["hits"]}/{stats["hits"] + stats["misses"]}), ' \
+               f'补充延迟 平均 {stats["refill_lag_avg"] * 1000:.1f}ms 最大 {stats["refill_lag_max"] * 1000:.1f}ms'
+
+    @staticmethod
+    def _drop_expired(urls, now):
+        max_age = config.get_api_url_max_age()
+        while urls and now - urls[0][0] > max_age:
+            urls.popleft()
+
+    def _ensure_thread(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                # 检测间隔比替换时间长时，地址大多在取用前就被替换，签名次数约翻倍
+                if config.get_api_url_max_age() * self.refresh_ratio < \
+                        config.get_check_period() + config.get_check_period_random_offset():
+                    logger.warning_and_print('api_url_max_age 的 80% 小于检测间隔(check_period + '
+                                             'check_period_random_offset)，预先生成的地址大多会在取用前被替换，'
+                                             '建议调大 api_url_max_age')
+                self.thread = threading.Thread(target=self._produce)
+                self.thread.setDaemon(True)
+                self.thread.start()
+
+    def _check_expired(self, now):
+        """ 处理快过期的地址：对应的直播间加入补充队列，长时间没有取用的直播间移除，需持有锁 """
+        max_age = config.get_api_url_max_age()
+        while self.expire_heap and self.expire_heap[0][0] <= now:
+            deadline, key = heapq.heappop(self.expire_heap)
+            if self.deadlines.get(key) != deadline:
+                continue
+            del self.deadlines[key]
+            urls = self.urls.get(key)
+            if urls is None:
+                continue
+            if now - self.last_take.get(key, 0) > max_age * self.idle_factor:
+                # 长时间没有取用(房间被删除、正在录制等)，不再生成
+                del self.urls[key]
+                self.last_take.pop(key, None)
+                self.refill_queue.pop(key, None)
+                continue
+            self._drop_expired(urls, now)
+            if key not in self.refill_queue:
+                self.refill_queue[key] = now
+
+    def _produce(self):
+        while not app.stop_all_threads and not self.stopped:
+            with self.lock:
+                now = time.monotonic()
+                self._check_expired(now)
+                if len(self.expire_heap) > 2 * len(self.deadlines) + 64:
+                    # 清理已被替换的旧项
+                    self.expire_heap = [(d, k) for k, d in self.deadlines.items()]
+                    heapq.heapify(self.expire_heap)
+                if not self.refill_queue:
+                    wait = self.expire_heap[0][0] - now if self.expire_heap else 1
+                    self.cond.wait(min(max(wait, 0.01), 1))
+                    continue
+                key = next(iter(self.refill_queue))
+                if key not in self.urls:
+                    del self.refill_queue[key]
+                    continue
+            try:
+                url = self.build_func(key)
+            except Exception:
+                logger.error(traceback.format_exc())
+                time.sleep(1)
+                continue
+            now = time.monotonic()
+            with self.lock:
+                urls = self.urls.get(key)
+                if urls is None:
+                    continue
+                urls.append((now, url))
+                size = config.get_api_url_pool_size()
+                while len(urls) > size:
+                    urls.popleft()
+                # 在最旧的地址快过期时替换，每个直播间只保留一个替换时间
+                deadline = urls[0][0] + config.get_api_url_max_age() * self.refresh_ratio
+                if self.deadlines.get(key) != deadline:
+                    self.deadlines[key] = deadline
+                    heapq.heappush(self.expire_heap, (deadline, key))
+                if len(urls) >= size and key in self.refill_queue:
+                    lag = now - self.refill_queue.pop(key)
+                    self.refills += 1
+                    self.refill_lag_total += lag
+                    self.refill_lag_max = max(self.refill_lag_max, lag)
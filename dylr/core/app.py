@@ -5,6 +5,7 @@
 :brief: app主文件
 """
 
+import importlib.util
 import os
 import signal
 import sys
@@ -83,23 +84,16 @@ def sigint_handler(signum, frame):
 
 
 def check_dependencies():
+    # 只检查是否安装，不导入，protobuf 等模块在用到时才会加载
     lack_dependencies = []
-    try:
-        import requests
-    except:
-        lack_dependencies.append('requests')
-    try:
-        import websocket
-    except:
-        lack_dependencies.append('websocket-client')
-    try:
-        import google.protobuf
-    except:
-        lack_dependencies.append('protobuf')
-    try:
-        import gmssl
-    except:
-        lack_dependencies.append('gmssl')
+    for module, package in (('requests', 'requests'), ('websocket', 'websocket-client'),
+                            ('google.protobuf', 'protobuf'), ('gmssl', 'gmssl')):
+        try:
+            found = importlib.util.find_spec(module) is not None
+        except ImportError:
+            found = False
+        if not found:
+            lack_dependencies.append(package)
 
     if len(lack_dependencies) == 0:
         return True
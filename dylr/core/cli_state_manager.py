@@ -64,6 +64,11 @@ def run():
             print('------- 正在录制的房间列表 -------')
             for rec in record_manager.get_recordings():
                 print(f'{rec.room.room_name}({rec.room.room_id}) 已录制 {get_time_str(now - rec.start_time)}')
+                if rec.danmu_recorder is not None and rec.danmu_recorder.overload_summary():
+                    print(f'    {rec.danmu_recorder.overload_summary()}')
+                if rec.video_recorder is not None and rec.video_recorder.writer is not None:
+                    writer = rec.video_recorder.writer
+                    print(f'    视频写入缓冲区已使用 {writer.fill:.0%}，{writer.summary()}')
             print('------------------------------')
         if info == b'\x03':
             app.stop_all_threads = True
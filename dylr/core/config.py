@@ -28,6 +28,37 @@ configs = {
     'auto_transcode_encoder': 'copy',
     'auto_transcode_bps': '0',
     'auto_transcode_delete_origin': False,
+    'http_pool_connections': 10,
+    'http_pool_maxsize': 16,
+    'http_max_retries': 2,
+    'live_state_cache_ttl': 3.0,
+    'api_url_pool': True,
+    'api_url_pool_size': 1,
+    'api_url_max_age': 60.0,
+    'danmu_sign_backend': 'quickjs',
+    'danmu_sign_pool_size': 2,
+    'danmu_flush_interval': 1.0,
+    'danmu_buffer_size': 64,
+    'danmu_fsync': 'close',
+    'danmu_queue_size': 256,
+    'danmu_record_mode': 'xml',
+    'danmu_stats': False,
+    'highlight': False,
+    'highlight_count': 5,
+    'highlight_window': 30,
+    'danmu_overload_policy': 'block',
+    'danmu_sample_every': 10,
+    'danmu_decode_workers': 0,
+    'video_buffer_size': 256,
+    'video_splice': True,
+    'video_ring_buffer': 8,
+    'video_high_watermark': 80,
+    'video_page_cache': False,
+    'video_sync_interval': 8,
+    'video_preallocate': 0,
+    'video_fix_flv': False,
+    'video_segment_size': 0,
+    'video_segment_duration': 0,
 }
 
 
@@ -53,6 +84,9 @@ def read_configs():
         else:
             configs[lv] = type(configs[lv])(rv)
         logger.info(f'config {lv} = {rv}')
+    # 分段录制在 flv 修复时进行，没有开启时分段设置不起作用
+    if (configs['video_segment_size'] > 0 or configs['video_segment_duration'] > 0) and not configs['video_fix_flv']:
+        logger.warning_and_print('video_segment_size 和 video_segment_duration 需要开启 video_fix_flv，当前录制不会分段')
 
 
 def set_config(conf: str, info):
@@ -186,3 +220,126 @@ def is_auto_transcode_delete_origin():
 def is_cli_key_l_enable():
     return configs['cli_key_l']
 
+
+def get_http_pool_connections():
+    return configs['http_pool_connections']
+
+
+def get_http_pool_maxsize():
+    return configs['http_pool_maxsize']
+
+
+def get_http_max_retries():
+    return configs['http_max_retries']
+
+
+def get_live_state_cache_ttl():
+    return configs['live_state_cache_ttl']
+
+
+def is_api_url_pool_enabled():
+    return configs['api_url_pool']
+
+
+def get_api_url_pool_size():
+    return configs['api_url_pool_size']
+
+
+def get_api_url_max_age():
+    return configs['api_url_max_age']
+
+
+def get_danmu_sign_backend():
+    return configs['danmu_sign_backend']
+
+
+def get_danmu_sign_pool_size():
+    return configs['danmu_sign_pool_size']
+
+
+def get_danmu_flush_interval():
+    return configs['danmu_flush_interval']
+
+
+def get_danmu_buffer_size():
+    return configs['danmu_buffer_size']
+
+
+def get_danmu_fsync():
+    return configs['danmu_fsync']
+
+
+def get_danmu_queue_size():
+    return configs['danmu_queue_size']
+
+
+def get_danmu_record_mode():
+    return configs['danmu_record_mode']
+
+
+def is_danmu_stats_enabled():
+    return configs['danmu_stats']
+
+
+def is_highlight_enabled():
+    return configs['highlight']
+
+
+def get_highlight_count():
+    return configs['highlight_count']
+
+
+def get_highlight_window():
+    return configs['highlight_window']
+
+
+def get_danmu_overload_policy():
+    return configs['danmu_overload_policy']
+
+
+def get_danmu_sample_every():
+    return configs['danmu_sample_every']
+
+
+def get_danmu_decode_workers():
+    return configs['danmu_decode_workers']
+
+
+def get_video_buffer_size():
+    return configs['video_buffer_size']
+
+
+def is_video_splice():
+    return configs['video_splice']
+
+
+def get_video_ring_buffer():
+    return configs['video_ring_buffer']
+
+
+def get_video_high_watermark():
+    return configs['video_high_watermark']
+
+
+def is_video_page_cache():
+    return configs['video_page_cache']
+
+
+def get_video_sync_interval():
+    return configs['video_sync_interval']
+
+
+def get_video_preallocate():
+    return configs['video_preallocate']
+
+
+def is_video_fix_flv():
+    return configs['video_fix_flv']
+
+
+def get_video_segment_size():
+    return configs['video_segment_size']
+
+
+def get_video_segment_duration():
+    return configs['video_segment_duration']
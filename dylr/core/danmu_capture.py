@@ -0,0 +1,186 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 弹幕原始数据的保存与导出
+        录制时只把收到的 PushFrame 原样追加到文件中，不解析内容，礼物、点赞、进场、在线人数等消息也都会保留
+        文件格式: 文件头 MAGIC + 录制开始时间(double)，之后每条记录为 接收时间(double) + 长度(uint32) + PushFrame，小端序
+        录制结束后可以用本文件导出为 xml(与直接录制的相同)或 jsonl(所有消息)，多个进程同时解析，
+        与录制时一样按 msgId 去除重连后重复推送的消息，默认导出为 .export.xml，不会覆盖 both 模式下录制的 xml:
+        python -m dylr.core.danmu_capture download/主播/20260101_120000.dmraw --format xml
+"""
+import base64
+import json
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from dylr.core import danmu_writer
+from dylr.core.danmu_decoder import DanmuDecoder, MessageDedupe, MsgIdCollector
+
+MAGIC = b'DYLRRAW1'
+FILE_HEADER = struct.Struct('<8sd')
+RECORD_HEADER = struct.Struct('<dI')
+EXTENSION = '.dmraw'
+
+
+def file_header(start_time: float) -> bytes:
+    return FILE_HEADER.pack(MAGIC, start_time)
+
+
+def pack_frame(timestamp: float, frame: bytes) -> bytes:
+    """ 一条记录，timestamp 为收到数据包的时间 """
+    return RECORD_HEADER.pack(timestamp, len(frame)) + frame
+
+
+def read_capture(path: str):
+    """
+    读取原始数据文件，程序崩溃导致的不完整记录会被忽略
+    :return: (录制开始时间, 生成 (接收时间, PushFrame) 的迭代器)
+    """
+    f = open(path, 'rb')
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size or header[:len(MAGIC)] != MAGIC:
+        f.close()
+        raise ValueError(f'{path} is not a danmu capture file')
+    _, start_time = FILE_HEADER.unpack(header)
+
+    def frames():
+        with f:
+            while True:
+                record = f.read(RECORD_HEADER.size)
+                if len(record) < RECORD_HEADER.size:
+                    return
+                timestamp, length = RECORD_HEADER.unpack(record)
+                frame = f.read(length)
+                if len(frame) < length:
+                    return
+                yield timestamp, frame
+
+    return start_time, frames()
+
+
+def _message_class(method: str):
+    """ WebcastChatMessage -> dy_pb2.ChatMessage，没有对应的类时返回 None """
+    from dylr.core import dy_pb2
+    if not method.startswith('Webcast'):
+        return None
+    return getattr(dy_pb2, method[len('Webcast'):], None)
+
+
+def _export_xml(start_time, batch):
+    """ :return: [(msgId, 行)] """
+    decoder = DanmuDecoder()
+    lines = []
+    for timestamp, frame in batch:
+        decoder.dedupe = ids = MsgIdCollector()
+        try:
+            _, _, _, messages = decoder.decode(frame)
+        except Exception:
+            continue
+        for msg_id, (method, payload) in zip(ids.ids, messages):
+            user, content = decoder.parse_chat(payload)
+            lines.append((msg_id, danmu_writer.xml_line(timestamp - start_time, timestamp, user, content)))
+    return lines
+
+
+def _export_jsonl(start_time, batch):
+    """ :return: [(msgId, 行)] """
+    from google.protobuf import json_format
+
+    from dylr.core.dy_pb2 import Response
+
+    decoder = DanmuDecoder()
+    lines = []
+    for timestamp, frame in batch:
+        try:
+            _, payload = decoder.parse_push_frame(frame)
+            response = decoder.decompress(payload)
+        except Exception:
+            continue
+        resp = Response()
+        resp.ParseFromString(response)
+        for msg in resp.messagesList:
+            cls = _message_class(msg.method)
+            item = {'time': round(timestamp, 3), 'method': msg.method}
+            try:
+                if cls is None:
+                    raise ValueError(f'unknown method {msg.method}')
+                data = cls()
+                data.ParseFromString(msg.payload)
+                item['data'] = json_format.MessageToDict(data, preserving_proto_field_name=True)
+            except Exception:
+                # 没有对应的定义或与定义不符，保留原始数据
+                item['payload'] = base64.b64encode(msg.payload).decode()
+            lines.append((msg.msgId, json.dumps(item, ensure_ascii=False) + '\n'))
+    return lines
+
+
+# 导出格式 -> (解析函数, 文件扩展名)
+FORMATS = {
+    'xml': (_export_xml, '.xml'),
+    'jsonl': (_export_jsonl, '.jsonl'),
+}
+
+
+def _export_batch(args):
+    fmt, start_time, batch = args
+    return FORMATS[fmt][0](start_time, batch)
+
+
+def export(path: str, fmt: str = 'xml', out_path: str = None, workers: int = None, batch_size: int = 500) -> str:
+    """
+    将原始数据文件导出为 fmt 格式，数据包分批交给进程池解析，按原顺序去重后写入
+    :param out_path: 默认为原始数据文件名 + .export + 扩展名
+    :return: 导出的文件路径
+    """
+    extension = FORMATS[fmt][1]
+    if fmt == 'xml':
+        header, footer = danmu_writer.XML_HEADER, danmu_writer.XML_FOOTER
+    else:
+        header, footer = '', ''
+    if out_path is None:
+        out_path = os.path.splitext(path)[0] + '.export' + extension
+    workers = workers or os.cpu_count() or 1
+    start_time, frames = read_capture(path)
+
+    def batches():
+        batch = []
+        for record in frames:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield fmt, start_time, batch
+                batch = []
+        if batch:
+            yield fmt, start_time, batch
+
+    dedupe = MessageDedupe()
+
+    def write(lines):
+        out.writelines(line for msg_id, line in lines if dedupe.add(msg_id))
+
+    with open(out_path, 'w', encoding='UTF-8') as out, ProcessPoolExecutor(workers) as pool:
+        out.write(header)
+        # 最多同时提交 workers * 2 批，避免大文件一次性读入内存
+        futures = deque()
+        for args in batches():
+            futures.append(pool.submit(_export_batch, args))
+            if len(futures) >= workers * 2:
+                write(futures.popleft().result())
+        while futures:
+            write(futures.popleft().result())
+        out.write(footer)
+    return out_path
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='导出弹幕原始数据文件')
+    parser.add_argument('files', nargs='+', help=f'{EXTENSION} 文件')
+    parser.add_argument('--format', choices=FORMATS.keys(), default='xml')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认为 CPU 核数')
+    args = parser.parse_args()
+    for file in args.files:
+        print(f'{file} -> {export(file, args.format, workers=args.workers)}')
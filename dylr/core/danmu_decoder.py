@@ -0,0 +1,426 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 弹幕 websocket 数据的快速解析
+        直接读取 protobuf 编码中需要的字段，先比较 method 再解析消息内容，不需要的消息和字段直接跳过
+        发送的心跳包和 ack 也直接编码，录制时不需要加载 protobuf 和 dy_pb2，
+        dy_pb2 只在运行本模块时用于与快速解析的结果对比和测速
+        用法: python -m dylr.core.danmu_decoder  (从项目根目录运行，对比 dy_pb2 的解析结果并测速)
+"""
+import zlib
+from collections import OrderedDict
+
+# protobuf 的 wire type
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH_DELIMITED = 2
+WIRE_FIXED32 = 5
+
+CHAT_METHOD = b'WebcastChatMessage'
+
+
+def _read_varint(buf, pos):
+    b = buf[pos]
+    if b < 0x80:
+        return b, pos + 1
+    result = b & 0x7F
+    shift = 7
+    pos += 1
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _skip(buf, pos, wire_type):
+    """ 跳过一个字段的值，返回下一个字段的位置 """
+    if wire_type == WIRE_VARINT:
+        while buf[pos] >= 0x80:
+            pos += 1
+        return pos + 1
+    if wire_type == WIRE_LENGTH_DELIMITED:
+        length, pos = _read_varint(buf, pos)
+        return pos + length
+    if wire_type == WIRE_FIXED64:
+        return pos + 8
+    if wire_type == WIRE_FIXED32:
+        return pos + 4
+    raise ValueError(f'unsupported wire type {wire_type}')
+
+
+def _read_string(buf, pos, end, field_number):
+    """ 读取 buf[pos:end] 这条消息中的一个字符串字段，没有时返回空字符串 """
+    value = ''
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        wire_type = key & 7
+        if key >> 3 == field_number and wire_type == WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length].decode('utf-8', 'replace')
+            pos += length
+        else:
+            pos = _skip(buf, pos, wire_type)
+    return value
+
+
+def parse_fields(buf, numbers, pos=0, end=None) -> dict:
+    """
+    读取一条消息中指定编号的字段，varint 字段为 int，length-delimited 字段为 bytes，重复的字段取最后一个
+    :param numbers: 需要读取的字段编号的集合
+    """
+    if end is None:
+        end = len(buf)
+    result = {}
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field_number = key >> 3
+        wire_type = key & 7
+        if field_number in numbers:
+            if wire_type == WIRE_VARINT:
+                result[field_number], pos = _read_varint(buf, pos)
+                continue
+            if wire_type == WIRE_LENGTH_DELIMITED:
+                length, pos = _read_varint(buf, pos)
+                result[field_number] = buf[pos:pos + length]
+                pos += length
+                continue
+        pos = _skip(buf, pos, wire_type)
+    return result
+
+
+def build_push_frame(payload_type: str, logid: int = 0, payload: bytes = b'') -> bytes:
+    """ 构造发送给服务器的 PushFrame，与 dy_pb2.PushFrame 序列化的结果相同 """
+    data = b''
+    if logid:
+        data += b'\x10' + _write_varint(logid)
+    if payload_type:
+        payload_type = payload_type.encode()
+        data += b'\x3a' + _write_varint(len(payload_type)) + payload_type
+    if payload:
+        data += b'\x42' + _write_varint(len(payload)) + payload
+    return data
+
+
+def xml_line(second: float, timestamp: float, user: str, content: str) -> str:
+    """ 一条弹幕在 xml 文件中的内容 """
+    return f"  <d p=\"{round(second, 2)},1,25,16777215," \
+           f"{int(timestamp * 1000)},0,1602022773,0\" user=\"{user}\">{content}</d>\n"
+
+
+class MessageDedupe:
+    """ 记录最近收到的 msgId，重连后服务器可能会再次推送断开前的消息，只保留最近 size 个 """
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.seen = OrderedDict()
+        self.total = 0
+        self.duplicates = 0
+
+    def add(self, msg_id: int) -> bool:
+        """ 记录一条消息，返回是否是第一次收到，没有 msgId(为 0)的消息都当作新消息 """
+        self.total += 1
+        if not msg_id:
+            return True
+        seen = self.seen
+        if msg_id in seen:
+            seen.move_to_end(msg_id)
+            self.duplicates += 1
+            return False
+        seen[msg_id] = None
+        if len(seen) > self.size:
+            seen.popitem(last=False)
+        return True
+
+
+class MsgIdCollector:
+    """
+    代替 MessageDedupe 传给 DanmuDecoder，只按顺序记录解析出的消息的 msgId，不去重
+    在子进程中解析时使用，去重由主进程用 MessageDedupe 按原顺序进行
+    """
+
+    def __init__(self):
+        self.ids = []
+
+    def add(self, msg_id: int) -> bool:
+        self.ids.append(msg_id)
+        return True
+
+
+class DanmuDecoder:
+    """ 每个弹幕录制使用一个，解压使用的 zlib 对象只初始化一次，之后每个数据包复制一份使用 """
+
+    def __init__(self, methods=(CHAT_METHOD,), dedupe: MessageDedupe = None):
+        """
+        :param methods: 需要解析的消息类型，如 b'WebcastChatMessage'
+        :param dedupe: 不为 None 时丢弃 msgId 重复的消息
+        """
+        self.methods = frozenset(methods)
+        self.dedupe = dedupe
+        # 最后一个 Response 中的 cursor，重连时使用
+        self.cursor = ''
+        self._gzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data) -> bytes:
+        # 一个 zlib 对象只能解压一个 gzip 数据流，复制已初始化的对象比每次重新创建更快
+        return self._gzip.copy().decompress(data)
+
+    @staticmethod
+    def parse_push_frame(data):
+        """
+        读取 PushFrame 中的 logid 和 payload
+        :return: (logid, payload)
+        """
+        logid = 0
+        payload = b''
+        pos = 0
+        end = len(data)
+        while pos < end:
+            key, pos = _read_varint(data, pos)
+            field_number = key >> 3
+            wire_type = key & 7
+            if field_number == 2 and wire_type == WIRE_VARINT:
+                logid, pos = _read_varint(data, pos)
+            elif field_number == 8 and wire_type == WIRE_LENGTH_DELIMITED:
+                length, pos = _read_varint(data, pos)
+                payload = data[pos:pos + length]
+                pos += length
+            else:
+                pos = _skip(data, pos, wire_type)
+        return logid, payload
+
+    def parse_response(self, data):
+        """
+        读取 Response 中的 needAck、internalExt、cursor，以及 method 在 methods 中的消息
+        :return: (need_ack, internal_ext, [(method, payload)])
+        """
+        need_ack = False
+        internal_ext = ''
+        messages = []
+        methods = self.methods
+        dedupe = self.dedupe
+        pos = 0
+        end = len(data)
+        while pos < end:
+            key, pos = _read_varint(data, pos)
+            field_number = key >> 3
+            wire_type = key & 7
+            if field_number == 1 and wire_type == WIRE_LENGTH_DELIMITED:
+                length, pos = _read_varint(data, pos)
+                message = self._parse_message(data, pos, pos + length, methods, dedupe)
+                if message is not None:
+                    messages.append(message)
+                pos += length
+            elif field_number == 9 and wire_type == WIRE_VARINT:
+                value, pos = _read_varint(data, pos)
+                need_ack = value != 0
+            elif field_number == 5 and wire_type == WIRE_LENGTH_DELIMITED:
+                length, pos = _read_varint(data, pos)
+                internal_ext = data[pos:pos + length].decode('utf-8', 'replace')
+                pos += length
+            elif field_number == 2 and wire_type == WIRE_LENGTH_DELIMITED:
+                length, pos = _read_varint(data, pos)
+                self.cursor = data[pos:pos + length].decode('utf-8', 'replace')
+                pos += length
+            else:
+                pos = _skip(data, pos, wire_type)
+        return need_ack, internal_ext, messages
+
+    @staticmethod
+    def _parse_message(data, pos, end, methods, dedupe=None):
+        """ 读取 Message 的 method，不需要的消息不读取 payload """
+        method = None
+        msg_id = 0
+        payload_pos = payload_end = 0
+        while pos < end:
+            key, pos = _read_varint(data, pos)
+            field_number = key >> 3
+            wire_type = key & 7
+            if wire_type == WIRE_LENGTH_DELIMITED and (field_number == 1 or field_number == 2):
+                length, pos = _read_varint(data, pos)
+                if field_number == 1:
+                    method = data[pos:pos + length]
+                    if method not in methods:
+                        return None
+                else:
+                    payload_pos, payload_end = pos, pos + length
+                pos += length
+            elif field_number == 3 and wire_type == WIRE_VARINT:
+                msg_id, pos = _read_varint(data, pos)
+            else:
+                pos = _skip(data, pos, wire_type)
+        if method is None:
+            return None
+        if dedupe is not None and not dedupe.add(msg_id):
+            return None
+        return method, data[payload_pos:payload_end]
+
+    @staticmethod
+    def parse_chat(payload):
+        """
+        读取 ChatMessage 中的用户昵称和弹幕内容
+        :return: (nickname, content)
+        """
+        nickname = ''
+        content = ''
+        pos = 0
+        end = len(payload)
+        while pos < end:
+            key, pos = _read_varint(payload, pos)
+            field_number = key >> 3
+            wire_type = key & 7
+            if wire_type == WIRE_LENGTH_DELIMITED and (field_number == 2 or field_number == 3):
+                length, pos = _read_varint(payload, pos)
+                if field_number == 2:
+                    nickname = _read_string(payload, pos, pos + length, 3)
+                else:
+                    content = payload[pos:pos + length].decode('utf-8', 'replace')
+                pos += length
+            else:
+                pos = _skip(payload, pos, wire_type)
+        return nickname, content
+
+    def decode(self, data):
+        """
+        解析一个 websocket 数据包
+        :return: (logid, need_ack, internal_ext, [(method, payload)])
+        """
+        logid, payload = self.parse_push_frame(data)
+        need_ack, internal_ext, messages = self.parse_response(self.decompress(payload))
+        return logid, need_ack, internal_ext, messages
+
+
+def build_sample_frames(count=200, seed=0):
+    """ 生成用于测试的数据包，消息的组成与直播间中实际收到的类似 """
+    import gzip
+    import random
+
+    from dylr.core.dy_pb2 import PushFrame, Response, ChatMessage, User, MemberMessage, LikeMessage, \
+        GiftMessage, RoomUserSeqMessage
+
+    rng = random.Random(seed)
+
+    def random_user():
+        return User(id=rng.getrandbits(62), nickName=f'用户{rng.randint(0, 99999)}',
+                    secUid='MS4wLjABAAAA' + 'x' * 40, displayId=str(rng.getrandbits(32)),
+                    city='北京', Level=rng.randint(0, 50))
+
+    frames = []
+    for i in range(count):
+        response = Response()
+        response.cursor = f't-{i}_r-{rng.getrandbits(64)}'
+        response.internalExt = f'internal_src:dim|wss_push_room_id:{rng.getrandbits(60)}|seq:{i}'
+        response.needAck = rng.random() < 0.3
+        response.fetchInterval = 1000
+        for _ in range(rng.randint(1, 12)):
+            msg = response.messagesList.add()
+            kind = rng.random()
+            if kind < 0.5:
+                chat = ChatMessage()
+                chat.common.method = 'WebcastChatMessage'
+                chat.common.msgId = rng.getrandbits(62)
+                chat.common.roomId = rng.getrandbits(62)
+                chat.user.CopyFrom(random_user())
+                chat.content = rng.choice(['主播好', '666', '哈哈哈哈', '来了来了 <3 & "ok"', 'hello'])
+                chat.eventTime = 1700000000 + i
+                chat.chatBy = '0'
+                msg.method = 'WebcastChatMessage'
+                msg.payload = chat.SerializeToString()
+            elif kind < 0.7:
+                member = MemberMessage(memberCount=rng.randint(1000, 9999), action=1)
+                member.user.CopyFrom(random_user())
+                msg.method = 'WebcastMemberMessage'
+                msg.payload = member.SerializeToString()
+            elif kind < 0.85:
+                like = LikeMessage(count=rng.randint(1, 15), total=100000 + i * 10)
+                like.user.CopyFrom(random_user())
+                msg.method = 'WebcastLikeMessage'
+                msg.payload = like.SerializeToString()
+            elif kind < 0.95:
+                gift = GiftMessage(giftId=rng.randint(1, 5), groupCount=1, repeatCount=rng.randint(1, 3),
+                                   comboCount=1, groupId=rng.randint(1, 50))
+                gift.user.CopyFrom(random_user())
+                gift.gift.name = '小心心'
+                gift.gift.diamondCount = rng.choice([1, 1, 10, 99])
+                msg.method = 'WebcastGiftMessage'
+                msg.payload = gift.SerializeToString()
+            else:
+                seq = RoomUserSeqMessage(total=rng.randint(1000, 2000), totalUser=50000 + i,
+                                         popStr='1.2万', totalStr='10万+')
+                msg.method = 'WebcastRoomUserSeqMessage'
+                msg.payload = seq.SerializeToString()
+            msg.msgId = rng.getrandbits(62)
+            msg.msgType = 0
+        frame = PushFrame()
+        frame.seqid = i
+        frame.logid = rng.getrandbits(62)
+        frame.payloadEncoding = 'gzip'
+        frame.payloadType = 'msg'
+        frame.payload = gzip.compress(response.SerializeToString())
+        frames.append(frame.SerializeToString())
+    return frames
+
+
+def decode_with_pb2(data):
+    """ 原来的解析方式，用于对比 """
+    import gzip
+
+    from google.protobuf import json_format
+
+    from dylr.core.dy_pb2 import PushFrame, Response, ChatMessage
+
+    frame = PushFrame()
+    frame.ParseFromString(data)
+    response = Response()
+    response.ParseFromString(gzip.decompress(frame.payload))
+    chats = []
+    for msg in response.messagesList:
+        if msg.method == 'WebcastChatMessage':
+            chat = ChatMessage()
+            chat.ParseFromString(msg.payload)
+            message_dict = json_format.MessageToDict(chat, preserving_proto_field_name=True)
+            chats.append((message_dict['user']['nickName'], message_dict['content']))
+    return frame.logid, response.needAck, response.internalExt, chats
+
+
+if __name__ == '__main__':
+    import time
+
+    frames = build_sample_frames()
+    decoder = DanmuDecoder()
+
+    def decode_fast(data):
+        logid, need_ack, internal_ext, messages = decoder.decode(data)
+        return logid, need_ack, internal_ext, [decoder.parse_chat(payload) for _, payload in messages]
+
+    for frame_data in frames:
+        assert decode_fast(frame_data) == decode_with_pb2(frame_data)
+    from dylr.core.dy_pb2 import PushFrame
+    assert build_push_frame('hb') == PushFrame(payloadType='hb').SerializeToString()
+    for logid, ext in ((1, ''), (2 ** 62 + 5, 'internal_src:dim|seq:1' * 10)):
+        expected = PushFrame(payloadType='ack', logid=logid, payload=ext.encode()).SerializeToString()
+        assert build_push_frame('ack', logid, ext.encode()) == expected
+    total = sum(len(decode_fast(frame_data)[3]) for frame_data in frames)
+    print(f'{len(frames)} 个数据包({total} 条弹幕)解析结果与 dy_pb2 一致')
+
+    for name, func in (('dy_pb2', decode_with_pb2), ('fast', decode_fast)):
+        rounds = 0
+        start = time.process_time()
+        while time.process_time() - start < 2:
+            for frame_data in frames:
+                func(frame_data)
+            rounds += 1
+        cost = time.process_time() - start
+        print(f'{name}: 每核每秒解析 {rounds * len(frames) / cost:.0f} 个数据包，{rounds * total / cost:.0f} 条弹幕')
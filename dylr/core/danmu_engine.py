@@ -0,0 +1,319 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 基于 asyncio 的弹幕连接管理
+        一个事件循环维护所有直播间的弹幕 websocket 连接，心跳和无弹幕检测由共用的时间轮触发，
+        因此不论同时录制多少直播间的弹幕，线程数都是固定的
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import ssl
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from websocket import ABNF, STATUS_NORMAL
+
+from dylr.core import app
+from dylr.util import logger
+
+
+class TimerWheel:
+    """ 时间轮，每次 advance 前进一格，定时精度为一格，取消的定时任务在到期时丢弃 """
+
+    def __init__(self, slots: int = 64):
+        self.slots = [[] for _ in range(slots)]
+        self.current = 0
+
+    def schedule(self, ticks: int, callback):
+        """
+        在 ticks 格之后执行 callback
+        :return: 定时任务，可传给 cancel 取消
+        """
+        ticks = max(int(ticks), 1)
+        size = len(self.slots)
+        # 元素: [还需转几圈, 回调]
+        entry = [(ticks - 1) // size, callback]
+        self.slots[(self.current + ticks) % size].append(entry)
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        entry[1] = None
+
+    def advance(self):
+        """ 前进一格，执行到期的定时任务 """
+        self.current = (self.current + 1) % len(self.slots)
+        due = []
+        remain = []
+        for entry in self.slots[self.current]:
+            if entry[1] is None:
+                continue
+            if entry[0] > 0:
+                entry[0] -= 1
+                remain.append(entry)
+            else:
+                due.append(entry[1])
+        self.slots[self.current] = remain
+        for callback in due:
+            try:
+                callback()
+            except Exception:
+                logger.error(traceback.format_exc())
+
+
+class WebSocketConnection:
+    """ 运行在事件循环上的 websocket 客户端，只实现弹幕录制需要的部分 """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    async def recv(self):
+        """ 接收一条完整的消息，连接关闭时返回 None """
+        fragments = []
+        try:
+            while True:
+                fin, opcode, data = await self._read_frame()
+                if opcode == ABNF.OPCODE_PING:
+                    self.send(data, ABNF.OPCODE_PONG)
+                    continue
+                if opcode == ABNF.OPCODE_PONG:
+                    continue
+                if opcode == ABNF.OPCODE_CLOSE:
+                    self.close()
+                    return None
+                fragments.append(data)
+                if fin:
+                    return b''.join(fragments)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            self.close()
+            return None
+
+    async def _read_frame(self):
+        head = await self.reader.readexactly(2)
+        fin = head[0] & 0x80 != 0
+        opcode = head[0] & 0x0F
+        length = head[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(await self.reader.readexactly(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(await self.reader.readexactly(8), 'big')
+        mask = await self.reader.readexactly(4) if head[1] & 0x80 else None
+        data = await self.reader.readexactly(length)
+        if mask is not None:
+            data = ABNF.mask(mask, data)
+        return fin, opcode, data
+
+    def send(self, data: bytes, opcode=ABNF.OPCODE_BINARY):
+        """ 发送一条消息，数据包很小，直接写入发送缓冲区 """
+        if self.closed:
+            return
+        self.writer.write(ABNF.create_frame(data, opcode).format())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.send(STATUS_NORMAL.to_bytes(2, 'big'), ABNF.OPCODE_CLOSE)
+        except Exception:
+            pass
+        self.closed = True
+        self.writer.close()
+
+
+async def connect(url: str, header: dict, cookie: str = None, timeout: float = 10) -> WebSocketConnection:
+    """ 建立 websocket 连接，握手请求头与 websocket-client 一致 """
+    parsed = urlparse(url)
+    secure = parsed.scheme == 'wss'
+    port = parsed.port or (443 if secure else 80)
+    hostport = parsed.hostname if port in (80, 443) else f'{parsed.hostname}:{port}'
+    resource = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parsed.hostname, port, ssl=ssl.create_default_context() if secure else None,
+                                limit=1 << 22),
+        timeout)
+    try:
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [
+            f'GET {resource} HTTP/1.1',
+            'Upgrade: websocket',
+            f'Host: {hostport}',
+            f'Origin: {"https" if secure else "http"}://{hostport}',
+            f'Sec-WebSocket-Key: {key}',
+            'Sec-WebSocket-Version: 13',
+            'Connection: Upgrade',
+        ]
+        lines.extend(f'{k}: {v}' for k, v in header.items() if v is not None)
+        if cookie:
+            lines.append(f'Cookie: {cookie}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        response = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+        status_line, *header_lines = response.decode('latin-1').split('\r\n')
+        status = status_line.split(' ', 2)
+        if len(status) < 2 or status[1] != '101':
+            raise ConnectionError(f'websocket handshake failed: {status_line}')
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                k, v = line.split(':', 1)
+                headers[k.strip().lower()] = v.strip()
+        accept = base64.b64encode(hashlib.sha1((key + '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode())
+                                  .digest()).decode()
+        if headers.get('sec-websocket-accept') != accept:
+            raise ConnectionError('websocket handshake failed: invalid Sec-WebSocket-Accept')
+    except BaseException:
+        writer.close()
+        raise
+    return WebSocketConnection(reader, writer)
+
+
+class FrameQueue:
+    """
+    连接与解析之间的有界队列，队列满时按 policy 处理新收到的数据包
+    block: 暂停读取连接，直到队列有空位
+    drop_oldest: 丢弃队列中最旧的数据包
+    sample: 队列超过一半时只保留每 sample_every 个中的一个，满了之后丢弃最旧的
+    spill: 不解析，交给 spill(item) 保存，之后再处理
+    """
+    POLICIES = ('block', 'drop_oldest', 'sample', 'spill')
+
+    def __init__(self, maxsize: int, policy: str = 'block', sample_every: int = 10, spill=None,
+                 counters: dict = None):
+        """
+        :param counters: 计数用的字典，同一个直播间的多个连接可以共用
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f'unknown overload policy {policy}')
+        if policy == 'spill' and spill is None:
+            raise ValueError('spill policy needs a spill callback')
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.sample_every = max(sample_every, 1)
+        self.spill = spill
+        self.counters = counters if counters is not None else new_counters()
+        self._sample_count = 0
+
+    async def put(self, item):
+        queue = self.queue
+        counters = self.counters
+        counters['received'] += 1
+        policy = self.policy
+        if policy == 'sample' and queue.qsize() * 2 >= queue.maxsize:
+            self._sample_count += 1
+            if self._sample_count % self.sample_every:
+                counters['sampled'] += 1
+                return
+        if queue.full():
+            if policy == 'block':
+                counters['blocked'] += 1
+                await queue.put(item)
+                return
+            if policy == 'spill':
+                counters['spilled'] += 1
+                self.spill(item)
+                return
+            queue.get_nowait()
+            counters['dropped'] += 1
+        queue.put_nowait(item)
+        if queue.qsize() > counters['max_size']:
+            counters['max_size'] = queue.qsize()
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def get_batch(self, size: int) -> list:
+        """ 至少等到一个，再取出队列中已有的，最多 size 个，结束标记 None 只会在最后 """
+        items = [await self.queue.get()]
+        while len(items) < size and items[-1] is not None and not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+    async def close(self):
+        """ 放入结束标记 None，不会被丢弃 """
+        await self.queue.put(None)
+
+
+def new_counters() -> dict:
+    """
+    received: 收到的数据包数；max_size: 队列最大长度；blocked: 队列满时暂停读取的次数；
+    dropped / sampled / spilled: 因队列满被丢弃、采样时跳过、保存到文件的数据包数
+    """
+    return {'received': 0, 'max_size': 0, 'blocked': 0, 'dropped': 0, 'sampled': 0, 'spilled': 0}
+
+
+class DanmuEngine:
+    # 时间轮每格的时长，单位：秒
+    tick = 1
+    # 执行获取弹幕地址、检测是否下播等阻塞操作的线程数
+    blocking_workers = 4
+
+    def __init__(self):
+        self.loop = None
+        self.wheel = TimerWheel()
+        self.recorders = set()
+        self.executor = ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix='danmu')
+        self._ready = threading.Event()
+
+    def start(self):
+        t = threading.Thread(target=self._run)
+        t.setDaemon(True)
+        t.start()
+        self._ready.wait()
+
+    def add(self, recorder):
+        """ 线程安全，开始录制一个直播间的弹幕，recorder 需实现 async run(engine) 和 close() """
+        asyncio.run_coroutine_threadsafe(self._record(recorder), self.loop)
+
+    def call_soon(self, callback, *args):
+        """ 线程安全，在事件循环中执行 callback """
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def run_blocking(self, func, *args):
+        """ 在线程池中执行阻塞操作，返回可 await 的对象 """
+        return self.loop.run_in_executor(self.executor, func, *args)
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._ready.set()
+        next_tick = self.loop.time()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(next_tick - self.loop.time(), 0))
+            if app.stop_all_threads:
+                for recorder in list(self.recorders):
+                    recorder.close()
+            self.wheel.advance()
+
+    async def _record(self, recorder):
+        self.recorders.add(recorder)
+        try:
+            await recorder.run(self)
+        except Exception:
+            logger.error_and_print(traceback.format_exc())
+        finally:
+            self.recorders.discard(recorder)
+
+
+engine = None
+_lock = threading.Lock()
+
+
+def get_engine() -> DanmuEngine:
+    """ 获取弹幕连接管理器，第一次调用时启动事件循环线程 """
+    global engine
+    if engine is None:
+        with _lock:
+            if engine is None:
+                e = DanmuEngine()
+                e.start()
+                engine = e
+    return engine
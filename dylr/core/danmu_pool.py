@@ -0,0 +1,98 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 在子进程中解析弹幕
+        开启后弹幕录制只负责收发数据包，数据包攒成一批交给进程池解压、解析并生成 xml 内容，
+        解析不再和视频录制争抢同一个 GIL，同时录制多个直播间时可以用上多个 CPU 核心
+        子进程只导入本文件和 danmu_decoder，不会加载配置、日志等模块
+"""
+import multiprocessing
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from dylr.core.danmu_decoder import DanmuDecoder, MsgIdCollector, CHAT_METHOD, xml_line
+
+_pool = None
+_lock = threading.Lock()
+
+# 子进程中每种 methods 组合使用一个解析器
+_decoders = {}
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """ 所有直播间共用的进程池，第一次调用时创建 """
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                # 主进程中有很多线程，fork 可能复制到被其他线程持有的锁，统一使用 spawn
+                _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def decode_batch(methods, start_time: float, xml: bool, keep_payload: bool, frames):
+    """
+    在子进程中解析一批数据包
+    :param methods: 需要的消息类型，与 DanmuDecoder 相同
+    :param start_time: 弹幕录制开始的时间戳，用于计算弹幕在 xml 中的时间
+    :param xml: 是否生成弹幕的 xml 内容
+    :param keep_payload: 是否返回消息的 payload，用于数据统计
+    :param frames: [(接收时间, PushFrame)]
+    :return: 每个数据包一项 (接收时间, logid, need_ack, internal_ext, cursor, [(msgId, method, payload, xml)])，
+             不需要的 payload 和 xml 为 None；解析出错的数据包为错误信息字符串
+    """
+    decoder = _decoders.get(methods)
+    if decoder is None:
+        decoder = _decoders[methods] = DanmuDecoder(methods)
+    results = []
+    for now, frame in frames:
+        decoder.cursor = ''
+        decoder.dedupe = ids = MsgIdCollector()
+        try:
+            logid, need_ack, internal_ext, messages = decoder.decode(frame)
+            items = []
+            for msg_id, (method, payload) in zip(ids.ids, messages):
+                line = None
+                if xml and method == CHAT_METHOD:
+                    user, content = decoder.parse_chat(payload)
+                    line = xml_line(now - start_time, now, user, content)
+                items.append((msg_id, method, payload if keep_payload else None, line))
+            results.append((now, logid, need_ack, internal_ext, decoder.cursor, items))
+        except Exception:
+            results.append(traceback.format_exc())
+    return results
+
+
+if __name__ == '__main__':
+    import os
+    import time
+
+    from dylr.core.danmu_decoder import build_sample_frames
+
+    frames = [(1700000000.0 + i, frame) for i, frame in enumerate(build_sample_frames(500))]
+    batches = [frames[i:i + 32] for i in range(0, len(frames), 32)]
+    args = ((CHAT_METHOD,), 1700000000.0, True, False)
+    rounds = 10
+
+    start, cpu = time.perf_counter(), time.process_time()
+    for _ in range(rounds):
+        for batch in batches:
+            decode_batch(*args, batch)
+    cost, cpu = time.perf_counter() - start, time.process_time() - cpu
+    total = rounds * len(frames)
+    print(f'主进程解析: 每秒 {total / cost:.0f} 个数据包，主进程 CPU 每千个数据包 {cpu / total * 1e6:.0f}ms')
+
+    for workers in sorted({2, 4, os.cpu_count() or 1}):
+        _pool = None
+        pool = get_pool(workers)
+        # 预热，启动所有子进程
+        list(pool.map(decode_batch, *zip(*[args + (batch,) for batch in batches[:workers]])))
+        start, cpu = time.perf_counter(), time.process_time()
+        futures = [pool.submit(decode_batch, *args, batch) for _ in range(rounds) for batch in batches]
+        for future in futures:
+            future.result()
+        cost, cpu = time.perf_counter() - start, time.process_time() - cpu
+        print(f'{workers} 个子进程: 每秒 {total / cost:.0f} 个数据包，主进程 CPU 每千个数据包 {cpu / total * 1e6:.0f}ms')
+        pool.shutdown()
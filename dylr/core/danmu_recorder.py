@@ -1,36 +1,138 @@
 # coding=utf-8
-import _thread
-import gzip
+import asyncio
 import os
+import random
 import time
 import traceback
 
-import websocket
-from google.protobuf import json_format
-
-from dylr.core import dy_api, app, record_manager
-from dylr.core.dy_pb2 import PushFrame, Response, ChatMessage
+from dylr.core import dy_api, app, config, danmu_writer, danmu_engine, danmu_capture, danmu_stats, danmu_pool
+from dylr.core.danmu_decoder import DanmuDecoder, MessageDedupe, CHAT_METHOD, build_push_frame
 from dylr.util import logger, cookie_utils
 
 
 class DanmuRecorder:
-    def __init__(self, room, room_real_id, start_time=None):
+    # 心跳间隔，单位：秒
+    heartbeat_period = 10
+    # 重连等待时间，每次失败翻倍，并随机缩短至多一半，避免多个直播间同时重连
+    reconnect_delay = 1
+    max_reconnect_delay = 30
+    # 连续重连失败多少次后放弃
+    max_retry = 10
+    # 用于去重的 msgId 数量
+    dedupe_size = 4096
+    # 使用子进程解析时，每批最多多少个数据包，以及每个直播间最多同时解析多少批
+    decode_batch_size = 32
+    decode_in_flight = 4
+
+    def __init__(self, room, room_real_id, start_time=None, on_close=None):
+        """ :param on_close: on_close() 在弹幕文件全部写入并关闭后调用 """
         self.room = room
         self.room_id = room.room_id
         self.room_name = room.room_name
         self.room_real_id = room_real_id
         self.start_time = start_time
+        self.on_close = on_close
         self.ws = None
         self.stop_signal = False
         self.danmu_amount = 0
         self.last_danmu_time = 0
         self.retry = 0
+        self.writer = None
+        self.raw_writer = None
+        # 处理不过来的数据包，spill 模式下使用
+        self.overflow_writer = None
+        self.stats = None
+        # 数据包队列的计数，见 danmu_engine.new_counters
+        self.overload = danmu_engine.new_counters()
+        self.dedupe = MessageDedupe(self.dedupe_size)
+        # 统计数据时还需要解析在线人数、点赞、礼物等消息
+        self.methods = danmu_stats.METHODS if config.is_danmu_stats_enabled() else (CHAT_METHOD,)
+        self.decoder = DanmuDecoder(self.methods, self.dedupe)
+        # 最后收到的 internalExt，重连时和 cursor 一起传给服务器
+        self.internal_ext = ''
+        self.engine = None
+        self.heartbeat_timer = None
+        # 长时间没有弹幕时检测是否下播的任务，同一时间最多一个
+        self.live_check = None
+        # 心跳计数，单位：秒，用于心跳时的检测
+        self.t = 0
+        # 当前连接收到的弹幕数
+        self.connection_danmu = 0
+        # 重连统计: 上一次连接断开的时间、重连次数、断开的总时长和最长时长
+        self.disconnect_time = None
+        self.reconnects = 0
+        self.gap_total = 0
+        self.gap_max = 0
 
     def start(self):
+        """ 交给弹幕连接管理器录制，不会阻塞 """
+        danmu_engine.get_engine().add(self)
+
+    def stop(self):
+        self.stop_signal = True
+        if self.engine is not None:
+            self.engine.call_soon(self.close)
+
+    def close(self):
+        """ 关闭当前连接，在事件循环中调用 """
+        if self.ws is not None:
+            self.ws.close()
+
+    async def run(self, engine):
+        """ 录制一场直播，断线后重连并继续写入同一个文件 """
+        self.engine = engine
+        self._open_writers()
+        try:
+            while not self.stop_signal:
+                await self._record()
+                if app.stop_all_threads or self.stop_signal:
+                    break
+                # 收到过弹幕说明连接正常，重新计算失败次数
+                if self.connection_danmu > 0:
+                    self.retry = 0
+                if self.retry >= self.max_retry:
+                    break
+                if not await engine.run_blocking(dy_api.is_going_on_live, self.room):
+                    break
+                self.retry += 1
+                delay = min(self.reconnect_delay * 2 ** (self.retry - 1), self.max_reconnect_delay)
+                delay *= random.uniform(0.5, 1)
+                logger.info_and_print(f'{self.room_name}({self.room_id})弹幕录制重试({self.retry})，'
+                                      f'{delay:.1f} 秒后重连')
+                await asyncio.sleep(delay)
+        finally:
+            self._close_writers()
+            if self.on_close is not None:
+                try:
+                    self.on_close()
+                except Exception:
+                    self._onError()
+            logger.info_and_print(f'{self.room_name}({self.room_id}) 弹幕录制结束，{self._summary()}')
+
+    def _summary(self) -> str:
+        dedupe = self.dedupe
+        rate = dedupe.duplicates / dedupe.total if dedupe.total else 0
+        summary = f'共 {self.danmu_amount} 条弹幕，重连 {self.reconnects} 次，' \
+                  f'断开 {self.gap_total:.1f}s(最长 {self.gap_max:.1f}s)，' \
+                  f'重复消息 {dedupe.duplicates}/{dedupe.total}({rate:.2%})'
+        overload = self.overload_summary()
+        if overload:
+            summary += '，' + overload
+        return summary
+
+    def overload_summary(self) -> str:
+        """ 弹幕过多时丢弃、跳过、保存到文件的数据包数，没有时返回空字符串 """
+        c = self.overload
+        if not (c['blocked'] or c['dropped'] or c['sampled'] or c['spilled']):
+            return ''
+        return f'弹幕过载: 收到 {c["received"]} 个数据包，最多积压 {c["max_size"]} 个，暂停接收 {c["blocked"]} 次，' \
+               f'丢弃 {c["dropped"]} 个，采样跳过 {c["sampled"]} 个，保存到溢出文件 {c["spilled"]} 个'
+
+    def _open_writers(self):
+        """ 创建本场直播的弹幕文件并写入文件头部数据，重连时继续使用 """
         if self.start_time is None:
             self.start_time = time.localtime()
         self.start_time_t = int(time.mktime(self.start_time))
-        logger.info_and_print(f'开始录制 {self.room_name}({self.room_id}) 的弹幕')
 
         if not os.path.exists("download"):
             os.mkdir("download")
@@ -39,105 +141,226 @@ class DanmuRecorder:
 
         start_time_str = time.strftime('%Y%m%d_%H%M%S', self.start_time)
         self.filename = f"download/{self.room_name}/{start_time_str}.xml"
-        # 写入文件头部数据
-        with open(self.filename, 'w', encoding='UTF-8') as file:
-            file.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>\n"
-                       "<?xml-stylesheet type=\"text/xsl\" href=\"#s\"?>\n"
-                       "<i>\n")
-        self.ws = websocket.WebSocketApp(
-            url=dy_api.get_danmu_ws_url(self.room_id, self.room_real_id),
-            header=dy_api.get_request_headers(), cookie=cookie_utils.cookie_cache,
-            on_message=self._onMessage, on_error=self._onError, on_close=self._onClose,
-            on_open=self._onOpen,
-        )
-        self.ws.run_forever()
+        mode = config.get_danmu_record_mode()
+        self.writer = danmu_writer.open_writer(self.filename) if mode != 'raw' else None
+        if mode != 'xml':
+            # 原始数据模式，保存收到的数据包，之后再用 danmu_capture 导出
+            self.raw_writer = danmu_writer.open_writer(
+                f"download/{self.room_name}/{start_time_str}{danmu_capture.EXTENSION}",
+                header=danmu_capture.file_header(self.start_time_t), footer=b'')
+        if config.is_danmu_stats_enabled():
+            self.stats = danmu_stats.DanmuStats(f"download/{self.room_name}/{start_time_str}.stats.csv",
+                                                self.start_time_t)
 
-    def stop(self):
-        self.stop_signal = True
+    async def _record(self):
+        """ 录制到连接断开为止 """
+        logger.info_and_print(f'开始录制 {self.room_name}({self.room_id}) 的弹幕')
+        self.connection_danmu = 0
+        try:
+            url = await self.engine.run_blocking(dy_api.get_danmu_ws_url, self.room_id, self.room_real_id, 0,
+                                                 self.decoder.cursor, self.internal_ext)
+            self.ws = await danmu_engine.connect(url, dy_api.get_request_headers(), cookie_utils.cookie_cache)
+        except Exception:
+            self._onError()
+            self._on_disconnect()
+            return
 
-    def _onOpen(self, ws):
-        _thread.start_new_thread(self._heartbeat, (ws,))
+        # 收到的数据包先放入队列，由 _consume 解析并写入文件，队列满时按 danmu_overload_policy 处理
+        queue = danmu_engine.FrameQueue(config.get_danmu_queue_size(), config.get_danmu_overload_policy(),
+                                        config.get_danmu_sample_every(), self._spill, self.overload)
+        if config.get_danmu_decode_workers() > 0:
+            consumer = asyncio.create_task(self._consume_in_pool(queue))
+        else:
+            consumer = asyncio.create_task(self._consume(queue))
+        self.t = 10
+        self.heartbeat_timer = self.engine.wheel.schedule(1, self._heartbeat)
+        try:
+            while True:
+                message = await self.ws.recv()
+                if message is None:
+                    break
+                await queue.put((time.time(), message))
+        finally:
+            self.engine.wheel.cancel(self.heartbeat_timer)
+            if self.live_check is not None:
+                self.live_check.cancel()
+                self.live_check = None
+            self.ws.close()
+            await queue.close()
+            await consumer
+            self._on_disconnect()
 
-    def _onMessage(self, ws: websocket.WebSocketApp, message: bytes):
-        wssPackage = PushFrame()
-        wssPackage.ParseFromString(message)
-        logid = wssPackage.logid
-        decompressed = gzip.decompress(wssPackage.payload)
-        payloadPackage = Response()
-        payloadPackage.ParseFromString(decompressed)
+    def _on_disconnect(self):
+        # 只记录第一次断开的时间，重连失败不会覆盖
+        if self.disconnect_time is None:
+            self.disconnect_time = time.time()
 
-        # 发送ack包
-        if payloadPackage.needAck:
-            obj = PushFrame()
-            obj.payloadType = 'ack'
-            obj.logid = logid
-            obj.payloadType = payloadPackage.internalExt
-            data = obj.SerializeToString()
-            ws.send(data, websocket.ABNF.OPCODE_BINARY)
+    def _close_writers(self):
+        # 写入剩余弹幕和文件尾
+        if self.writer is not None:
+            self.writer.close()
+        if self.raw_writer is not None:
+            self.raw_writer.close()
+        if self.overflow_writer is not None:
+            self.overflow_writer.close()
+            self.overflow_writer = None
+        if self.stats is not None:
+            self.stats.close(time.time())
+            self.stats = None
+
+    async def _consume(self, queue: danmu_engine.FrameQueue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            try:
+                self._onMessage(*item)
+            except Exception:
+                self._onError()
+            # 队列中有数据时 get 不会让出事件循环，处理完一个数据包后让连接读取和心跳有机会执行
+            await asyncio.sleep(0)
+
+    async def _consume_in_pool(self, queue: danmu_engine.FrameQueue):
+        """ 把数据包分批交给进程池解析，按顺序处理结果 """
+        pool = danmu_pool.get_pool(config.get_danmu_decode_workers())
+        loop = asyncio.get_running_loop()
+        # 解析中的批次，满了之后等待最早的一批处理完
+        in_flight = asyncio.Queue(self.decode_in_flight)
+        applier = asyncio.create_task(self._apply_decoded(in_flight))
+        try:
+            while True:
+                batch = await queue.get_batch(self.decode_batch_size)
+                finished = batch[-1] is None
+                if finished:
+                    batch.pop()
+                if batch:
+                    for item in batch:
+                        self._on_frame(*item)
+                    future = loop.run_in_executor(pool, danmu_pool.decode_batch, self.methods, self.start_time_t,
+                                                  self.writer is not None, self.stats is not None, batch)
+                    await in_flight.put(future)
+                if finished:
+                    return
+        finally:
+            await in_flight.put(None)
+            await applier
+
+    async def _apply_decoded(self, in_flight: asyncio.Queue):
+        while True:
+            future = await in_flight.get()
+            if future is None:
+                return
+            try:
+                results = await future
+            except Exception:
+                self._onError()
+                continue
+            lines = []
+            for result in results:
+                if isinstance(result, str):
+                    logger.error_and_print(f'[onError] {self.room_name}({self.room_id})弹幕解析抛出一个异常')
+                    logger.error_and_print(result)
+                    continue
+                now, logid, need_ack, internal_ext, cursor, items = result
+                if cursor:
+                    self.decoder.cursor = cursor
+                self._on_response(logid, need_ack, internal_ext)
+                for msg_id, method, payload, line in items:
+                    if not self.dedupe.add(msg_id):
+                        continue
+                    if self.stats is not None:
+                        self.stats.on_message(now, method, payload)
+                    if method == CHAT_METHOD:
+                        self._on_chat(now)
+                        if line is not None:
+                            lines.append(line)
+            if lines and self.writer is not None:
+                self.writer.write(''.join(lines))
+
+    def _spill(self, item):
+        """ 处理不过来的数据包原样保存，格式与原始数据模式相同 """
+        if self.overflow_writer is None:
+            start_time_str = time.strftime('%Y%m%d_%H%M%S', self.start_time)
+            self.overflow_writer = danmu_writer.open_writer(
+                f"download/{self.room_name}/{start_time_str}.overflow{danmu_capture.EXTENSION}",
+                header=danmu_capture.file_header(self.start_time_t), footer=b'')
+            logger.warning_and_print(f'{self.room_name}({self.room_id}) 弹幕过多，处理不过来的数据包将保存到溢出文件')
+        self.overflow_writer.write(danmu_capture.pack_frame(*item))
+
+    def _onMessage(self, now: float, message: bytes):
+        self._on_frame(now, message)
+        # 只解析弹幕消息，其他类型的消息直接跳过，重连后重复推送的消息也会跳过
+        logid, need_ack, internal_ext, messages = self.decoder.decode(message)
+        self._on_response(logid, need_ack, internal_ext)
         # 处理消息
-        for msg in payloadPackage.messagesList:
-            if msg.method == 'WebcastChatMessage':
-                chatMessage = ChatMessage()
-                chatMessage.ParseFromString(msg.payload)
-                data = json_format.MessageToDict(chatMessage, preserving_proto_field_name=True)
-                now = time.time()
-                second = now - self.start_time_t
-                self.danmu_amount += 1
-                self.last_danmu_time = now
-                user = data['user']['nickName']
-                content = data['content']
+        for method, payload in messages:
+            if self.stats is not None:
+                self.stats.on_message(now, method, payload)
+            if method == CHAT_METHOD:
+                self._on_chat(now)
+                if self.writer is None:
+                    # 原始数据模式不需要解析弹幕内容
+                    continue
+                user, content = self.decoder.parse_chat(payload)
                 # 写入单条数据
-                with open(self.filename, 'a', encoding='UTF-8') as file:
-                    file.write(f"  <d p=\"{round(second, 2)},1,25,16777215,"
-                               f"{int(now * 1000)},0,1602022773,0\" user=\"{user}\">{content}</d>\n")
+                self.writer.write(danmu_writer.xml_line(now - self.start_time_t, now, user, content))
                 # print(data['user']['nickName'] + ': ' + data['content'])
 
-    def _heartbeat(self, ws: websocket.WebSocketApp):
-        t = 9
-        while True:
-            if app.stop_all_threads or self.stop_signal:
-                ws.close()
-                break
-            if not ws.keep_running:
-                break
-            if t % 10 == 0:
-                obj = PushFrame()
-                obj.payloadType = 'hb'
-                data = obj.SerializeToString()
-                ws.send(data, websocket.ABNF.OPCODE_BINARY)
-                # 没弹幕，重新连接
-                if self.retry < 3 and self.danmu_amount == 0 and t > 30:
-                    ws.close()
-                    logger.warning_and_print(f'{self.room_name}({self.room_id}) 无法获取弹幕，正在重试({self.retry+1})')
-                    # time.sleep(5)
-                    # if dy_api.is_going_on_live(self.room):
-                    #     self.start_time = None  # 防止同名覆盖
-                    #     self.start()
-                    #     self.retry += 1
-                    #     break
-                now = time.time()
-                # 太长时间没弹幕，检测是否是下播了，可能下播后并没有断开 websocket
-                if t > 30 and now - self.last_danmu_time > 60:
-                    if not dy_api.is_going_on_live(self.room):
-                        ws.close()
-            t += 1
-            time.sleep(1)
-
-    def _onError(self, ws, error):
-        logger.error_and_print(f'[onError] {self.room_name}({self.room_id})弹幕录制抛出一个异常')
-        logger.error_and_print(traceback.format_exc())
+    def _on_frame(self, now: float, message: bytes):
+        """ 收到数据包，解析之前调用 """
+        if self.raw_writer is not None:
+            self.raw_writer.write(danmu_capture.pack_frame(now, message))
+        if self.disconnect_time is not None:
+            # 重连后收到的第一个数据包，记录断开了多久
+            gap = now - self.disconnect_time
+            self.disconnect_time = None
+            self.reconnects += 1
+            self.gap_total += gap
+            self.gap_max = max(self.gap_max, gap)
+            logger.info(f'{self.room_name}({self.room_id}) 弹幕重连成功，断开 {gap:.1f}s')
+
+    def _on_response(self, logid: int, need_ack: bool, internal_ext: str):
+        if internal_ext:
+            self.internal_ext = internal_ext
 
+        # 发送ack包
+        if need_ack:
+            self.ws.send(build_push_frame('ack', logid, internal_ext.encode()))
+
+    def _on_chat(self, now: float):
+        self.danmu_amount += 1
+        self.connection_danmu += 1
+        self.last_danmu_time = now
 
-    def _onClose(self, ws, a, b):
-        # 写入文件尾
-        with open(self.filename, 'a', encoding='UTF-8') as file:
-            file.write('</i>')
-        logger.info_and_print(f'{self.room_name}({self.room_id}) 弹幕录制结束')
-        if app.stop_all_threads:
+    def _heartbeat(self):
+        """ 由时间轮调用，连接建立 1 秒后第一次调用，之后每 heartbeat_period 秒一次 """
+        if self.ws.closed:
+            return
+        if app.stop_all_threads or self.stop_signal:
+            self.ws.close()
             return
-        if self.retry < 10 and dy_api.is_going_on_live(self.room):
-            self.retry += 1
-            logger.info_and_print(f'{self.room_name}({self.room_id})弹幕录制重试({self.retry})')
-            self.start_time = None
-            time.sleep(1)
-            self.start()
+        self.ws.send(build_push_frame('hb'))
+        if self.stats is not None:
+            self.stats.tick(time.time())
+        # 没弹幕，重新连接
+        if self.retry < 3 and self.connection_danmu == 0 and self.t > 30:
+            self.ws.close()
+            logger.warning_and_print(f'{self.room_name}({self.room_id}) 无法获取弹幕，正在重试({self.retry+1})')
+            return
+        # 太长时间没弹幕，检测是否是下播了，可能下播后并没有断开 websocket
+        if self.t > 30 and time.time() - self.last_danmu_time > 60 and \
+                (self.live_check is None or self.live_check.done()):
+            self.live_check = asyncio.create_task(self._check_live_end(self.ws))
+        self.t += self.heartbeat_period
+        self.heartbeat_timer = self.engine.wheel.schedule(self.heartbeat_period, self._heartbeat)
+
+    async def _check_live_end(self, ws):
+        try:
+            if not await self.engine.run_blocking(dy_api.is_going_on_live, self.room):
+                ws.close()
+        except Exception:
+            self._onError()
+
+    def _onError(self):
+        logger.error_and_print(f'[onError] {self.room_name}({self.room_id})弹幕录制抛出一个异常')
+        logger.error_and_print(traceback.format_exc())
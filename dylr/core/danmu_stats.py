@@ -0,0 +1,214 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 直播间数据统计
+        录制弹幕时顺便统计消息数、在线人数、点赞数、礼物价值和高频弹幕，每隔一段时间在录制文件旁写入一行 csv
+        只保存当前统计周期的计数、固定大小的 count-min sketch 和前 K 个高频弹幕，内存占用与直播时长无关
+"""
+import csv
+import io
+from collections import OrderedDict
+
+from dylr.core import danmu_writer
+from dylr.core.danmu_decoder import parse_fields, CHAT_METHOD
+
+ROOM_USER_SEQ_METHOD = b'WebcastRoomUserSeqMessage'
+LIKE_METHOD = b'WebcastLikeMessage'
+GIFT_METHOD = b'WebcastGiftMessage'
+MEMBER_METHOD = b'WebcastMemberMessage'
+# 需要统计的消息类型
+METHODS = (CHAT_METHOD, ROOM_USER_SEQ_METHOD, LIKE_METHOD, GIFT_METHOD, MEMBER_METHOD)
+
+CSV_HEADER = ['time', 'seconds', 'messages_per_sec', 'chats_per_sec', 'online', 'total_user',
+              'likes_per_sec', 'total_likes', 'members', 'gift_diamonds', 'total_gift_diamonds', 'top_phrases']
+
+# protobuf 字段编号
+_CHAT_FIELDS = frozenset((3,))
+_SEQ_FIELDS = frozenset((3, 7))
+_LIKE_FIELDS = frozenset((2, 3))
+_GIFT_FIELDS = frozenset((4, 5, 11, 15))
+_GIFT_STRUCT_FIELDS = frozenset((12,))
+
+
+class CountMinSketch:
+    """ count-min sketch，估计值不会小于实际出现次数 """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def add(self, key: str) -> int:
+        """ 计数加一，返回加一后的估计值 """
+        # 双重哈希生成每一行的位置
+        h1 = hash(key)
+        h2 = hash((key, 1)) | 1
+        width = self.width
+        estimate = None
+        for i, row in enumerate(self.rows):
+            index = (h1 + i * h2) % width
+            row[index] += 1
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+
+class TopK:
+    """ 用 count-min sketch 估计出现次数，只保存次数最多的 k 个 """
+
+    def __init__(self, k: int = 20, width: int = 2048, depth: int = 4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.top = {}
+        self.min_count = 0
+
+    def add(self, key: str):
+        count = self.sketch.add(key)
+        top = self.top
+        if key in top:
+            top[key] = count
+            return
+        if len(top) < self.k:
+            top[key] = count
+            self.min_count = min(top.values())
+            return
+        if count <= self.min_count:
+            return
+        del top[min(top, key=top.get)]
+        top[key] = count
+        self.min_count = min(top.values())
+
+    def items(self, n: int = None):
+        """ 按次数从多到少排列的 (内容, 估计次数) """
+        return sorted(self.top.items(), key=lambda kv: -kv[1])[:n]
+
+
+class DanmuStats:
+    # 统计周期，单位：秒
+    interval = 10
+    # 每行 csv 中写入的高频弹幕数量
+    top_phrases = 5
+    # 高频弹幕的最大长度，超出的部分不参与统计
+    max_phrase_length = 20
+    # 最多记录多少组连击礼物的数量，用于计算连击礼物的增量
+    max_gift_groups = 1024
+
+    def __init__(self, filename: str, start_time: float):
+        self.start_time = start_time
+        self.writer = danmu_writer.open_writer(filename, header=self._csv_row(CSV_HEADER), footer='')
+        self.topk = TopK()
+        self.gift_groups = OrderedDict()
+        self.period_start = start_time
+        self.online = 0
+        self.total_user = 0
+        self.total_likes = 0
+        self.total_gift_diamonds = 0
+        self._reset()
+
+    def _reset(self):
+        self.messages = 0
+        self.chats = 0
+        self.likes = 0
+        self.members = 0
+        self.gift_diamonds = 0
+
+    @staticmethod
+    def _csv_row(row) -> str:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerow(row)
+        return buf.getvalue()
+
+    def on_message(self, now: float, method: bytes, payload: bytes):
+        """ 统计一条消息，method 不在 METHODS 中的消息只计入消息数 """
+        if now - self.period_start >= self.interval:
+            self.tick(now)
+        self.messages += 1
+        try:
+            self._parse(method, payload)
+        except (ValueError, IndexError):
+            # 与定义不符的消息不影响其他统计
+            pass
+
+    def _parse(self, method: bytes, payload: bytes):
+        if method == CHAT_METHOD:
+            self.chats += 1
+            content = parse_fields(payload, _CHAT_FIELDS).get(3)
+            if content:
+                phrase = content[:self.max_phrase_length * 4].decode('utf-8', 'ignore').strip()
+                if phrase:
+                    self.topk.add(phrase[:self.max_phrase_length])
+        elif method == ROOM_USER_SEQ_METHOD:
+            fields = parse_fields(payload, _SEQ_FIELDS)
+            self.online = fields.get(3, self.online)
+            self.total_user = fields.get(7, self.total_user)
+        elif method == LIKE_METHOD:
+            fields = parse_fields(payload, _LIKE_FIELDS)
+            self.likes += fields.get(2, 0)
+            self.total_likes = max(self.total_likes, fields.get(3, 0))
+        elif method == GIFT_METHOD:
+            self._on_gift(parse_fields(payload, _GIFT_FIELDS))
+        elif method == MEMBER_METHOD:
+            self.members += 1
+
+    def _on_gift(self, fields: dict):
+        gift = fields.get(15)
+        if not gift:
+            return
+        diamond = parse_fields(gift, _GIFT_STRUCT_FIELDS).get(12, 0)
+        repeat = fields.get(5, 0) or 1
+        group_id = fields.get(11)
+        if group_id:
+            # 连击礼物每次连击都会推送一条累计数量的消息，只统计增加的数量
+            last = self.gift_groups.pop(group_id, 0)
+            self.gift_groups[group_id] = max(last, repeat)
+            if len(self.gift_groups) > self.max_gift_groups:
+                self.gift_groups.popitem(last=False)
+            repeat = max(repeat - last, 0)
+        value = diamond * (fields.get(4, 0) or 1) * repeat
+        self.gift_diamonds += value
+        self.total_gift_diamonds += value
+
+    def tick(self, now: float):
+        """ 统计周期结束时写入一行，没有消息时也需要定时调用 """
+        if now - self.period_start < self.interval:
+            return
+        self._write_row(now)
+
+    def _write_row(self, now: float):
+        """ 写入 period_start 到 now 的统计，速率按实际经过的时间计算 """
+        seconds = now - self.period_start
+        phrases = ' | '.join(f'{phrase}:{count}' for phrase, count in self.topk.items(self.top_phrases))
+        self.writer.write(self._csv_row([
+            int(now), round(now - self.start_time), round(self.messages / seconds, 2),
+            round(self.chats / seconds, 2), self.online, self.total_user, round(self.likes / seconds, 2),
+            self.total_likes, self.members, self.gift_diamonds, self.total_gift_diamonds, phrases]))
+        self.period_start = now
+        self._reset()
+
+    def close(self, now: float):
+        # 最后不满一个周期的部分
+        if now - self.period_start > 0:
+            self._write_row(now)
+        self.writer.close()
+
+
+if __name__ == '__main__':
+    import time
+
+    from dylr.core.danmu_decoder import DanmuDecoder, build_sample_frames
+
+    decoder = DanmuDecoder(METHODS)
+    messages = []
+    for frame in build_sample_frames(500):
+        messages.extend(decoder.decode(frame)[3])
+    stats = DanmuStats('/dev/null', 0)
+    start = time.process_time()
+    rounds = 0
+    while time.process_time() - start < 2:
+        for i, (method, payload) in enumerate(messages):
+            stats.on_message(rounds * 100 + i * 0.01, method, payload)
+        rounds += 1
+    cost = time.process_time() - start
+    print(f'每条消息耗时 {cost / (rounds * len(messages)) * 1e6:.2f}us')
+    print(stats.topk.items(5))
@@ -0,0 +1,140 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 弹幕文件(xml 或原始数据)的缓冲写入
+        弹幕先写入内存缓冲区，由所有直播间共用的一个后台线程定时或在缓冲区满时写入文件
+        文件头在打开时写入，文件尾在关闭时写入，程序退出时会关闭所有未关闭的文件
+"""
+import atexit
+import os
+import threading
+import time
+import traceback
+
+from dylr.core import config
+# xml_line 不依赖配置，放在 danmu_decoder 中以便在解析弹幕的子进程中使用
+from dylr.core.danmu_decoder import xml_line
+from dylr.util import logger
+
+XML_HEADER = "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n" \
+             "<?xml-stylesheet type=\"text/xsl\" href=\"#s\"?>\n" \
+             "<i>\n"
+XML_FOOTER = '</i>'
+
+# 所有未关闭的 writer
+_writers = set()
+_lock = threading.Lock()
+_cond = threading.Condition(_lock)
+_thread = None
+
+
+class DanmuWriter:
+    def __init__(self, filename: str, header=XML_HEADER, footer=XML_FOOTER):
+        """ header 为 bytes 时以二进制方式写入，此时写入的内容也需要是 bytes """
+        self.filename = filename
+        self.binary = isinstance(header, bytes)
+        if self.binary:
+            self.file = open(filename, 'wb')
+        else:
+            self.file = open(filename, 'w', encoding='UTF-8')
+        self.file.write(header)
+        self.footer = footer
+        # 待写入的弹幕，由 _lock 保护
+        self.pending = []
+        self.pending_size = 0
+        # 文件操作锁，防止后台线程写入时文件被关闭
+        self.file_lock = threading.Lock()
+        self.closed = False
+
+    def write(self, text):
+        """ 写入一条弹幕，缓冲区满时唤醒写入线程 """
+        with _lock:
+            if self.closed:
+                return
+            self.pending.append(text)
+            self.pending_size += len(text)
+            if self.pending_size >= config.get_danmu_buffer_size() * 1024:
+                _cond.notify()
+
+    def flush(self):
+        """ 将缓冲区写入文件 """
+        with self.file_lock:
+            with _lock:
+                pending = self.pending
+                self.pending = []
+                self.pending_size = 0
+            if not pending or self.file.closed:
+                return
+            self.file.write((b'' if self.binary else '').join(pending))
+            self.file.flush()
+            if config.get_danmu_fsync() == 'flush':
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        """ 写入剩余弹幕和文件尾并关闭文件，可重复调用 """
+        with _lock:
+            if self.closed:
+                return
+            self.closed = True
+            _writers.discard(self)
+        self.flush()
+        with self.file_lock:
+            if self.footer:
+                self.file.write(self.footer)
+            self.file.flush()
+            if config.get_danmu_fsync() != 'never':
+                os.fsync(self.file.fileno())
+            self.file.close()
+
+
+def open_writer(filename: str, header=XML_HEADER, footer=XML_FOOTER) -> DanmuWriter:
+    """ 创建文件并写入文件头，默认为 xml 文件 """
+    global _thread
+    writer = DanmuWriter(filename, header, footer)
+    with _lock:
+        _writers.add(writer)
+        if _thread is None:
+            _thread = threading.Thread(target=_write_thread)
+            _thread.setDaemon(True)
+            _thread.start()
+    return writer
+
+
+def flush_all():
+    with _lock:
+        writers = list(_writers)
+    for writer in writers:
+        try:
+            writer.flush()
+        except Exception:
+            logger.error(traceback.format_exc())
+
+
+def close_all():
+    """ 关闭所有文件，程序退出时调用，保证 xml 文件完整 """
+    with _lock:
+        writers = list(_writers)
+    for writer in writers:
+        try:
+            writer.close()
+        except Exception:
+            logger.error(traceback.format_exc())
+
+
+def _write_thread():
+    while True:
+        interval = config.get_danmu_flush_interval()
+        deadline = time.monotonic() + interval
+        with _lock:
+            # 等到刷新时间，或者有 writer 缓冲区已满
+            while True:
+                full = any(w.pending_size >= config.get_danmu_buffer_size() * 1024 for w in _writers)
+                remaining = deadline - time.monotonic()
+                if full or remaining <= 0:
+                    break
+                _cond.wait(remaining)
+        flush_all()
+
+
+atexit.register(close_all)
@@ -6,17 +6,27 @@
 """
 import json
 import random
+import threading
 import time
+from collections import OrderedDict
+from urllib.parse import quote
 
-import jsengine
-import requests
-
-from dylr.core.abogus import ABogus
+from dylr.core import config
+from dylr.core.abogus import get_abogus_pool
+from dylr.core.api_url_pool import ApiUrlPool
 from dylr.core.room_info import RoomInfo
-from dylr.util import cookie_utils, logger, url_utils
+from dylr.util import cookie_utils, logger, url_utils, http_utils, danmu_sign
 
 
 def get_api_url(room_id):
+    """ 获取直播间状态接口地址，开启预签名地址池时从池中取用 """
+    if config.is_api_url_pool_enabled():
+        return api_url_pool.get(room_id)
+    return build_api_url(room_id)
+
+
+def build_api_url(room_id):
+    """ 生成带 msToken 和 a_bogus 签名的直播间状态接口地址 """
     ms_token = generate_random_str(188)
 
     url_base = 'https://live.douyin.com/webcast/room/web/enter/'
@@ -24,8 +34,8 @@ def get_api_url(room_id):
                  '&screen_width=2195&screen_height=1235&browser_language=en&browser_platform=Win32&browser_name=Chrome&browser_version=140.0.0.0' \
                  f'&web_rid={room_id}&enter_source=&is_need_double_stream=false&insert_task_id=&live_reason=&msToken={ms_token}'
 
-    abogus = ABogus(user_agent=get_request_headers()['user-agent'])
-    signed_query_string, _, _, _ = abogus.generate_abogus(params=url_params, body='')
+    abogus_pool = get_abogus_pool(get_request_headers()['user-agent'])
+    signed_query_string, _, _, _ = abogus_pool.generate_abogus(params=url_params, body='')
 
     api_url = url_base + '?' + signed_query_string
     logger.debug(f'api_url: {api_url}')
@@ -33,6 +43,10 @@ def get_api_url(room_id):
     return api_url
 
 
+# 预签名的接口地址池，后台生成，检测时直接取用
+api_url_pool = ApiUrlPool(build_api_url)
+
+
 def find_stream_url(room):
     json_info = get_live_state_json(room.room_id)
     if json_info is None:
@@ -41,51 +55,113 @@ def find_stream_url(room):
     return stream_url
 
 
-def get_live_state_json(room_id):
+class _LiveStateFlight:
+    """ 一次正在进行的直播间状态请求，同一直播间的并发请求共用其结果 """
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# 直播间状态缓存，web_rid -> (获取时间, 接口返回的json)，按获取时间先后排列，方便清理过期项
+_live_state_cache = OrderedDict()
+# 正在请求中的直播间，web_rid -> _LiveStateFlight
+_live_state_flights = {}
+_live_state_lock = threading.Lock()
+
+
+def get_live_state_response(room_id):
+    """
+    获取直播间状态接口返回的完整json，失败返回None
+    config.live_state_cache_ttl 秒内的结果直接从缓存返回，同一直播间同时只会发出一个请求，其余调用等待并共用该请求的结果
+    """
+    key = str(room_id)
+    with _live_state_lock:
+        now = time.monotonic()
+        ttl = config.get_live_state_cache_ttl()
+        # 清理过期的缓存
+        while _live_state_cache:
+            oldest_key, (fetch_time, _) = next(iter(_live_state_cache.items()))
+            if now - fetch_time < ttl:
+                break
+            del _live_state_cache[oldest_key]
+        if key in _live_state_cache:
+            return _live_state_cache[key][1]
+        flight = _live_state_flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _LiveStateFlight()
+            _live_state_flights[key] = flight
+
+    if not leader:
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _request_live_state(room_id)
+    except Exception as err:
+        flight.error = err
+        raise
+    finally:
+        with _live_state_lock:
+            del _live_state_flights[key]
+            if _is_live_state_valid(flight.result):
+                _live_state_cache.pop(key, None)
+                _live_state_cache[key] = (time.monotonic(), flight.result)
+        flight.event.set()
+    return flight.result
+
+
+def _is_live_state_valid(info_json) -> bool:
+    """ 只缓存正常返回了直播间信息的结果，系统繁忙等结果不缓存 """
+    try:
+        return len(info_json['data']['data']) > 0
+    except (TypeError, KeyError):
+        return False
+
+
+def _request_live_state(room_id):
     api_url = get_api_url(room_id)
-    req = requests.get(api_url, headers=get_request_headers(), proxies=get_proxies())
+    req = http_utils.get(api_url, headers=get_request_headers(), proxies=get_proxies())
     res = req.text
     if '系统繁忙，请稍后再试' in res:
         cookie_utils.record_cookie_failed()
     try:
-        info_json = json.loads(res)
+        return json.loads(res)
     except:
         logger.debug(f'failed to load response of GET to json when searching stream url of {room_id}, using api 1, '
                      f'response: ' + res)
         cookie_utils.record_cookie_failed()
         return None
+
+
+def get_live_state_json(room_id):
+    info_json = get_live_state_response(room_id)
+    if info_json is None:
+        return None
     try:
         info_json = info_json['data']['data'][0]
     except:
         logger.debug(f'failed to load json when searching stream url of {room_id}, using api 1, '
-                     f'response: ' + res)
+                     f'response: ' + json.dumps(info_json, ensure_ascii=False))
         cookie_utils.record_cookie_failed()
         return None
     return info_json
 
 
-def get_danmu_ws_url(room_id, live_room_real_id, retry=0):
+def get_danmu_ws_url(room_id, live_room_real_id, retry=0, cursor=None, internal_ext=None):
+    """
+    :param cursor: 重连时传入上一次连接最后收到的 cursor 和 internalExt，从断开的位置继续推送
+    """
     # 2024.6.20 接口更新，需要signature参数
     # 代码来源：https://github.com/biliup/biliup/blob/master/biliup/Danmaku/douyin_util/__init__.py
     user_unique_id = random.randint(7300000000000000000, 7999999999999999999)
 
-    with open(r'dylr/util/webmssdk.js', 'r', encoding='utf-8') as f:
-        js_enc = f.read()
-
     ua = get_request_headers()['user-agent']
-
-    ctx = jsengine.jsengine()
-    js_dom = f"""
-document = {{}}
-window = {{}}
-navigator = {{
-  'userAgent': '{ua}'
-}}
-""".strip()
-    final_js = js_dom + js_enc
-    ctx.eval(final_js)
-    function_caller = f"get_sign('{url_utils.get_ms_stub(live_room_real_id, user_unique_id)}')"
-    signature = ctx.eval(function_caller)
+    signature = danmu_sign.get_sign(ua, url_utils.get_ms_stub(live_room_real_id, user_unique_id),
+                                    config.get_danmu_sign_backend(), config.get_danmu_sign_pool_size())
 
     webcast5_params = {
         "room_id": live_room_real_id,
@@ -98,6 +174,10 @@ navigator = {{
         "identity": "audience",
         "signature": signature,
     }
+    if cursor:
+        webcast5_params['cursor'] = quote(cursor, safe='')
+    if internal_ext:
+        webcast5_params['internal_ext'] = quote(internal_ext, safe='')
     uri = url_utils.build_request_url(
         f"wss://webcast5-ws-web-lf.douyin.com/webcast/im/push/v2/?{'&'.join([f'{k}={v}' for k, v in webcast5_params.items()])}",
         ua)
@@ -108,11 +188,11 @@ navigator = {{
 
 
 def get_web_rid_from_short_url(url: str):
-    resp = requests.head(url, headers=get_request_headers(), proxies=get_proxies())
+    resp = http_utils.head(url, headers=get_request_headers(), proxies=get_proxies())
     full_uri = resp.headers.get('location')
     room_id = full_uri[full_uri.index('reflow/') + 7:full_uri.index('?')]
     api = f'https://webcast.amemv.com/webcast/room/reflow/info/?type_id=0&live_id=1&room_id={room_id}&app_id=1128'
-    resp = requests.get(api, headers=get_request_headers(), proxies=get_proxies())
+    resp = http_utils.get(api, headers=get_request_headers(), proxies=get_proxies())
     json_root = json.loads(resp.text)
     return json_root['data']['room']['owner']['web_rid']
 
@@ -132,10 +212,10 @@ def get_user_info(sec_user_id):
     }
     prefix = 'https://www.douyin.com/aweme/v1/web/aweme/post/?'
     query = f'device_platform=webapp&aid=6383&channel=channel_pc_web&sec_user_id={sec_user_id}&max_cursor=0&locate_query=false&show_live_replay_strategy=1&count=1&publish_video_strategy_type=2&pc_client_type=1&version_code=170400&version_name=17.4.0&cookie_enabled=true&screen_width=2195&screen_height=1235&browser_language=zh-CN&browser_platform=Win32&browser_name=Chrome&browser_version=100.0.4896.75&browser_online=true&engine_name=Blink&engine_version=100.0.4896.75&os_name=Windows&os_version=10&cpu_core_num=12&device_memory=8&platform=PC&downlink=10&effective_type=4g&round_trip_time=0&webid=7201842352902161920&msToken={ms_token}'
-    response = json.loads(requests.post(
+    response = json.loads(http_utils.post(
         "http://47.115.208.101:9090/xb", data={"param": query}, headers=headers).text)
     params = response["param"]
-    resp = requests.get(prefix + params,
+    resp = http_utils.get(prefix + params,
                         headers=headers, proxies=get_proxies())
     nickname_index = resp.text.find('nickname')
     if nickname_index == -1:
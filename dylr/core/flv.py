@@ -0,0 +1,526 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 录制时实时修复 flv
+        边写入边解析 flv tag：时间戳从 0 开始并保证单调递增，时间戳跳变时接在上一帧之后，丢弃损坏的 tag，
+        结束时在文件开头预留的位置写入 onMetaData(时长、文件大小、关键帧位置)，录制完即可正常播放和拖动进度条，不需要再修复
+        可以按大小或时长分段，在视频关键帧处切分，每段都以 flv header、onMetaData 和 AVC/AAC sequence header 开头，可以单独播放
+        用法: python -m dylr.core.flv 输入.flv 输出.flv  (修复已录制的文件)
+              python -m dylr.core.flv --benchmark  (生成带错误的 flv，检查修复结果并测试速度)
+"""
+import struct
+
+TAG_AUDIO = 8
+TAG_VIDEO = 9
+TAG_SCRIPT = 18
+TAG_HEADER_SIZE = 11
+# 超过该大小的 tag 视为损坏，避免把错误数据当作 tag 长度而等待大量数据
+MAX_TAG_SIZE = 8 * 1024 * 1024
+# 时间戳向前跳超过 MAX_JUMP 或向后退超过 MAX_BACK(毫秒)时视为跳变
+MAX_JUMP = 3000
+MAX_BACK = 1000
+# 时间戳跳变时使用的默认帧间隔(毫秒)，正常时使用最近一次的帧间隔
+DEFAULT_DELTA = {TAG_AUDIO: 23, TAG_VIDEO: 33}
+# onMetaData 中预留的关键帧数量，超过时均匀抽取，每个关键帧约占 18 字节
+KEYFRAME_CAPACITY = 4096
+# 由本模块写入的 onMetaData 属性，原始 onMetaData 中的同名属性会被替换
+META_KEYS = ('duration', 'filesize', 'lastkeyframetimestamp', 'lastkeyframelocation', 'keyframes', '_padding')
+# '_padding' 属性名和长字符串的类型、长度，用于把 onMetaData 填充到预留的大小
+PAD_OVERHEAD = 2 + len('_padding') + 1 + 4
+
+
+class AmfError(ValueError):
+    pass
+
+
+def amf_read(data, pos: int = 0):
+    """ 读取一个 AMF0 值，返回 (值, 结束位置)，ECMA array 和 object 均返回 dict，date 返回时间戳 """
+    try:
+        marker = data[pos]
+        pos += 1
+        if marker == 0:
+            return struct.unpack_from('>d', data, pos)[0], pos + 8
+        if marker == 1:
+            return data[pos] != 0, pos + 1
+        if marker == 2:
+            n = struct.unpack_from('>H', data, pos)[0]
+            return bytes(data[pos + 2:pos + 2 + n]).decode('utf-8', 'replace'), pos + 2 + n
+        if marker == 12:
+            n = struct.unpack_from('>I', data, pos)[0]
+            return bytes(data[pos + 4:pos + 4 + n]).decode('utf-8', 'replace'), pos + 4 + n
+        if marker in (3, 8):
+            if marker == 8:
+                pos += 4
+            res = {}
+            while True:
+                n = struct.unpack_from('>H', data, pos)[0]
+                if n == 0 and data[pos + 2] == 9:
+                    return res, pos + 3
+                key = bytes(data[pos + 2:pos + 2 + n]).decode('utf-8', 'replace')
+                res[key], pos = amf_read(data, pos + 2 + n)
+        if marker == 10:
+            n = struct.unpack_from('>I', data, pos)[0]
+            pos += 4
+            res = []
+            for _ in range(n):
+                value, pos = amf_read(data, pos)
+                res.append(value)
+            return res, pos
+        if marker == 11:
+            return struct.unpack_from('>d', data, pos)[0], pos + 10
+        if marker in (5, 6):
+            return None, pos
+    except (IndexError, struct.error) as e:
+        raise AmfError(str(e))
+    raise AmfError(f'unsupported amf type {marker}')
+
+
+def _amf_key(key: str) -> bytes:
+    key = key.encode('utf-8')
+    return struct.pack('>H', len(key)) + key
+
+
+def amf_write(value) -> bytes:
+    """ 写入一个 AMF0 值，dict 写为 object，list 写为 strict array """
+    if value is None:
+        return b'\x05'
+    if isinstance(value, bool):
+        return b'\x01' + (b'\x01' if value else b'\x00')
+    if isinstance(value, (int, float)):
+        return b'\x00' + struct.pack('>d', value)
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        if len(data) > 0xffff:
+            return b'\x0c' + struct.pack('>I', len(data)) + data
+        return b'\x02' + struct.pack('>H', len(data)) + data
+    if isinstance(value, dict):
+        return b'\x03' + b''.join(_amf_key(k) + amf_write(v) for k, v in value.items()) + b'\x00\x00\x09'
+    if isinstance(value, list):
+        return b'\x0a' + struct.pack('>I', len(value)) + b''.join(amf_write(v) for v in value)
+    raise AmfError(f'unsupported type {type(value)}')
+
+
+def is_keyframe(data) -> bool:
+    """ 视频 tag 的数据是否为关键帧(不包括 AVC/HEVC sequence header) """
+    return len(data) >= 2 and data[0] >> 4 == 1 and not (data[0] & 0x0f in (7, 12) and data[1] == 0)
+
+
+def is_sequence_header(tag_type: int, data) -> bool:
+    """ 是否为 AVC/HEVC 或 AAC 的 sequence header，解码器需要它才能解码之后的数据 """
+    if len(data) < 2:
+        return False
+    if tag_type == TAG_VIDEO:
+        return data[0] & 0x0f in (7, 12) and data[1] == 0
+    if tag_type == TAG_AUDIO:
+        return data[0] >> 4 == 10 and data[1] == 0
+    return False
+
+
+def _tag(out: bytearray, tag_type: int, timestamp: int, data):
+    """ 在 out 后添加一个 tag """
+    size = len(data)
+    out += bytes([tag_type]) + size.to_bytes(3, 'big') + (timestamp & 0xffffff).to_bytes(3, 'big') + \
+        bytes([(timestamp >> 24) & 0xff]) + b'\x00\x00\x00'
+    out += data
+    out += struct.pack('>I', TAG_HEADER_SIZE + size)
+    return out
+
+
+class FlvWriter:
+    """
+    实现了 write 和 close，接收原始直播流，写入修复后的 flv
+    开头不是 flv 的数据(例如 404 页面)原样写入，不分段
+    """
+
+    def __init__(self, filename: str, opener=None, max_size: int = 0, max_duration: float = 0,
+                 new_filename=None, on_segment=None):
+        """
+        :param opener: opener(filename) 返回以二进制方式写入的文件，默认为 open(filename, 'wb')
+        :param max_size: 每段的最大大小，单位：字节，0 为不限制，在超过后的第一个关键帧处分段
+        :param max_duration: 每段的最大时长，单位：秒，0 为不限制
+        :param new_filename: new_filename() 返回下一段的文件名，为 None 时不分段，返回当前文件名时推迟到下一个关键帧
+        :param on_segment: on_segment(filename) 在一段写入完成时调用(不包括最后一段)
+        """
+        self.filename = filename
+        self.opener = opener or (lambda name: open(name, 'wb'))
+        self.max_size = max_size
+        self.max_duration = max_duration * 1000
+        # 限制每段时长时按每秒一个关键帧预留，一般直播 1~2 秒一个关键帧，更密时同样均匀抽取
+        self.keyframe_capacity = min(KEYFRAME_CAPACITY, int(max_duration) + 1) if max_duration else KEYFRAME_CAPACITY
+        self.new_filename = new_filename
+        self.on_segment = on_segment
+        self.file = self.opener(filename)
+        self.buf = bytearray()
+        self.header = None
+        self.passthrough = False
+        # 原始 onMetaData 中的属性
+        self.props = {}
+        # 输入的时间戳 + offset = 输出的时间戳
+        self.offset = None
+        self.last_ts = 0
+        self.last = {TAG_AUDIO: 0, TAG_VIDEO: 0}
+        self.delta = dict(DEFAULT_DELTA)
+        # 最近的 sequence header，每段开头都要写入
+        self.seq_headers = {}
+        # 当前文件
+        self.size = 0
+        self.meta_offset = None
+        self.meta_size = 0
+        self.start_ts = 0
+        self.end_ts = 0
+        self.keyframes = []
+        self.segments = 1
+        # 统计
+        self.tags = 0
+        self.dropped_tags = 0
+        self.dropped_bytes = 0
+        self.jumps = 0
+
+    def write(self, data) -> int:
+        n = len(data)
+        if self.passthrough:
+            self.file.write(data)
+            return n
+        self.buf += data
+        out = bytearray()
+        if self.header is None:
+            if len(self.buf) < 13:
+                return n
+            if self.buf[:3] != b'FLV':
+                self.passthrough = True
+                self.file.write(self.buf)
+                self.buf = bytearray()
+                return n
+            header_size = struct.unpack_from('>I', self.buf, 5)[0]
+            self.header = b'FLV\x01' + bytes([self.buf[4] & 0x05]) + b'\x00\x00\x00\x09\x00\x00\x00\x00'
+            # header 中的大小错误时按标准的 9 字节处理
+            skip = header_size + 4 if 9 <= header_size <= 64 else 13
+            del self.buf[:skip]
+        pos = self._parse(out)
+        if pos:
+            del self.buf[:pos]
+        if out:
+            self._output(out)
+        return n
+
+    def _output(self, out):
+        self.file.write(out)
+        self.size += len(out)
+
+    def _check(self, pos: int):
+        """
+        检查 pos 处是否为完整、正确的 tag
+        :return: 数据不足时返回 None，否则返回 tag 是否正确
+        """
+        buf = self.buf
+        if len(buf) - pos < TAG_HEADER_SIZE:
+            return None
+        tag_type = buf[pos] & 0x1f
+        size = int.from_bytes(buf[pos + 1:pos + 4], 'big')
+        if tag_type not in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT) or buf[pos] & 0xe0 or size > MAX_TAG_SIZE \
+                or buf[pos + 8:pos + 11] != b'\x00\x00\x00':
+            return False
+        end = pos + TAG_HEADER_SIZE + size
+        if len(buf) < end + 4:
+            return None
+        return struct.unpack_from('>I', buf, end)[0] == TAG_HEADER_SIZE + size
+
+    def _parse(self, out, final: bool = False) -> int:
+        """ 解析 buf 中完整的 tag，写入 out，返回已处理到的位置 """
+        buf = self.buf
+        pos = 0
+        while True:
+            ok = self._check(pos)
+            if ok is None:
+                if final and pos < len(buf):
+                    # 结尾不完整的 tag
+                    self.dropped_tags += 1
+                    self.dropped_bytes += len(buf) - pos
+                    pos = len(buf)
+                return pos
+            if not ok:
+                # 损坏的数据，逐字节向后寻找下一个正确的 tag
+                start = pos
+                pos += 1
+                while self._check(pos) is False:
+                    pos += 1
+                self.dropped_tags += 1
+                self.dropped_bytes += pos - start
+                continue
+            size = int.from_bytes(buf[pos + 1:pos + 4], 'big')
+            tag_type = buf[pos] & 0x1f
+            timestamp = int.from_bytes(buf[pos + 4:pos + 7], 'big') | buf[pos + 7] << 24
+            data = memoryview(buf)[pos + TAG_HEADER_SIZE:pos + TAG_HEADER_SIZE + size]
+            try:
+                self._on_tag(out, tag_type, timestamp, data)
+            finally:
+                data.release()
+            pos += TAG_HEADER_SIZE + size + 4
+
+    def _on_tag(self, out, tag_type: int, timestamp: int, data):
+        self.tags += 1
+        if tag_type == TAG_SCRIPT:
+            name = None
+            try:
+                name, end = amf_read(data)
+                if name == 'onMetaData' and self.meta_offset is None:
+                    props, _ = amf_read(data, end)
+                    if isinstance(props, dict):
+                        self.props = {k: v for k, v in props.items() if k not in META_KEYS}
+            except AmfError:
+                pass
+            if self.meta_offset is None:
+                self._start_file(out)
+            # onMetaData 由本模块写入，直播流中重复的 onMetaData 丢弃，其他脚本数据保留
+            if name != 'onMetaData':
+                _tag(out, TAG_SCRIPT, max(self.last_ts - self.start_ts, 0), data)
+            return
+        if not len(data):
+            self.dropped_tags += 1
+            self.dropped_bytes += TAG_HEADER_SIZE + 4
+            return
+        ts = self._fix_timestamp(tag_type, timestamp)
+        if self.meta_offset is None:
+            self._start_file(out)
+        if is_sequence_header(tag_type, data):
+            self.seq_headers[tag_type] = bytes(data)
+        if tag_type == TAG_VIDEO and is_keyframe(data):
+            if self._need_split(ts, len(out)):
+                self._split(out, ts)
+            self.keyframes.append(((ts - self.start_ts) / 1000, self.size + len(out)))
+        # 分段后音频的时间戳可能比开头的关键帧略小
+        _tag(out, tag_type, max(ts - self.start_ts, 0), data)
+        self.end_ts = ts
+
+    def _fix_timestamp(self, tag_type: int, timestamp: int) -> int:
+        if self.offset is None:
+            self.offset = -timestamp
+        ts = timestamp + self.offset
+        if ts > self.last_ts + MAX_JUMP or ts < self.last_ts - MAX_BACK:
+            # 时间戳跳变(推流端重连、服务器切换等)，接在同类型的上一帧之后
+            self.jumps += 1
+            ts = self.last[tag_type] + self.delta[tag_type]
+            self.offset = ts - timestamp
+        if ts < self.last[tag_type]:
+            ts = self.last[tag_type]
+        elif 0 < ts - self.last[tag_type] < MAX_BACK:
+            self.delta[tag_type] = ts - self.last[tag_type]
+        self.last[tag_type] = ts
+        if ts > self.last_ts:
+            self.last_ts = ts
+        return ts
+
+    def _need_split(self, ts: int, pending: int) -> bool:
+        if self.new_filename is None or not self.keyframes:
+            return False
+        return self.max_size and self.size + pending >= self.max_size or \
+            self.max_duration and ts - self.start_ts >= self.max_duration
+
+    def _split(self, out, ts: int):
+        """ 结束当前文件，从时间戳为 ts 的关键帧开始写入新文件 """
+        filename = self.new_filename()
+        if filename == self.filename:
+            return
+        self._output(out)
+        out.clear()
+        self.file.close()
+        self._finish_file(self.filename)
+        finished = self.filename
+        self.filename = filename
+        self.file = self.opener(filename)
+        self.size = 0
+        self.meta_offset = None
+        self.start_ts = self.end_ts = ts
+        self.keyframes = []
+        self.segments += 1
+        self._start_file(out)
+        for tag_type in (TAG_VIDEO, TAG_AUDIO):
+            if tag_type in self.seq_headers:
+                _tag(out, tag_type, 0, self.seq_headers[tag_type])
+        if self.on_segment is not None:
+            self.on_segment(finished)
+
+    def _metadata(self, keyframes, pad: int = None) -> bytes:
+        """ :param pad: 填充到的大小，为 None 时返回不带填充的数据 """
+        props = dict(self.props)
+        props['duration'] = (self.end_ts - self.start_ts) / 1000
+        props['filesize'] = float(self.size)
+        props['lastkeyframetimestamp'] = keyframes[-1][0] if keyframes else 0.0
+        props['lastkeyframelocation'] = float(keyframes[-1][1]) if keyframes else 0.0
+        props['keyframes'] = {'times': [float(t) for t, _ in keyframes],
+                              'filepositions': [float(p) for _, p in keyframes]}
+        data = amf_write('onMetaData') + b'\x08' + struct.pack('>I', len(props) + (pad is not None)) + \
+            b''.join(_amf_key(k) + amf_write(v) for k, v in props.items())
+        if pad is not None:
+            n = pad - len(data) - PAD_OVERHEAD - 3
+            data += _amf_key('_padding') + b'\x0c' + struct.pack('>I', n) + b' ' * n
+        return data + b'\x00\x00\x09'
+
+    def _start_file(self, out):
+        """ 写入 flv header 和预留位置的 onMetaData """
+        out += self.header
+        self.meta_offset = self.size + len(out)
+        data = self._metadata([(0.0, 0)] * self.keyframe_capacity)
+        self.meta_size = len(data) + PAD_OVERHEAD
+        _tag(out, TAG_SCRIPT, 0, self._metadata([], self.meta_size))
+
+    def _finish_file(self, filename: str):
+        """ 关闭文件后，将真实的 onMetaData 写入预留的位置 """
+        if self.meta_offset is None:
+            return
+        keyframes = self.keyframes
+        capacity = self.keyframe_capacity
+        if len(keyframes) > capacity:
+            # 均匀抽取，保留第一个和最后一个关键帧
+            step = (len(keyframes) - 1) / (capacity - 1)
+            keyframes = [keyframes[round(i * step)] for i in range(capacity)]
+        data = _tag(bytearray(), TAG_SCRIPT, 0, self._metadata(keyframes, self.meta_size))
+        with open(filename, 'r+b') as f:
+            f.seek(self.meta_offset)
+            f.write(data)
+
+    def close(self):
+        out = bytearray()
+        if not self.passthrough:
+            if self.header is None:
+                # 不足 13 字节，无法判断是否为 flv
+                out += self.buf
+            else:
+                self._parse(out, final=True)
+            self.buf = bytearray()
+        if out:
+            self._output(out)
+        self.file.close()
+        self._finish_file(self.filename)
+
+    def summary(self) -> str:
+        return f'{self.tags} 个 tag，丢弃损坏的数据 {self.dropped_tags} 处({self.dropped_bytes} 字节)，' \
+               f'修正时间戳跳变 {self.jumps} 次，共 {self.segments} 段'
+
+
+def read_tags(filename: str):
+    """ 读取 flv 文件中的 tag，返回 [(类型, 时间戳, 数据)] 和文件头，用于检查修复结果 """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    header_size = struct.unpack_from('>I', data, 5)[0]
+    pos = header_size + 4
+    tags = []
+    while pos + TAG_HEADER_SIZE <= len(data):
+        tag_type = data[pos] & 0x1f
+        size = int.from_bytes(data[pos + 1:pos + 4], 'big')
+        timestamp = int.from_bytes(data[pos + 4:pos + 7], 'big') | data[pos + 7] << 24
+        end = pos + TAG_HEADER_SIZE + size
+        if end + 4 > len(data) or struct.unpack_from('>I', data, end)[0] != TAG_HEADER_SIZE + size:
+            raise ValueError(f'bad tag at {pos}')
+        tags.append((tag_type, timestamp, data[pos + TAG_HEADER_SIZE:end], pos))
+        pos = end + 4
+    return tags, data[:header_size]
+
+
+def sample_stream(seconds: int, start: int = 987654321, jump_at: float = None, garbage_at: float = None,
+                  gop: int = 60) -> bytes:
+    """ 生成 30fps 视频、约 43fps 音频的 flv 直播流，可在指定时间插入时间戳跳变和损坏的数据 """
+    import random
+    rnd = random.Random(0)
+    out = bytearray(b'FLV\x01\x05\x00\x00\x00\x09\x00\x00\x00\x00')
+    meta = amf_write('onMetaData') + b'\x08' + struct.pack('>I', 3) + _amf_key('width') + amf_write(1920) + \
+        _amf_key('height') + amf_write(1080) + _amf_key('duration') + amf_write(0) + b'\x00\x00\x09'
+    _tag(out, TAG_SCRIPT, 0, meta)
+    _tag(out, TAG_VIDEO, 0, b'\x17\x00\x00\x00\x00\x01\x64\x00\x28\xff\xe1')
+    _tag(out, TAG_AUDIO, 0, b'\xaf\x00\x12\x10')
+    events = []
+    for i in range(seconds * 30):
+        events.append((i * 1000 / 30, TAG_VIDEO, i))
+    for i in range(int(seconds * 1000 / 23)):
+        events.append((i * 23, TAG_AUDIO, i))
+    events.sort()
+    shift = 0
+    for t, tag_type, i in events:
+        if jump_at is not None and t >= jump_at * 1000 and not shift:
+            shift = 100000
+        if garbage_at is not None and t >= garbage_at * 1000:
+            garbage_at = None
+            out += bytes(rnd.getrandbits(8) for _ in range(777))
+        ts = int(start + t + shift)
+        if tag_type == TAG_VIDEO:
+            data = (b'\x17\x01' if i % gop == 0 else b'\x27\x01') + b'\x00\x00\x00' + \
+                rnd.randbytes(40000 if i % gop == 0 else 6000)
+        else:
+            data = b'\xaf\x01' + rnd.randbytes(300)
+        _tag(out, tag_type, ts, data)
+    # 最后一个 tag 不完整
+    out += _tag(bytearray(), TAG_VIDEO, int(start + seconds * 1000 + shift), b'\x27\x01' + bytes(5000))[:3000]
+    return bytes(out)
+
+
+def _benchmark():
+    import os
+    import tempfile
+    import time
+
+    stream = sample_stream(120, jump_at=40, garbage_at=80)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'a.flv')
+        start = time.perf_counter()
+        writer = FlvWriter(filename)
+        for i in range(0, len(stream), 256 * 1024):
+            writer.write(stream[i:i + 256 * 1024])
+        writer.close()
+        cost = time.perf_counter() - start
+        tags, _ = read_tags(filename)
+        size = os.path.getsize(filename)
+    print(f'{len(stream) / 1024 / 1024:.0f}MB，{len(stream) / 1024 / 1024 / cost:.0f}MB/s，{writer.summary()}')
+    meta, end = amf_read(tags[0][2])
+    meta, _ = amf_read(tags[0][2], end)
+    last = {}
+    monotonic = True
+    for tag_type, ts, _, _ in tags[1:]:
+        monotonic &= ts >= last.get(tag_type, 0)
+        last[tag_type] = ts
+    keyframes = meta['keyframes']
+    video_tags = {pos: data for tag_type, _, data, pos in tags if tag_type == TAG_VIDEO}
+    seekable = all(is_keyframe(video_tags.get(int(p), b'')) for p in keyframes['filepositions'])
+    print(f'时长 {meta["duration"]:.1f}s，文件大小正确: {meta["filesize"] == size}，'
+          f'关键帧 {len(keyframes["times"])} 个，位置正确: {seekable}，时间戳单调递增: {monotonic}')
+
+    # 每 25 秒分段，关键帧间隔 2 秒，应在 26、52、78、104 秒处分段
+    with tempfile.TemporaryDirectory() as tmp:
+        names = iter(os.path.join(tmp, f'{i}.flv') for i in range(1, 100))
+        finished = []
+        writer = FlvWriter(os.path.join(tmp, '0.flv'), max_duration=25, new_filename=lambda: next(names),
+                           on_segment=finished.append)
+        for i in range(0, len(stream), 256 * 1024):
+            writer.write(stream[i:i + 256 * 1024])
+        writer.close()
+        finished.append(writer.filename)
+        for filename in finished:
+            tags, _ = read_tags(filename)
+            meta, end = amf_read(tags[0][2])
+            meta, _ = amf_read(tags[0][2], end)
+            first = [t for t in tags[1:] if t[0] == TAG_VIDEO and not is_sequence_header(TAG_VIDEO, t[2])][0]
+            ok = is_sequence_header(TAG_VIDEO, tags[1][2]) and is_sequence_header(TAG_AUDIO, tags[2][2]) and \
+                is_keyframe(first[2])
+            print(f'    {os.path.basename(filename)}: 时长 {meta["duration"]:.1f}s，以 sequence header 和关键帧开头: {ok}，'
+                  f'关键帧时间戳 {first[1]}ms，文件大小正确: {meta["filesize"] == os.path.getsize(filename)}')
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='修复 flv 的时间戳并写入 onMetaData')
+    parser.add_argument('input', nargs='?')
+    parser.add_argument('output', nargs='?')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+    if args.benchmark or not args.input:
+        _benchmark()
+    else:
+        writer = FlvWriter(args.output)
+        with open(args.input, 'rb') as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                writer.write(block)
+        writer.close()
+        print(writer.summary())
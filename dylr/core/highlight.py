@@ -0,0 +1,296 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 根据弹幕密度寻找直播高光片段，并用 ffmpeg 无损截取
+        读取弹幕 xml 中每条弹幕的时间戳，按秒统计数量后计算滑动窗口内的弹幕数，
+        再与前后较长一段时间的平均值比较得到 z-score，取分数最高且互不重叠的前 N 个窗口，
+        所有计算都是 numpy 的向量运算，10 小时的直播也只需要不到 1 秒
+        弹幕通常比画面晚几秒到十几秒，截取时会从窗口开始前 clip_before 秒开始
+        用法: python -m dylr.core.highlight download/主播/20260101_120000.xml [--top 5] [--no-clip]
+             python -m dylr.core.highlight --benchmark 36000
+        需要安装 numpy
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+import traceback
+from collections import namedtuple
+from threading import Thread
+
+from dylr.core import config, transcode_manager
+from dylr.util import logger
+
+# 录制的 xml 中 p 的第 5 项是弹幕的毫秒时间戳
+_TIMESTAMP_RE = re.compile(rb'<d p="[^",]*,[^",]*,[^",]*,[^",]*,(\d+)')
+# 录制文件名中的时间
+_FILENAME_TIME_FORMAT = '%Y%m%d_%H%M%S'
+
+# start, end: 窗口的开始和结束时间戳；count: 窗口内的弹幕数；score: z-score
+Highlight = namedtuple('Highlight', ['start', 'end', 'count', 'score'])
+
+# 同时只处理一场直播，防止 ffmpeg 占用过多磁盘读写
+lock = threading.Lock()
+
+
+def load_timeline(xml_files):
+    """
+    读取弹幕 xml 文件中所有弹幕的时间戳
+    :return: 排好序的 numpy 数组，单位：秒
+    """
+    import numpy as np
+
+    parts = []
+    for file in xml_files:
+        with open(file, 'rb') as f:
+            matches = _TIMESTAMP_RE.findall(f.read())
+        if matches:
+            parts.append(np.array(matches).astype(np.int64))
+    if not parts:
+        return np.zeros(0)
+    timeline = np.concatenate(parts) / 1000
+    timeline.sort()
+    return timeline
+
+
+def _moving_sum(values, window):
+    """ 长度为 len(values) - window + 1，第 i 项为 values[i:i+window] 的和 """
+    import numpy as np
+
+    cs = np.concatenate(([0], np.cumsum(values, dtype=np.float64)))
+    return cs[window:] - cs[:-window]
+
+
+def detect(timeline, top: int = 5, window: int = 30, baseline: int = 600, threshold: float = 2.0):
+    """
+    在弹幕时间线中寻找弹幕密度最高的片段
+    :param timeline: load_timeline 返回的时间戳数组
+    :param window: 统计弹幕密度的窗口长度，单位：秒
+    :param baseline: 计算平均值和标准差时前后各取多少秒，用来适应直播中人数的变化
+    :param threshold: z-score 至少为多少才算高光
+    :return: 按分数从高到低排列的 Highlight 列表，窗口互不重叠
+    """
+    import numpy as np
+
+    if len(timeline) == 0:
+        return []
+    start = int(timeline[0])
+    counts = np.bincount((timeline - start).astype(np.int64))
+    if len(counts) < window:
+        counts = np.pad(counts, (0, window - len(counts)))
+    # density[i] 为 start + i 开始的窗口内的弹幕数
+    density = _moving_sum(counts, window)
+    n = len(density)
+
+    # 每个窗口前后 baseline 秒内的平均值和标准差
+    index = np.arange(n)
+    lo = np.maximum(index - baseline, 0)
+    hi = np.minimum(index + baseline + 1, n)
+    cs = np.concatenate(([0], np.cumsum(density)))
+    cs2 = np.concatenate(([0], np.cumsum(density * density)))
+    size = hi - lo
+    mean = (cs[hi] - cs[lo]) / size
+    std = np.sqrt(np.maximum((cs2[hi] - cs2[lo]) / size - mean * mean, 0))
+    # 弹幕很少时标准差接近 0，按泊松分布取 sqrt(mean)，且至少为 1，避免几条弹幕就被当作高光
+    z = (density - mean) / np.maximum(np.maximum(std, np.sqrt(mean)), 1)
+
+    # 分数超过阈值的局部最大值作为候选
+    is_peak = z >= threshold
+    is_peak[1:] &= z[1:] >= z[:-1]
+    is_peak[:-1] &= z[:-1] > z[1:]
+    candidates = np.flatnonzero(is_peak)
+    candidates = candidates[np.argsort(-z[candidates], kind='stable')]
+
+    highlights = []
+    chosen = []
+    for i in candidates:
+        if any(abs(i - j) < window for j in chosen):
+            continue
+        chosen.append(i)
+        highlights.append(Highlight(start + int(i), start + int(i) + window, int(density[i]), float(z[i])))
+        if len(highlights) >= top:
+            break
+    return highlights
+
+
+def filename_time(path: str):
+    """ 录制文件名对应的时间戳，不是录制文件时返回 None """
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return time.mktime(time.strptime(name, _FILENAME_TIME_FORMAT))
+    except ValueError:
+        return None
+
+
+def find_files(directory: str, extension: str, start: float, end: float):
+    """
+    directory 中开始录制时间在 start 和 end 之间的录制文件
+    :return: 按时间排列的 [(开始录制的时间戳, 路径)]
+    """
+    res = []
+    for name in os.listdir(directory):
+        if not name.endswith(extension):
+            continue
+        t = filename_time(name)
+        if t is not None and start <= t <= end:
+            res.append((t, os.path.join(directory, name)))
+    res.sort()
+    return res
+
+
+def cut_clips(highlights, videos, clip_before: int = 20, clip_after: int = 5):
+    """
+    用 ffmpeg 无损截取高光片段，保存在视频旁边
+    :param videos: find_files 返回的视频列表，直播中断重连时会有多个
+    :return: 与 highlights 对应的截取文件列表，截取失败的为 None
+    """
+    clips = []
+    for rank, h in enumerate(highlights, 1):
+        clip_start = h.start - clip_before
+        # 选择在 clip_start 之前开始录制的最后一个视频
+        k = 0
+        while k + 1 < len(videos) and videos[k + 1][0] <= clip_start:
+            k += 1
+        video_start, video = videos[k]
+        clip_start = max(clip_start, video_start)
+        length = h.end + clip_after - clip_start
+        if k + 1 < len(videos):
+            length = min(length, videos[k + 1][0] - clip_start)
+        if length <= 0:
+            clips.append(None)
+            continue
+
+        output_name = f'{os.path.splitext(video)[0]}_highlight{rank}_' \
+                      f'{time.strftime("%H%M%S", time.localtime(h.start))}.flv'
+        # -ss 放在输入文件之前，直接跳到附近的关键帧，不需要从头读取文件
+        command = [transcode_manager.ffmpeg_bin(), '-ss', str(round(clip_start - video_start, 2)), '-i', video,
+                   '-t', str(round(length, 2)), '-c', 'copy', '-y', output_name]
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        clips.append(output_name if os.path.exists(output_name) else None)
+    return clips
+
+
+def write_report(highlights, filename: str, clips=None):
+    with open(filename, 'w', encoding='UTF-8') as f:
+        f.write('rank,time,danmu,score,clip\n')
+        for rank, h in enumerate(highlights, 1):
+            clip = os.path.basename(clips[rank - 1]) if clips and clips[rank - 1] else ''
+            f.write(f'{rank},{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(h.start))},'
+                    f'{h.count},{h.score:.2f},{clip}\n')
+
+
+def process(room_name: str, start: float, end: float, clip: bool = True):
+    """
+    处理一场直播: start 到 end 之间开始录制的所有弹幕和视频文件
+    :return: 找到的高光片段
+    """
+    directory = f'download/{room_name}'
+    danmu_files = find_files(directory, '.xml', start, end)
+    # 只保存了原始数据(danmu_record_mode = raw)的先导出为 xml
+    from dylr.core import danmu_capture
+    recorded = {os.path.splitext(path)[0] for _, path in danmu_files}
+    for t, path in find_files(directory, danmu_capture.EXTENSION, start, end):
+        if os.path.splitext(path)[0] not in recorded:
+            danmu_files.append((t, danmu_capture.export(path, 'xml')))
+    danmu_files.sort()
+    if not danmu_files:
+        return []
+    begin = time.perf_counter()
+    timeline = load_timeline([path for _, path in danmu_files])
+    highlights = detect(timeline, config.get_highlight_count(), config.get_highlight_window())
+    logger.info_and_print(f'{room_name} 共 {len(timeline)} 条弹幕，找到 {len(highlights)} 个高光片段，'
+                          f'耗时 {time.perf_counter() - begin:.2f}s')
+
+    clips = []
+    videos = find_files(directory, '.flv', start, end)
+    if clip and highlights and videos:
+        if transcode_manager.ffmpeg_bin_exist():
+            clips = cut_clips(highlights, videos)
+        else:
+            logger.error_and_print(f'没有找到ffmpeg可执行文件，无法截取高光片段。')
+    write_report(highlights, os.path.splitext(danmu_files[0][1])[0] + '.highlights.csv', clips)
+    return highlights
+
+
+def start_highlight(room_name: str, start: float, end: float):
+    """ 直播结束后在后台寻找高光片段 """
+    t = Thread(target=_highlight, args=(room_name, start, end))
+    t.start()
+
+
+def _highlight(room_name, start, end):
+    try:
+        import numpy
+    except ImportError:
+        logger.error_and_print('没有安装 numpy，无法寻找高光片段。')
+        return
+    with lock:
+        try:
+            process(room_name, start, end)
+        except Exception:
+            logger.error_and_print(f'{room_name} 寻找高光片段失败')
+            logger.error_and_print(traceback.format_exc())
+
+
+def _benchmark(seconds: int):
+    import tempfile
+
+    import numpy as np
+
+    from dylr.core import danmu_writer
+
+    rng = np.random.default_rng(0)
+    # 平均每秒 20 条弹幕，随机加入 10 个持续 30 秒、弹幕量为 4 倍的高光
+    rate = np.full(seconds, 20.0)
+    peaks = rng.choice(np.arange(1000, seconds - 1000, 1200), 10, replace=False)
+    for p in peaks:
+        rate[p:p + 30] *= 4
+    counts = rng.poisson(rate)
+    start_time = 1700000000.0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'danmu.xml')
+        with open(path, 'w', encoding='UTF-8') as f:
+            f.write(danmu_writer.XML_HEADER)
+            for second in np.flatnonzero(counts):
+                for offset in np.sort(rng.random(counts[second])):
+                    t = second + offset
+                    f.write(danmu_writer.xml_line(t, start_time + t, '用户', '哈哈哈哈'))
+            f.write(danmu_writer.XML_FOOTER)
+        size = os.path.getsize(path)
+        begin = time.perf_counter()
+        timeline = load_timeline([path])
+        loaded = time.perf_counter()
+        highlights = detect(timeline, top=10)
+        end = time.perf_counter()
+    found = sum(any(abs(h.start - start_time - p) < 30 for h in highlights) for p in peaks)
+    print(f'{seconds / 3600:.1f} 小时 {len(timeline)} 条弹幕(xml {size / 1024 / 1024:.0f}MB): '
+          f'读取 {loaded - begin:.2f}s，计算 {(end - loaded) * 1000:.0f}ms，'
+          f'找到 {found}/{len(peaks)} 个高光')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='根据弹幕密度寻找直播高光片段')
+    parser.add_argument('files', nargs='*', help='弹幕 xml 文件')
+    parser.add_argument('--top', type=int, default=5, help='高光片段数量')
+    parser.add_argument('--window', type=int, default=30, help='统计弹幕密度的窗口长度，单位：秒')
+    parser.add_argument('--no-clip', action='store_true', help='只输出时间，不截取视频')
+    parser.add_argument('--benchmark', type=int, metavar='SECONDS', help='生成 SECONDS 秒的弹幕测试速度')
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.benchmark)
+    for file in args.files:
+        hs = detect(load_timeline([file]), args.top, args.window)
+        clip_files = []
+        if not args.no_clip and hs:
+            file_start = filename_time(file)
+            video_file = os.path.splitext(file)[0] + '.flv'
+            if file_start is not None and os.path.exists(video_file):
+                clip_files = cut_clips(hs, [(file_start, video_file)])
+        for i, h in enumerate(hs, 1):
+            print(f'{i}. {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(h.start))} '
+                  f'{h.count} 条弹幕 z={h.score:.2f}')
+        write_report(hs, os.path.splitext(file)[0] + '.highlights.csv', clip_files)
@@ -5,7 +5,6 @@
 :brief: 直播开播检测
 """
 import time
-import random
 import threading
 import traceback
 from json import JSONDecodeError
@@ -14,13 +13,12 @@ from threading import Thread
 import requests
 
 from dylr.core.room_info import RoomInfo
+from dylr.core.monitor_engine import MonitorEngine
 from dylr.util import logger, cookie_utils
-from dylr.core import config, record_manager, app, dy_api, monitor_thread_manager
+from dylr.core import config, record_manager, app, dy_api
 
-# 重要房间检测线程
-important_room_threads = []
-# 本轮检测中需要检测房间的队列
-check_rooms_queue = []
+# 开播检测调度器，所有房间(包括重要主播)共用一个事件循环和检测线程池
+engine = None
 
 
 def init():
@@ -36,8 +34,13 @@ def init():
 
 
 def start_thread():
-    # 启动主检测线程
-    t = Thread(target=check_thread_main)
+    global engine
+    if not record_manager.get_monitor_rooms() and not record_manager.get_important_rooms():
+        logger.info_and_print('检测房间列表为空')
+
+    # 启动检测调度器
+    engine = MonitorEngine(check_room)
+    t = Thread(target=engine.run)
     t.setDaemon(True)
     t.start()
 
@@ -46,89 +49,11 @@ def start_thread():
     t.setDaemon(True)
     t.start()
 
-    # 重要主播，每个都开一个独立线程
-    for room in record_manager.get_important_rooms():
-        start_important_monitor_thread(room)
-        # 将几个重要主播的检测时间错开，避免重要主播过多时，一秒内同时检测太多
-        time.sleep(0.97)
-
-
-def start_important_monitor_thread(room):
-    t = Thread(target=important_monitor, args=(room,))
-    t.setDaemon(True)
-    t.start()
-
-
-def important_monitor(room):
-    important_room_threads.append(str(room.room_id))
-    while True:
-        # 房间被移除
-        if room not in record_manager.rooms:
-            important_room_threads.remove(str(room.room_id))
-            break
-
-        # 房间被设置为不重要
-        if not room.important:
-            important_room_threads.remove(str(room.room_id))
-            break
-
-        if not record_manager.is_recording(room):
-            try:
-                check_room(room)
-            except Exception as err:
-                logger.fatal_and_print(traceback.format_exc())
-                pass  # 防止报错停止检测线程
-        time.sleep(config.get_important_check_period() +
-                   random.uniform(0, config.get_important_check_period_random_offset()))
-
-
-def check_thread_main():
-    if not record_manager.get_monitor_rooms() and not record_manager.get_important_rooms():
-        logger.info_and_print('检测房间列表为空')
-    global check_rooms_queue
-    while True:
-        # logger.debug_and_print('new task for checking')
-        check_rooms_queue = record_manager.get_monitor_rooms()
-        check_rooms_queue.reverse()
-        futures = []
-        for i in range(config.get_check_threads()):
-            future = monitor_thread_manager.new_check_task(check_thread_task)
-            if future:  # 只有在成功提交任务时才添加到futures列表
-                futures.append(future)
-        # 等待所有检测线程完成本轮检测
-        for future in futures:
-            future.result()
-        # 等待一定时间后再进行下一轮检测
-        time.sleep(config.get_check_period()+random.uniform(0, config.get_check_period_random_offset()))
-
-
-def check_thread_task():
-    global check_rooms_queue
-    while True:
-        if check_rooms_queue:
-            room = check_rooms_queue.pop()
-        else:
-            break
-
-        if app.stop_all_threads:
-            break
 
-        # 如果房间被移除，但本次检测已经包含了该房间，则不检测该房间
-        if room not in record_manager.rooms:
-            continue
-
-        start_time = time.time()
-        try:
-            check_room(room)
-        except Exception as err:
-            logger.fatal_and_print(traceback.format_exc())
-            pass  # 防止报错停止检测线程
-
-        end_time = time.time()
-        cost_time = end_time - start_time
-        if cost_time <= config.get_check_wait_time():
-            # 房间间等待间隔，防止极短时间内检测过多而被屏蔽
-            time.sleep(config.get_check_wait_time() - cost_time)
+def schedule_check(room, delay: float = 0):
+    """ 让调度器尽快检测一次该房间，如 GUI 中将主播设为重要主播时 """
+    if engine is not None:
+        engine.schedule_check(room, delay)
 
 
 def check_room(room):
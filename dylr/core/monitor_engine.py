@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 基于 asyncio 的开播检测调度器
+        一个事件循环维护所有房间的下次检测时间(最小堆)，到期后把检测任务交给固定大小的检测线程池，
+        因此不论监测多少房间，线程数都是固定的
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import traceback
+
+from dylr.core import app, config, record_manager, monitor_thread_manager, dy_api
+from dylr.util import logger, http_utils
+
+
+def is_monitorable(room) -> bool:
+    """ 房间是否需要检测，与 record_manager.get_monitor_rooms/get_important_rooms 的规则一致 """
+    if '将会在开播时获取' in str(room.room_id):
+        return False
+    if not room.important and not room.auto_record:
+        return False
+    return not record_manager.is_recording(room)
+
+
+class MonitorEngine:
+    # 多久与 record_manager 同步一次房间列表，单位：秒
+    sync_period = 1
+    # 每检测多少次在日志中记录一次连接复用情况
+    stats_period = 500
+
+    def __init__(self, check_func):
+        """
+        :param check_func: 检测单个房间的函数，在检测线程池中执行，通常是 monitor.check_room
+        """
+        self.check_func = check_func
+        # 普通房间和重要房间分开排队，避免普通房间受限流影响时堵住重要房间
+        # 堆中元素: (到期时间, 序号, 房间)
+        self.normal_heap = []
+        self.important_heap = []
+        # 房间 -> 最新的序号，堆中序号不一致的元素已过期，出堆时直接丢弃
+        self.scheduled = {}
+        self.in_flight = set()
+        self.normal_in_flight = 0
+        self.next_normal_launch = 0
+        self.next_sync = 0
+        self.checks = 0
+        self._counter = itertools.count()
+        self._loop = None
+        self._wakeup = None
+
+    def run(self):
+        """ 在当前线程中运行事件循环，直到 app.stop_all_threads """
+        asyncio.run(self._main())
+
+    def schedule_check(self, room, delay: float = 0):
+        """ 线程安全，让房间在 delay 秒后检测一次，用于 GUI 中修改重要主播等场景 """
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._schedule, room, delay)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while not app.stop_all_threads:
+            now = self._loop.time()
+            if now >= self.next_sync:
+                self._sync(now)
+                self.next_sync = now + self.sync_period
+            self._dispatch(now)
+
+            timeout = self.next_sync - now
+            if self.important_heap:
+                timeout = min(timeout, self.important_heap[0][0] - now)
+            if self.normal_heap:
+                timeout = min(timeout, max(self.normal_heap[0][0], self.next_normal_launch) - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _sync(self, now):
+        """ 把新添加的、录制结束的、重新开启自动录制的房间加入调度 """
+        for room in record_manager.get_rooms():
+            if room in self.scheduled or room in self.in_flight:
+                continue
+            if not is_monitorable(room):
+                continue
+            if room.important:
+                # 将重要主播的检测时间错开，避免一秒内同时检测太多
+                self._schedule(room, random.uniform(0, config.get_important_check_period()), now)
+            else:
+                self._schedule(room, 0, now)
+
+    def _schedule(self, room, delay, now=None):
+        if now is None:
+            now = self._loop.time()
+        seq = next(self._counter)
+        self.scheduled[room] = seq
+        heap = self.important_heap if room.important else self.normal_heap
+        heapq.heappush(heap, (now + delay, seq, room))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pop_due(self, heap, now):
+        """ 弹出一个到期且仍需检测的房间，没有则返回 None """
+        while heap and heap[0][0] <= now:
+            _, seq, room = heap[0]
+            if self.scheduled.get(room) != seq or room in self.in_flight:
+                heapq.heappop(heap)
+                continue
+            if room not in record_manager.rooms or not is_monitorable(room):
+                # 房间被移除、不再自动录制或正在录制，等 _sync 重新加入
+                heapq.heappop(heap)
+                del self.scheduled[room]
+                continue
+            if room.important != (heap is self.important_heap):
+                # 房间的重要属性被修改，换到对应的队列
+                heapq.heappop(heap)
+                self._schedule(room, 0, now)
+                continue
+            return room
+        return None
+
+    def _dispatch(self, now):
+        max_in_flight = monitor_thread_manager.max_workers
+        while len(self.in_flight) < max_in_flight:
+            room = self._pop_due(self.important_heap, now)
+            if room is None:
+                break
+            heapq.heappop(self.important_heap)
+            self._launch(room, False)
+
+        # 普通房间与原来的检测线程一致：最多 check_threads 个同时检测，每个每 check_wait 秒最多发起一次
+        check_threads = max(config.get_check_threads(), 1)
+        while len(self.in_flight) < max_in_flight and self.normal_in_flight < check_threads \
+                and now >= self.next_normal_launch:
+            room = self._pop_due(self.normal_heap, now)
+            if room is None:
+                break
+            heapq.heappop(self.normal_heap)
+            self.next_normal_launch = now + config.get_check_wait_time() / check_threads
+            self._launch(room, True)
+
+    def _launch(self, room, normal: bool):
+        del self.scheduled[room]
+        self.in_flight.add(room)
+        if normal:
+            self.normal_in_flight += 1
+        future = self._loop.run_in_executor(monitor_thread_manager.check_thread_pool, self._check, room)
+        future.add_done_callback(lambda _: self._on_checked(room, normal))
+
+    def _check(self, room):
+        try:
+            self.check_func(room)
+        except Exception:
+            logger.fatal_and_print(traceback.format_exc())  # 防止报错停止检测
+
+    def _on_checked(self, room, normal: bool):
+        self.in_flight.discard(room)
+        self.checks += 1
+        if self.checks % self.stats_period == 0:
+            logger.debug(f'已检测 {self.checks} 次，连接复用情况: {http_utils.get_stats_str()}')
+            logger.debug(dy_api.api_url_pool.get_stats_str())
+        if normal:
+            self.normal_in_flight -= 1
+        if room.important:
+            delay = config.get_important_check_period() + \
+                random.uniform(0, config.get_important_check_period_random_offset())
+        else:
+            delay = config.get_check_period() + random.uniform(0, config.get_check_period_random_offset())
+        self._schedule(room, delay)
@@ -11,7 +11,9 @@ import atexit
 # 检测线程池
 # 由于检测是高频低消耗的，因此使用线程池
 # 录制线程低频高消耗且必须保证不等待、长时间稳定运行，不使用线程池
-check_thread_pool = ThreadPoolExecutor(max_workers=16)
+# 所有房间(包括重要主播)的检测都在该线程池中执行，同时进行的检测数不超过 max_workers
+max_workers = 16
+check_thread_pool = ThreadPoolExecutor(max_workers=max_workers)
 
 # 注册关闭处理函数
 def shutdown_pool():
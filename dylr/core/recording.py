@@ -6,8 +6,7 @@ import traceback
 from typing import Optional
 
 from dylr.plugin import plugin
-from dylr.core import dy_api, record_manager
-from dylr.core.danmu_recorder import DanmuRecorder
+from dylr.core import dy_api, record_manager, config, highlight
 from dylr.core.room import Room
 from dylr.core.room_info import RoomInfo
 from dylr.core.video_recorder import VideoRecorder
@@ -21,6 +20,12 @@ class Recording:
         self.video_recorder = None
         self.danmu_recorder = None
         self.start_time = datetime.datetime.now()
+        # 本场直播第一个录制文件的时间戳，用于直播结束后查找本场直播的所有文件
+        self.session_start = None
+        # 直播结束的时间，以及弹幕文件是否已关闭，两者都满足后才寻找高光片段
+        self.session_end = None
+        self.danmu_closed = False
+        self.lock = threading.Lock()
 
     def start(self):
         if self.room_info is None:
@@ -35,6 +40,7 @@ class Recording:
         now = time.localtime()
         now_str = time.strftime('%Y%m%d_%H%M%S', now)
         video_filename = f"download/{self.room.room_name}/{now_str}.flv"
+        self.session_start = time.mktime(now)
 
         try:
             plugin.on_live_start(self.room, video_filename)
@@ -46,6 +52,8 @@ class Recording:
                 self.start_recording_danmu(now)
             except:
                 traceback.print_exc()
+                # 弹幕录制没有启动，不用等待弹幕文件关闭
+                self.danmu_recorder = None
         return True
 
     def refresh_video_recorder(self):
@@ -55,11 +63,13 @@ class Recording:
             cookie_utils.record_cookie_failed()
             record_manager.recordings.remove(self)
             logger.debug(f'刷新 {self.room.room_name}({self.room.room_id}) 时room_json为None，结束录制')
+            self.on_session_end()
             return False
         self.room_info = RoomInfo(self.room, room_json)
         if not self.room_info.is_going_on_live():
             record_manager.recordings.remove(self)
             logger.debug(f'刷新 {self.room.room_name}({self.room.room_id}) 时检测到已下播，结束录制')
+            self.on_session_end()
             return False
         now = time.localtime()
         now_str = time.strftime('%Y%m%d_%H%M%S', now)
@@ -68,6 +78,27 @@ class Recording:
         logger.info_and_print(f'检测到 {self.room.room_name}({self.room.room_id}) 未下播，继续录制')
         self.start_recording_video(video_filename)
 
+    def on_session_end(self):
+        """ 直播结束，不再继续录制时调用 """
+        with self.lock:
+            self.session_end = time.time()
+            # 弹幕录制可能还在写入，等弹幕文件关闭后再处理
+            ready = self.danmu_recorder is None or self.danmu_closed
+        if ready:
+            self._start_highlight()
+
+    def _on_danmu_closed(self):
+        """ 弹幕文件已全部写入并关闭，在弹幕录制的事件循环中调用 """
+        with self.lock:
+            self.danmu_closed = True
+            ready = self.session_end is not None
+        if ready:
+            self._start_highlight()
+
+    def _start_highlight(self):
+        if config.is_highlight_enabled() and self.room.record_danmu and self.session_start is not None:
+            highlight.start_highlight(self.room.room_name, self.session_start, self.session_end)
+
     def start_recording_video(self, filename):
         if self.video_recorder is not None:
             return
@@ -77,10 +108,11 @@ class Recording:
     def start_recording_danmu(self, start_time):
         if self.danmu_recorder is not None:
             return
-        self.danmu_recorder = DanmuRecorder(self.room, self.room_info.get_real_room_id(), start_time)
-        t = threading.Thread(target=self.danmu_recorder.start)
-        t.setDaemon(True)
-        t.start()
+        # 弹幕录制依赖 asyncio、websocket 等模块，第一次录制弹幕时才导入
+        from dylr.core.danmu_recorder import DanmuRecorder
+        self.danmu_recorder = DanmuRecorder(self.room, self.room_info.get_real_room_id(), start_time,
+                                            self._on_danmu_closed)
+        self.danmu_recorder.start()
 
     def stop_recording_video(self):
         if self.video_recorder is None:
@@ -54,11 +54,17 @@ def transcode(filename: str):
     lock.release()
 
 
-def ffmpeg_bin_exist():
+def ffmpeg_bin():
+    """ ffmpeg 可执行文件，路径中可能有空格，应作为参数列表的一项传给 subprocess """
     if len(config.get_ffmpeg_path()) > 0:
-        ffmpeg_cmd = config.get_ffmpeg_path() + "/ffmpeg -version"
-    else:
-        ffmpeg_cmd = "ffmpeg -version"
-    r = subprocess.run(ffmpeg_cmd, capture_output=True)
-    info = str(r.stderr, "UTF-8")
-    return 'version' in info
+        return os.path.join(config.get_ffmpeg_path(), 'ffmpeg')
+    return 'ffmpeg'
+
+
+def ffmpeg_bin_exist():
+    try:
+        r = subprocess.run([ffmpeg_bin(), '-version'], capture_output=True)
+    except OSError:
+        return False
+    # ffmpeg -version 输出到 stdout
+    return r.returncode == 0
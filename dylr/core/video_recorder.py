@@ -1,16 +1,22 @@
 # coding=utf-8
 import os
+import threading
 import time
+import traceback
+from typing import Optional
 
 import requests
 from requests.adapters import HTTPAdapter
 
 from dylr.plugin import plugin
-from dylr.core import app, config, transcode_manager
+from dylr.core import app, config, flv, transcode_manager, video_ingest, video_writer
 from dylr.core.room import Room
 from dylr.core.room_info import RoomInfo
 from dylr.util import cookie_utils, logger
 
+# 视频写入失败后，等待多久再检测是否在直播并重新录制，单位：秒
+WRITE_ERROR_RETRY_DELAY = 60
+
 
 class VideoRecorder:
     def __init__(self, room: Room, room_info: RoomInfo, recording):
@@ -18,10 +24,42 @@ class VideoRecorder:
         self.room_info = room_info
         self.stop_signal = False
         self.recording = recording
+        # 开启 video_ring_buffer 时的写入线程
+        self.writer = None
+        # 开启 video_fix_flv 时的 flv 修复
+        self.flv = None
 
     def stop(self):
         self.stop_signal = True
 
+    @staticmethod
+    def _open_file(filename: str):
+        file = open(filename, 'wb')
+        if config.is_video_page_cache() and video_writer.page_cache_supported():
+            file = video_writer.PageCacheFile(file, config.get_video_sync_interval() * 1024 * 1024,
+                                              config.get_video_preallocate() * 1024 * 1024)
+        return file
+
+    @staticmethod
+    def _segment_filename(filename: str) -> str:
+        """ 下一段的文件名，与新开始录制的文件命名方式相同 """
+        now_str = time.strftime('%Y%m%d_%H%M%S', time.localtime())
+        return f'{os.path.dirname(filename)}/{now_str}.flv'
+
+    def _on_segment_end(self, filename: str):
+        """ 在写入线程中调用，插件在新线程中运行，避免阻塞写入 """
+        logger.info_and_print(f'{self.room.room_name}({self.room.room_id}) 分段录制，{filename} 已完成')
+
+        def run():
+            try:
+                plugin.on_segment_end(self.room, filename)
+            except:
+                traceback.print_exc()
+
+        t = threading.Thread(target=run)
+        t.setDaemon(True)
+        t.start()
+
     def start_recording(self, filename: str):
         stream_url = self.room_info.get_stream_url()
         if stream_url is None:
@@ -64,20 +102,61 @@ class VideoRecorder:
             except FileExistsError:  # 防止多个线程同时创建文件导致的错误
                 pass
 
-        with open(filename, 'wb') as file:
+        if config.is_video_fix_flv():
+            file = self.flv = flv.FlvWriter(filename, self._open_file, config.get_video_segment_size() * 1024 * 1024,
+                                            config.get_video_segment_duration() * 60,
+                                            lambda: self._segment_filename(filename), self._on_segment_end)
+        else:
+            file = self._open_file(filename)
+        if config.get_video_ring_buffer() > 0:
+            file = self.writer = video_writer.VideoWriter(file, config.get_video_ring_buffer() * 1024 * 1024,
+                                                          config.get_video_high_watermark() / 100,
+                                                          f'{self.room.room_name}({self.room.room_id})')
+        write_error = None
+        try:
+            res = video_ingest.copy_stream(downloading, file, lambda: self.stop_signal,
+                                           config.get_video_buffer_size() * 1024, config.is_video_splice())
+            if res == video_ingest.STOPPED:  # 主动停止录制
+                logger.info_and_print(f'主动停止{self.room.room_name}({self.room.room_id})的录制')
+        except video_ingest.WriteError as e:
+            # 磁盘已满等，不是直播结束
+            write_error = e.__cause__
+        except video_ingest.READ_ERRORS:
+            # 下载出错(一般是下载超时)，可能是直播已结束，或主播长时间卡顿，先结束录制，然后再检测是否在直播
+            pass
+        except Exception as e:
+            # 读取直播流不会出现其他异常，是 flv 修复或写入出错
+            write_error = e
+            logger.error(traceback.format_exc())
+        finally:
+            downloading.close()
             try:
-                for data in downloading.iter_content(chunk_size=1024):
-                    if data:
-                        file.write(data)
-                        if self.stop_signal:  # 主动停止录制
-                            logger.info_and_print(f'主动停止{self.room.room_name}({self.room.room_id})的录制')
-                            break
-            except requests.exceptions.ConnectionError:
-                # 下载出错(一般是下载超时)，可能是直播已结束，或主播长时间卡顿，先结束录制，然后再检测是否在直播
-                pass
+                # 等待缓冲区中的数据写入完成
+                file.close()
+            except Exception as e:
+                write_error = write_error or e
+                logger.error(traceback.format_exc())
+            if self.writer is not None and self.writer.error is not None:
+                write_error = self.writer.error
+            self._end_recording(filename, write_error)
+
+    def _end_recording(self, filename: str, write_error: Optional[Exception]):
+        """ 无论录制如何结束都要调用，通知插件并再次检测是否在直播 """
+        if self.writer is not None:
+            logger.info(f'{self.room.room_name}({self.room.room_id}) 视频写入: {self.writer.summary()}')
+        if self.flv is not None and not self.flv.passthrough:
+            logger.info(f'{self.room.room_name}({self.room.room_id}) flv 修复: {self.flv.summary()}')
+            # 分段后最后一段的文件名
+            filename = self.flv.filename
         # 结束录制
+        if write_error is not None:
+            logger.error_and_print(f'{self.room.room_name}({self.room.room_id}) 视频写入失败，'
+                                   f'请检查磁盘空间: {write_error}')
         logger.info_and_print(f'{self.room.room_name}({self.room.room_id}) 录制结束')
-        plugin.on_live_end(self.room, filename)
+        try:
+            plugin.on_live_end(self.room, filename)
+        except:
+            traceback.print_exc()
 
         if os.path.exists(filename):
             file_size = os.stat(filename).st_size
@@ -86,19 +165,25 @@ class VideoRecorder:
                 os.remove(filename)
             # 录制到的内容是404，删除文件
             elif file_size < 1024:
-                with open(filename, 'r', encoding='utf-8') as f:
+                with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
                     file_info = str(f.read())
                 if '<head><title>404 Not Found</title></head>' in file_info:
                     os.remove(filename)
 
         # GUI
         if app.win_mode:
-            app.win.set_state(self.room, '未开播', color='#000000')
+            if write_error is not None:
+                app.win.set_state(self.room, '视频写入失败', color='#bb0000')
+            else:
+                app.win.set_state(self.room, '未开播', color='#000000')
 
         # 自动转码
         # if config.is_auto_transcode():
         #     transcode_manager.start_transcode(filename)
 
+        # 磁盘已满或出错时立刻重新录制还会失败，等待一段时间再检测
+        if write_error is not None and not self.stop_signal:
+            time.sleep(WRITE_ERROR_RETRY_DELAY)
         # 再次检测是否在直播，防止因网络问题造成的提前停止录制
         # 如果是主动停止录制，则不立刻再次检查
         if not self.stop_signal:
@@ -0,0 +1,325 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 录制视频的异步写入
+        网络读取直接读入环形缓冲区，由每个录制单独的写入线程写入磁盘，磁盘卡顿(NAS、繁忙的机械硬盘)时网络读取不受影响，
+        只有缓冲区满了才会暂停读取(记为一次溢出)。不丢弃数据，因为丢掉一部分 flv 数据会导致之后的内容无法播放
+        PageCacheFile 定期将已写入的部分刷到磁盘并从页缓存中丢弃，同时录制很多直播时不会积累大量脏页
+        用法: python -m dylr.core.video_writer  (模拟磁盘卡顿，比较直接写入和使用缓冲区时网络读取的最长停顿)
+              python scripts/page_cache_benchmark.py  (比较开启 video_page_cache 前后的内存和页缓存占用)
+"""
+import ctypes
+import os
+import sys
+import threading
+import time
+import traceback
+
+from dylr.util import logger
+
+# python 的 os 模块没有 sync_file_range 和带 FALLOC_FL_KEEP_SIZE 的 fallocate，从 libc 中获取
+_sync_file_range = None
+_fallocate = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _sync_file_range = _libc.sync_file_range
+        _sync_file_range.argtypes = (ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint)
+        _fallocate = getattr(_libc, 'fallocate64', None) or _libc.fallocate
+        _fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    except (OSError, AttributeError):
+        pass
+
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+FALLOC_FL_KEEP_SIZE = 1
+
+
+class VideoWriter:
+    def __init__(self, file, capacity: int = 8 * 1024 * 1024, high_watermark: float = 0.8, name: str = ''):
+        """
+        :param file: 以二进制方式打开的文件，关闭时由 VideoWriter 关闭
+        :param capacity: 缓冲区大小，单位：字节
+        :param high_watermark: 缓冲区使用超过该比例时输出警告
+        :param name: 用于日志的名称
+        """
+        self.file = file
+        self.name = name
+        self.buf = bytearray(capacity)
+        self.view = memoryview(self.buf)
+        self.capacity = capacity
+        self.high = int(capacity * high_watermark)
+        # 待写入数据的开始位置和长度，由 cond 保护
+        self.head = 0
+        self.size = 0
+        self.closed = False
+        self.error = None
+        self.cond = threading.Condition()
+        self._reserved = 0
+        self._above_high = False
+        self.metrics = {
+            'bytes': 0,
+            # 缓冲区使用的最大值，单位：字节
+            'max_fill': 0,
+            # 超过 high_watermark 的次数
+            'high_watermark_events': 0,
+            # 缓冲区满、暂停网络读取的次数和总时长
+            'overflow_events': 0,
+            'blocked_seconds': 0.0,
+            # 写入磁盘的次数、总耗时和单次最长耗时
+            'writes': 0,
+            'write_seconds': 0.0,
+            'max_write_latency': 0.0,
+        }
+        self.thread = threading.Thread(target=self._write_loop, name=f'video-writer-{name}')
+        self.thread.start()
+
+    @property
+    def fill(self) -> float:
+        return self.size / self.capacity
+
+    def reserve(self, size: int) -> memoryview:
+        """
+        获取缓冲区中可以写入的一段连续空间，最多 size 字节，写入后需要调用 commit
+        缓冲区满时等待写入线程写入磁盘
+        """
+        with self.cond:
+            if self.size == self.capacity:
+                self.metrics['overflow_events'] += 1
+                start = time.perf_counter()
+                while self.size == self.capacity and self.error is None:
+                    self.cond.wait()
+                self.metrics['blocked_seconds'] += time.perf_counter() - start
+            if self.error is not None:
+                raise self.error
+            tail = (self.head + self.size) % self.capacity
+            # 不跨过缓冲区末尾，剩余空间不连续时先返回末尾的一段
+            end = self.head if tail < self.head else self.capacity
+            n = min(size, end - tail, self.capacity - self.size)
+            self._reserved = n
+            return self.view[tail:tail + n]
+
+    def commit(self, n: int):
+        """ reserve 返回的空间中前 n 字节已写入数据 """
+        if n > self._reserved:
+            raise ValueError('commit more than reserved')
+        with self.cond:
+            self._reserved = 0
+            self.size += n
+            self.metrics['bytes'] += n
+            if self.size > self.metrics['max_fill']:
+                self.metrics['max_fill'] = self.size
+            if self.size >= self.high and not self._above_high:
+                self._above_high = True
+                self.metrics['high_watermark_events'] += 1
+                logger.warning(f'{self.name} 视频写入缓冲区已使用 {self.fill:.0%}，磁盘写入速度可能跟不上')
+            self.cond.notify_all()
+
+    def write(self, data):
+        """ 复制到缓冲区，不能直接读入缓冲区时使用 """
+        data = memoryview(data)
+        while data:
+            mv = self.reserve(len(data))
+            n = len(mv)
+            mv[:] = data[:n]
+            self.commit(n)
+            data = data[n:]
+
+    def flush(self):
+        """ 等待缓冲区中的数据全部写入 """
+        with self.cond:
+            while self.size and self.error is None:
+                self.cond.wait()
+
+    def close(self):
+        """ 写入剩余数据并关闭文件，可重复调用 """
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        self.file.close()
+
+    def _write_loop(self):
+        metrics = self.metrics
+        while True:
+            with self.cond:
+                while not self.size and not self.closed:
+                    self.cond.wait()
+                if not self.size:
+                    return
+                # 只写入连续的一段，跨过末尾的部分下次再写
+                n = min(self.size, self.capacity - self.head)
+                data = self.view[self.head:self.head + n]
+            start = time.perf_counter()
+            try:
+                written = self.file.write(data)
+            except Exception as e:
+                logger.error(f'{self.name} 视频写入失败')
+                logger.error(traceback.format_exc())
+                with self.cond:
+                    self.error = e
+                    self.size = 0
+                    self.cond.notify_all()
+                return
+            latency = time.perf_counter() - start
+            if written is None:
+                written = n
+            with self.cond:
+                metrics['writes'] += 1
+                metrics['write_seconds'] += latency
+                if latency > metrics['max_write_latency']:
+                    metrics['max_write_latency'] = latency
+                self.head = (self.head + written) % self.capacity
+                self.size -= written
+                if self._above_high and self.size < self.high // 2:
+                    self._above_high = False
+                self.cond.notify_all()
+
+    def summary(self) -> str:
+        m = self.metrics
+        avg = m['write_seconds'] / m['writes'] * 1000 if m['writes'] else 0
+        return f'缓冲区最多使用 {m["max_fill"] / self.capacity:.0%}，超过警戒线 {m["high_watermark_events"]} 次，' \
+               f'缓冲区满 {m["overflow_events"]} 次(暂停读取 {m["blocked_seconds"]:.1f}s)，' \
+               f'磁盘写入平均 {avg:.1f}ms，最长 {m["max_write_latency"] * 1000:.0f}ms'
+
+
+def page_cache_supported() -> bool:
+    return hasattr(os, 'posix_fadvise') and hasattr(os, 'fdatasync')
+
+
+def _check(ret):
+    if ret != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+class PageCacheFile:
+    """
+    包装以二进制方式打开的文件，每写入 sync_interval 字节:
+    开始回写这一段(不等待)，等待上一段写入磁盘后用 posix_fadvise(DONTNEED) 将其从页缓存中丢弃，
+    每个文件的脏页和缓存最多约为 2 * sync_interval。没有 sync_file_range 时使用 fdatasync
+    没有 fileno，不会使用 splice
+    """
+
+    def __init__(self, file, sync_interval: int = 8 * 1024 * 1024, preallocate: int = 0):
+        """
+        :param sync_interval: 单位：字节
+        :param preallocate: 每次预先分配的磁盘空间，单位：字节，0 为不预先分配，减少多个文件同时增长造成的碎片
+        """
+        self.file = file
+        self.fd = file.fileno()
+        self.sync_interval = sync_interval
+        self.preallocate = preallocate if _fallocate is not None else 0
+        # 已写入、已开始回写、已写入磁盘并丢弃缓存、已预先分配的位置
+        self.offset = self.started = self.synced = self.allocated = file.tell()
+        self.sync_seconds = 0.0
+
+    def write(self, data) -> int:
+        n = self.file.write(data)
+        self.offset += n
+        if self.preallocate and self.offset > self.allocated:
+            self._allocate()
+        if self.offset - self.started >= self.sync_interval:
+            start = time.perf_counter()
+            self.file.flush()
+            self._writeback()
+            self.sync_seconds += time.perf_counter() - start
+        return n
+
+    def _allocate(self):
+        size = self.offset - self.allocated + self.preallocate
+        try:
+            _check(_fallocate(self.fd, FALLOC_FL_KEEP_SIZE, self.allocated, size))
+            self.allocated += size
+        except OSError as e:
+            # 部分文件系统不支持
+            logger.warning(f'预先分配磁盘空间失败，不再预先分配: {e}')
+            self.preallocate = 0
+
+    def _writeback(self):
+        end = self.offset
+        if _sync_file_range is not None:
+            _check(_sync_file_range(self.fd, self.started, end - self.started, SYNC_FILE_RANGE_WRITE))
+            if self.started > self.synced:
+                _check(_sync_file_range(self.fd, self.synced, self.started - self.synced,
+                                        SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE |
+                                        SYNC_FILE_RANGE_WAIT_AFTER))
+                self._drop(self.started)
+        else:
+            os.fdatasync(self.fd)
+            self._drop(end)
+        self.started = end
+
+    def _drop(self, end):
+        os.posix_fadvise(self.fd, self.synced, end - self.synced, os.POSIX_FADV_DONTNEED)
+        self.synced = end
+
+    def close(self):
+        try:
+            self.file.flush()
+            os.fdatasync(self.fd)
+            self._drop(self.offset)
+        finally:
+            self.file.close()
+
+
+class _SlowFile:
+    """ 模拟磁盘卡顿，每写入 stall_every 字节卡住 stall 秒 """
+
+    def __init__(self, stall_every, stall):
+        self.stall_every = stall_every
+        self.stall = stall
+        self.written = 0
+        self.next_stall = stall_every
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written >= self.next_stall:
+            self.next_stall += self.stall_every
+            time.sleep(self.stall)
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def _benchmark(seconds: int = 6, rate: int = 1024 * 1024, block: int = 64 * 1024):
+    """ 网络以 rate 字节/秒的速度到达，磁盘每 2MB 卡顿 1 秒，统计网络读取的最长停顿 """
+
+    def network(write):
+        interval = block / rate
+        next_time = time.perf_counter()
+        max_delay = 0
+        for _ in range(seconds * rate // block):
+            next_time += interval
+            now = time.perf_counter()
+            if now < next_time:
+                time.sleep(next_time - now)
+            max_delay = max(max_delay, time.perf_counter() - next_time)
+            write(block)
+        return max_delay
+
+    data = bytes(block)
+    direct = _SlowFile(2 * 1024 * 1024, 1)
+    delay = network(lambda n: direct.write(data))
+    print(f'直接写入: 网络读取最长落后 {delay:.2f}s')
+
+    writer = VideoWriter(_SlowFile(2 * 1024 * 1024, 1), 8 * 1024 * 1024, name='benchmark')
+
+    def write(n):
+        while n:
+            mv = writer.reserve(n)
+            writer.commit(len(mv))
+            n -= len(mv)
+
+    delay = network(write)
+    writer.close()
+    print(f'8MB 缓冲区: 网络读取最长落后 {delay:.2f}s，{writer.summary()}')
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -248,8 +248,8 @@ class GripFrame(ttk.LabelFrame):
             self.widgets[web_rid][5].config(text=important_text, fg=fg_color)
         config.save_rooms()
 
-        if room.important and str(web_rid) not in monitor.important_room_threads:
-            monitor.start_important_monitor_thread(room)
+        if room.important:
+            monitor.schedule_check(room)
 
     def _get_state_color(self, state):
         """根据状态返回颜色"""
@@ -44,9 +44,21 @@ def on_live_start(room, filename):
 
 def on_live_end(room, file):
     """
-    直播结束时
+    一次视频录制结束时，断线重连后会开始录制新的文件，每次结束都会调用
     :param room: 直播间
-    :param file: 录制的文件名，可以通过 room.record_danmu 来获取是否录制弹幕，弹幕文件名与视频名一致，但后缀名为 xml
+    :param file: 最后录制的视频文件名，分段录制时为最后一段，之前的段已通过 on_segment_end 通知
+                 可以通过 room.record_danmu 来获取是否录制弹幕，一场直播只有一个弹幕文件，
+                 文件名与 on_live_start 的 filename 一致，但后缀名为 xml
+    """
+    ...
+
+
+def on_segment_end(room, file):
+    """
+    分段录制时，一段录制完成时(在新线程中调用)
+    最后一段不会调用，录制结束时调用的是 on_live_end
+    :param room: 直播间
+    :param file: 录制完成的这一段的文件名
     """
     ...
 
@@ -1,8 +1,6 @@
 # coding=utf-8
-import requests
-
 from dylr.core import dy_api
-from dylr.util import logger
+from dylr.util import logger, http_utils
 from dylr.plugin import plugin
 
 cookie_cache = None
@@ -78,7 +76,7 @@ def auto_get_cookie():
     }
     
     try:
-        resp = requests.get(url, headers=header, proxies=dy_api.get_proxies(), timeout=10)
+        resp = http_utils.get(url, headers=header, proxies=dy_api.get_proxies(), timeout=10)
         ttwid = None
         for c in resp.cookies:
             if c.name == 'ttwid':
@@ -0,0 +1,263 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 将录制的弹幕 xml 文件转为 ass 字幕
+        逐行读取、逐行写出，内存占用与弹幕数量无关，要求弹幕按时间顺序排列(录制的文件都是按时间顺序的)
+        滚动弹幕以相同的速度移动，同一轨道上后一条弹幕永远追不上前一条，只要前一条完全进入画面，轨道就可以再次使用，
+        因此用最小堆记录每条轨道的可用时间，分配轨道的复杂度为 O(log 轨道数)
+        用法: python -m dylr.util.danmu_ass 20230114_123456.xml [-o 输出文件] [--width 1920 --height 1080]
+             python -m dylr.util.danmu_ass --benchmark 200000
+"""
+import heapq
+import html
+import re
+import unicodedata
+
+# <d p="时间,模式,字号,颜色,...">内容</d>，录制的文件带有 user 属性
+_DANMU_RE = re.compile(r'<d p="([^"]*)"[^>]*>(.*)</d>')
+
+# b站弹幕模式: 1~3 滚动，4 底部，5 顶部
+MODE_SCROLL = 1
+MODE_BOTTOM = 4
+MODE_TOP = 5
+
+
+class TrackAllocator:
+    """ 轨道分配，空闲轨道按编号放在最小堆中，占用中的轨道按可用时间放在最小堆中 """
+
+    def __init__(self, count: int):
+        self.free = list(range(count))
+        self.busy = []
+
+    def allocate(self, time: float, release: float):
+        """
+        分配 time 时可用的编号最小的轨道，该轨道到 release 时才能再次使用
+        :return: 轨道编号，没有可用轨道时返回 None
+        """
+        busy = self.busy
+        while busy and busy[0][0] <= time:
+            heapq.heappush(self.free, heapq.heappop(busy)[1])
+        if not self.free:
+            return None
+        track = heapq.heappop(self.free)
+        heapq.heappush(busy, (release, track))
+        return track
+
+
+def text_width(text: str, font_size: int) -> float:
+    """ 估算文字宽度，全角字符为 font_size，其他为一半 """
+    wide = 0
+    for c in text:
+        if c >= 'ᄀ' and unicodedata.east_asian_width(c) in 'WF':
+            wide += 1
+    return (len(text) + wide) * font_size / 2
+
+
+def escape(text: str) -> str:
+    text = text.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
+    return text.replace('\r', '').replace('\n', '\\N')
+
+
+def format_time(seconds: float) -> str:
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f'{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}'
+
+
+def iter_danmu(lines):
+    """ 从 xml 的每一行中读取弹幕，生成 (时间, 模式, 字号, 颜色, 内容) """
+    for line in lines:
+        match = _DANMU_RE.search(line)
+        if match is None:
+            continue
+        p = match.group(1).split(',')
+        try:
+            time = float(p[0])
+            mode = int(p[1]) if len(p) > 1 else MODE_SCROLL
+            size = int(p[2]) if len(p) > 2 else 25
+            color = int(p[3]) if len(p) > 3 else 0xFFFFFF
+        except ValueError:
+            continue
+        content = match.group(2)
+        if '&' in content:
+            content = html.unescape(content)
+        yield time, mode, size, color, content
+
+
+class AssWriter:
+    def __init__(self, out, width: int = 1920, height: int = 1080, font_size: int = 48,
+                 font_name: str = 'Microsoft YaHei', scroll_duration: float = 10, fixed_duration: float = 5,
+                 area: float = 1, opacity: float = 0.8, overlap: bool = False):
+        """
+        :param out: 输出的文本文件
+        :param font_size: 字号为 25(b站默认字号)的弹幕在 ass 中的字号
+        :param scroll_duration: 单行宽度的弹幕滚过整个画面所需的时间，决定了滚动速度
+        :param fixed_duration: 顶部、底部弹幕的显示时间
+        :param area: 滚动弹幕最多占用画面高度的比例
+        :param overlap: 轨道不够时是否允许重叠，不允许时丢弃
+        """
+        self.out = out
+        self.width = width
+        self.height = height
+        self.font_size = font_size
+        self.font_name = font_name
+        self.scroll_duration = scroll_duration
+        self.fixed_duration = fixed_duration
+        self.overlap = overlap
+        self.opacity = opacity
+        self.line_height = int(font_size * 1.2)
+        # 所有滚动弹幕速度相同，单位：像素/秒
+        self.speed = width / scroll_duration
+        # 同一轨道上相邻两条弹幕的最小间隔，单位：像素
+        self.gap = font_size
+        self.scroll_tracks = TrackAllocator(max(int(height * area) // self.line_height, 1))
+        self.top_tracks = TrackAllocator(max(height // 2 // self.line_height, 1))
+        self.bottom_tracks = TrackAllocator(max(height // 2 // self.line_height, 1))
+        self.written = 0
+        self.dropped = 0
+
+    def write_header(self):
+        alpha = int(round((1 - self.opacity) * 255))
+        self.out.write(
+            '[Script Info]\n'
+            'ScriptType: v4.00+\n'
+            f'PlayResX: {self.width}\n'
+            f'PlayResY: {self.height}\n'
+            'WrapStyle: 2\n'
+            'ScaledBorderAndShadow: yes\n'
+            '\n'
+            '[V4+ Styles]\n'
+            'Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, '
+            'Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, '
+            'Alignment, MarginL, MarginR, MarginV, Encoding\n'
+            f'Style: Danmu,{self.font_name},{self.font_size},&H{alpha:02X}FFFFFF,&H{alpha:02X}FFFFFF,'
+            f'&H{alpha:02X}000000,&H{alpha:02X}000000,0,0,0,0,100,100,0,0,1,1,0,7,0,0,0,1\n'
+            '\n'
+            '[Events]\n'
+            'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n')
+
+    def write_danmu(self, time: float, mode: int, size: int, color: int, content: str):
+        font_size = self.font_size * size // 25
+        tags = '' if size == 25 else f'\\fs{font_size}'
+        if color != 0xFFFFFF:
+            tags += f'\\c&H{color & 0xFF:02X}{color >> 8 & 0xFF:02X}{color >> 16 & 0xFF:02X}&'
+        width = text_width(content, font_size)
+
+        if mode == MODE_TOP or mode == MODE_BOTTOM:
+            end = time + self.fixed_duration
+            tracks = self.top_tracks if mode == MODE_TOP else self.bottom_tracks
+            track = self._allocate(tracks, time, end)
+            if track is None:
+                return
+            x = self.width // 2
+            if mode == MODE_TOP:
+                y = track * self.line_height
+            else:
+                y = self.height - (track + 1) * self.line_height
+            position = f'\\an8\\pos({x},{y})'
+        else:
+            end = time + (self.width + width) / self.speed
+            # 完全进入画面并留出间隔后，轨道可再次使用
+            track = self._allocate(self.scroll_tracks, time, time + (width + self.gap) / self.speed)
+            if track is None:
+                return
+            y = track * self.line_height
+            position = f'\\move({self.width},{y},{-int(width + 1)},{y})'
+
+        self.out.write(f'Dialogue: 0,{format_time(time)},{format_time(end)},Danmu,,0,0,0,,'
+                       f'{{{position}{tags}}}{escape(content)}\n')
+        self.written += 1
+
+    def _allocate(self, tracks: TrackAllocator, time, release):
+        track = tracks.allocate(time, release)
+        if track is None:
+            if not self.overlap:
+                self.dropped += 1
+                return None
+            # 允许重叠时使用最早空出的轨道
+            track = tracks.busy[0][1]
+            heapq.heapreplace(tracks.busy, (max(tracks.busy[0][0], release), track))
+        return track
+
+
+def convert(xml_path: str, ass_path: str = None, **kwargs) -> AssWriter:
+    """
+    将弹幕 xml 文件转为 ass 字幕，kwargs 为 AssWriter 的参数
+    :return: 转换使用的 AssWriter，可以查看写入和丢弃的数量
+    """
+    if ass_path is None:
+        ass_path = xml_path.rsplit('.', 1)[0] + '.ass'
+    with open(xml_path, 'r', encoding='UTF-8', errors='replace') as src, \
+            open(ass_path, 'w', encoding='UTF-8') as out:
+        writer = AssWriter(out, **kwargs)
+        writer.write_header()
+        for danmu in iter_danmu(src):
+            writer.write_danmu(*danmu)
+    return writer
+
+
+def _benchmark(count: int):
+    import os
+    import random
+    import sys
+    import tempfile
+    import time
+
+    rng = random.Random(0)
+    words = ['主播好', '666', '哈哈哈哈哈', '来了来了', 'awsl', '这波操作可以的', '？？？', '晚上好呀',
+             '前方高能', 'hello world', '笑死我了哈哈哈哈哈哈哈']
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = os.path.join(tmp, 'danmu.xml')
+        with open(xml_path, 'w', encoding='UTF-8') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n<i>\n')
+            second = 0.0
+            for i in range(count):
+                # 平均每秒 20 条，模拟热门直播间
+                second += rng.expovariate(20)
+                f.write(f'  <d p="{second:.2f},1,25,16777215,{int(second * 1000)},0,1602022773,0" '
+                        f'user="用户{i % 9999}">{rng.choice(words)}</d>\n')
+            f.write('</i>')
+        start = time.perf_counter()
+        writer = convert(xml_path)
+        cost = time.perf_counter() - start
+        size = os.path.getsize(os.path.join(tmp, 'danmu.ass'))
+    # 进程最大内存，Windows 没有 resource 模块，安装了 psutil 时使用 psutil，否则不统计
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            rss = getattr(info, 'peak_wset', info.rss)
+        except ImportError:
+            rss = None
+    memory = f'，进程最大内存 {rss / 1024 / 1024:.1f}MB' if rss is not None else ''
+    print(f'{count} 条弹幕({second / 3600:.1f} 小时)转换耗时 {cost:.2f}s，每秒 {count / cost:.0f} 条，'
+          f'写入 {writer.written} 条，轨道不足丢弃 {writer.dropped} 条，ass 文件 {size / 1024 / 1024:.1f}MB{memory}')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='将弹幕 xml 文件转为 ass 字幕')
+    parser.add_argument('files', nargs='*', help='弹幕 xml 文件')
+    parser.add_argument('-o', '--output', help='输出文件，只有一个输入文件时有效')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--font-size', type=int, default=48)
+    parser.add_argument('--duration', type=float, default=10, help='滚动弹幕滚过画面的时间')
+    parser.add_argument('--area', type=float, default=1, help='滚动弹幕最多占用画面高度的比例')
+    parser.add_argument('--overlap', action='store_true', help='轨道不够时允许重叠')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='生成 N 条弹幕测试转换速度')
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.benchmark)
+    for file in args.files:
+        w = convert(file, args.output if len(args.files) == 1 else None, width=args.width, height=args.height,
+                    font_size=args.font_size, scroll_duration=args.duration, area=args.area,
+                    overlap=args.overlap)
+        print(f'{file}: 写入 {w.written} 条弹幕，轨道不足丢弃 {w.dropped} 条')
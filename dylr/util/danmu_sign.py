@@ -0,0 +1,231 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 弹幕 websocket 地址的 signature 参数生成
+        python: 纯 python 实现 webmssdk.js 中的 get_sign，不需要 js 引擎
+        quickjs: 预先加载好 webmssdk.js 的 quickjs 上下文池，每次签名只需调用一次 get_sign
+        jsengine: 原来的方式，每次签名都重新读取并执行 webmssdk.js，在没有安装 quickjs 时使用
+        用法: python -m dylr.util.danmu_sign [签名次数]  (从项目根目录运行，
+              对比 python 实现与 js 的结果(需要安装 quickjs)，以及各方式的速度)
+"""
+import hashlib
+import itertools
+import math
+import os
+import queue
+import random
+import threading
+
+sdk_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webmssdk.js')
+_sdk_code = None
+
+
+def get_sdk_code(user_agent: str) -> str:
+    """ webmssdk.js 及其需要的浏览器环境，文件只读取一次 """
+    global _sdk_code
+    if _sdk_code is None:
+        with open(sdk_path, 'r', encoding='utf-8') as f:
+            _sdk_code = f.read()
+    js_dom = f"""
+document = {{}}
+window = {{}}
+navigator = {{
+  'userAgent': '{user_agent}'
+}}
+""".strip()
+    return js_dom + _sdk_code
+
+
+class QuickJSSignPool:
+    """
+    quickjs 的上下文不能被多个线程使用，quickjs.Function 会为每个上下文创建一个专用线程执行
+    因此池中每个上下文各有一个线程，最多 size 个签名同时进行
+    """
+
+    def __init__(self, user_agent: str, size: int):
+        self.user_agent = user_agent
+        self.size = size
+        self.created = 0
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+
+    def get_sign(self, stub: str) -> str:
+        func = self._acquire()
+        try:
+            return func(stub)
+        finally:
+            self.idle.put(func)
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if not create:
+            return self.idle.get()
+        import quickjs
+        try:
+            return quickjs.Function('get_sign', get_sdk_code(self.user_agent), own_executor=True)
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+
+# get_sign 返回 webmssdk.js 中 frontierSign 的 X-Bogus，结构为:
+# 1 字节标志 + 1 字节随机密钥 + RC4(9 字节明文 + 1 字节异或校验)，再用自定义码表 base64 编码
+_S1_ALPHABET = 'Dkdpgh4ZKsQB80/Mfvw36XI1R25+WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe'
+# 明文中的固定内容，在 webmssdk.js 运行的模拟环境(document、window 均为空对象)中不变
+_ENV_CODE = 1
+_BOGUS_FLAG = 1
+_UB_CODE = 14
+# 没有 body，body 的摘要固定为 md5(md5(''))
+_EMPTY_BODY_HASH = hashlib.md5(hashlib.md5(b'').digest()).digest()[14:16]
+# 签名计数，对应 js 中每次调用都会加一的 bogusIndex
+_sign_counter = itertools.count(1)
+# 密钥只有 1 字节，10 字节明文对应的 RC4 密钥流按密钥缓存
+_keystreams = {}
+
+
+def _rc4_keystream(key: int, length: int = 10) -> bytes:
+    s = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + s[i] + key) & 0xFF
+        s[i], s[j] = s[j], s[i]
+    stream = bytearray()
+    i = j = 0
+    for _ in range(length):
+        i = (i + 1) & 0xFF
+        j = (j + s[i]) & 0xFF
+        s[i], s[j] = s[j], s[i]
+        stream.append(s[(s[i] + s[j]) & 0xFF])
+    return bytes(stream)
+
+
+def python_sign(stub: str, counter: int = None, rng=random) -> str:
+    """
+    纯 python 实现的 get_sign
+    :param stub: url_utils.get_ms_stub 生成的 X-MS-STUB
+    :param counter: 签名计数，不传则使用进程内的计数
+    :param rng: 随机数来源，调用 random() 的顺序与 js 中 Math.random 相同，用于和 js 对比
+    """
+    if counter is None:
+        counter = next(_sign_counter)
+    flag = _BOGUS_FLAG << 6 | (1 & math.floor(100 * rng.random())) << 4
+    stub_hash = hashlib.md5(bytes.fromhex(stub)).digest()
+    plain = [counter & 0x3F, _ENV_CODE >> 8 & 0xFF, 1, _UB_CODE,
+             _EMPTY_BODY_HASH[0], _EMPTY_BODY_HASH[1], stub_hash[14], stub_hash[15],
+             0xFF & math.floor(255 * rng.random())]
+    check = 0
+    for b in plain:
+        check ^= b
+    plain.append(check)
+    key = 0xFF & math.floor(255 * rng.random())
+    keystream = _keystreams.get(key)
+    if keystream is None:
+        keystream = _keystreams[key] = _rc4_keystream(key)
+    data = bytes([flag, key]) + bytes(b ^ k for b, k in zip(plain, keystream))
+    result = []
+    for i in range(0, len(data), 3):
+        n = data[i] << 16 | data[i + 1] << 8 | data[i + 2]
+        result.append(_S1_ALPHABET[n >> 18] + _S1_ALPHABET[n >> 12 & 0x3F] +
+                      _S1_ALPHABET[n >> 6 & 0x3F] + _S1_ALPHABET[n & 0x3F])
+    return ''.join(result)
+
+
+def jsengine_sign(user_agent: str, stub: str) -> str:
+    import jsengine
+    ctx = jsengine.jsengine()
+    ctx.eval(get_sdk_code(user_agent))
+    return ctx.eval(f"get_sign('{stub}')")
+
+
+def quickjs_available() -> bool:
+    try:
+        import quickjs
+        return True
+    except ImportError:
+        return False
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_sign(user_agent: str, stub: str, backend: str = 'quickjs', pool_size: int = 2) -> str:
+    """
+    生成 signature
+    :param user_agent: 请求弹幕时使用的 UA
+    :param stub: url_utils.get_ms_stub 生成的 X-MS-STUB
+    :param backend: python、quickjs 或 jsengine，quickjs 未安装时使用 jsengine
+    :param pool_size: quickjs 上下文池的大小
+    """
+    if backend == 'python':
+        return python_sign(stub)
+    if backend == 'quickjs' and quickjs_available():
+        with _pools_lock:
+            pool = _pools.get(user_agent)
+            if pool is None:
+                pool = _pools[user_agent] = QuickJSSignPool(user_agent, pool_size)
+        return pool.get_sign(stub)
+    return jsengine_sign(user_agent, stub)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from types import SimpleNamespace
+
+    from dylr.util import url_utils
+
+    ua = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) ' \
+         'Chrome/116.0.0.0 Safari/537.36'
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    stubs = [url_utils.get_ms_stub(random.randint(7000000000000000000, 7999999999999999999),
+                                   random.randint(7300000000000000000, 7999999999999999999))
+             for _ in range(rounds)]
+
+    if quickjs_available():
+        import quickjs
+
+        # 对比时替换 js 的 Math.random，使两边使用相同的随机数
+        ctx = quickjs.Context()
+        ctx.eval('var __randoms = []; Math.random = function () { return __randoms.shift(); };')
+        ctx.eval(get_sdk_code(ua))
+        start = time.perf_counter()
+        for i, stub in enumerate(stubs):
+            randoms = [random.random() for _ in range(3)]
+            ctx.eval(f'__randoms = {randoms!r};')
+            expected = ctx.eval(f"get_sign('{stub}')")
+            actual = python_sign(stub, counter=i + 1, rng=SimpleNamespace(random=iter(randoms).__next__))
+            if actual != expected:
+                print(f'结果不一致: stub={stub} randoms={randoms} js={expected} python={actual}')
+                sys.exit(1)
+        print(f'{rounds} 个随机 stub 与 js 结果一致，耗时 {time.perf_counter() - start:.1f}s')
+    else:
+        print('未安装 quickjs，跳过与 js 的对比')
+
+    def bench(name, func, number):
+        start = time.perf_counter()
+        for stub in stubs[:number]:
+            func(stub)
+        cost = time.perf_counter() - start
+        print(f'{name}: {number} 次签名耗时 {cost:.3f}s，每次 {cost / number * 1000:.3f}ms')
+
+    bench('python', python_sign, rounds)
+    if quickjs_available():
+        # 第一次签名包含加载脚本的时间
+        start = time.perf_counter()
+        get_sign(ua, stubs[0], 'quickjs', 1)
+        print(f'quickjs: 首次签名(加载脚本)耗时 {(time.perf_counter() - start) * 1000:.1f}ms')
+        bench('quickjs', lambda stub: get_sign(ua, stub, 'quickjs', 1), min(rounds, 2000))
+    try:
+        bench('jsengine', lambda stub: jsengine_sign(ua, stub), 20)
+    except ImportError:
+        print('jsengine: 未安装')
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: 进程内共享的 http 连接池
+        所有 api 请求共用一个 requests.Session，同一 host 的 TCP/TLS 连接会被保持并复用，避免每次检测都重新握手
+"""
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from dylr.core import config
+
+_session = None
+_lock = threading.Lock()
+# 连接复用统计，host -> 次数
+_request_counts = {}
+_connect_counts = {}
+
+
+def _count(counts: dict, host):
+    with _lock:
+        counts[host] = counts.get(host, 0) + 1
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _count(_connect_counts, self.host)
+        super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count(_connect_counts, self.host)
+        super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _PoolAdapter(HTTPAdapter):
+    """ 统计每次真正建立连接(包括服务器断开后重连)的 HTTPAdapter """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+def get_session() -> requests.Session:
+    """ 获取共享的 Session，第一次调用时按配置创建，因此应在读取配置后再调用 """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+
+def _create_session() -> requests.Session:
+    s = requests.Session()
+    # cookie 均通过请求头手动传入，不让 Session 保存响应中的 cookie，以免影响其他请求
+    s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    retry = Retry(total=config.get_http_max_retries(), read=False, status=False,
+                  backoff_factor=0.3, raise_on_status=False)
+    adapter = _PoolAdapter(pool_connections=config.get_http_pool_connections(),
+                           pool_maxsize=config.get_http_pool_maxsize(),
+                           max_retries=retry)
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    return s
+
+
+def get(url, **kwargs) -> requests.Response:
+    _count(_request_counts, urlparse(url).hostname)
+    return get_session().get(url, **kwargs)
+
+
+def head(url, **kwargs) -> requests.Response:
+    _count(_request_counts, urlparse(url).hostname)
+    return get_session().head(url, **kwargs)
+
+
+def post(url, data=None, **kwargs) -> requests.Response:
+    _count(_request_counts, urlparse(url).hostname)
+    return get_session().post(url, data=data, **kwargs)
+
+
+def get_stats() -> dict:
+    """ 获取连接复用情况，key 为 host，value 为 (请求数, 建立连接数) """
+    with _lock:
+        return {host: (num, _connect_counts.get(host, 0)) for host, num in _request_counts.items()}
+
+
+def get_stats_str() -> str:
+    texts = []
+    for host, (requests_num, connections_num) in get_stats().items():
+        reuse = max(1 - connections_num / requests_num, 0) if requests_num else 0
+        texts.append(f'{host}: {requests_num} 次请求, {connections_num} 次建立连接, 复用率 {reuse:.1%}')
+    return '; '.join(texts) if texts else '暂无请求'
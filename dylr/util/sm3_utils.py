@@ -0,0 +1,131 @@
+# coding=utf-8
+"""
+:author: Lyzen
+:date: 2026.10.18
+:brief: SM3 哈希，输入输出均为 bytes
+        优先使用 hashlib(OpenSSL) 的 sm3，不支持时使用纯 python 实现，也可以切换回 gmssl
+        运行本文件可对比各实现的速度
+"""
+import hashlib
+import struct
+
+# 标准测试向量 (GB/T 32905-2016 附录 A)，以及空输入
+KNOWN_ANSWERS = (
+    (b'abc', '66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0'),
+    (b'abcd' * 16, 'debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732'),
+    (b'', '1ab21d8355cfa17f8e61194831e81a8f22bec8c728fefb747ed035eb5082aa2b'),
+)
+
+_IV = (0x7380166F, 0x4914B2B9, 0x172442D7, 0xDA8A0600, 0xA96F30BC, 0x163138AA, 0xE38DEE4D, 0xB0FB0E4E)
+
+
+def _rotl(x, n):
+    n %= 32
+    return ((x << n) | (x >> (32 - n))) & 0xFFFFFFFF
+
+
+# 每轮的常量 T_j <<< j，提前计算好
+_T = tuple(_rotl(0x79CC4519 if j < 16 else 0x7A879D8A, j) for j in range(64))
+
+
+def _compress(v, block):
+    w = list(struct.unpack('>16I', block))
+    for j in range(16, 68):
+        x = w[j - 16] ^ w[j - 9]
+        y = w[j - 3]
+        x ^= ((y << 15) | (y >> 17)) & 0xFFFFFFFF
+        # P1(x) = x ^ (x <<< 15) ^ (x <<< 23)
+        x ^= (((x << 15) | (x >> 17)) ^ ((x << 23) | (x >> 9))) & 0xFFFFFFFF
+        y = w[j - 13]
+        w.append(x ^ (((y << 7) | (y >> 25)) & 0xFFFFFFFF) ^ w[j - 6])
+
+    a, b, c, d, e, f, g, h = v
+    for j in range(64):
+        a12 = ((a << 12) | (a >> 20)) & 0xFFFFFFFF
+        ss1 = (a12 + e + _T[j]) & 0xFFFFFFFF
+        ss1 = ((ss1 << 7) | (ss1 >> 25)) & 0xFFFFFFFF
+        ss2 = ss1 ^ a12
+        if j < 16:
+            ff = a ^ b ^ c
+            gg = e ^ f ^ g
+        else:
+            ff = (a & b) | (a & c) | (b & c)
+            gg = (e & f) | (~e & g)
+        tt1 = (ff + d + ss2 + (w[j] ^ w[j + 4])) & 0xFFFFFFFF
+        tt2 = (gg + h + ss1 + w[j]) & 0xFFFFFFFF
+        d = c
+        c = ((b << 9) | (b >> 23)) & 0xFFFFFFFF
+        b = a
+        a = tt1
+        h = g
+        g = ((f << 19) | (f >> 13)) & 0xFFFFFFFF
+        f = e
+        # P0(x) = x ^ (x <<< 9) ^ (x <<< 17)
+        e = (tt2 ^ ((tt2 << 9) | (tt2 >> 23)) ^ ((tt2 << 17) | (tt2 >> 15))) & 0xFFFFFFFF
+
+    return (a ^ v[0], b ^ v[1], c ^ v[2], d ^ v[3], e ^ v[4], f ^ v[5], g ^ v[6], h ^ v[7])
+
+
+def python_sm3(data: bytes) -> bytes:
+    """ 纯 python 实现 """
+    length = len(data)
+    data = bytes(data) + b'\x80' + b'\x00' * ((55 - length) % 64) + struct.pack('>Q', length * 8)
+    v = _IV
+    for i in range(0, len(data), 64):
+        v = _compress(v, data[i:i + 64])
+    return struct.pack('>8I', *v)
+
+
+def hashlib_sm3(data: bytes) -> bytes:
+    """ OpenSSL 实现，需要 python 链接的 OpenSSL 支持 sm3 """
+    return hashlib.new('sm3', data).digest()
+
+
+def gmssl_sm3(data: bytes) -> bytes:
+    """ gmssl 实现，即原来 abogus 使用的方式 """
+    from gmssl import sm3, func
+    return bytes.fromhex(sm3.sm3_hash(func.bytes_to_list(data)))
+
+
+backends = {
+    'hashlib': hashlib_sm3,
+    'python': python_sm3,
+    'gmssl': gmssl_sm3,
+}
+
+
+def check_backend(func) -> bool:
+    """ 使用标准测试向量检查实现是否正确 """
+    try:
+        return all(func(data).hex() == digest for data, digest in KNOWN_ANSWERS)
+    except Exception:  # hashlib 不支持 sm3 时抛出 ValueError，gmssl 未安装时抛出 ImportError
+        return False
+
+
+def set_backend(name: str):
+    """ 切换 SM3 实现，name 为 backends 中的 key """
+    global backend, sm3_digest
+    if not check_backend(backends[name]):
+        raise ValueError(f'sm3 backend {name} is not available')
+    backend = name
+    sm3_digest = backends[name]
+
+
+backend = 'hashlib' if check_backend(hashlib_sm3) else 'python'
+# 计算 SM3 摘要，返回 32 字节的 bytes
+sm3_digest = backends[backend]
+
+
+if __name__ == '__main__':
+    import timeit
+
+    sample = b'aid=6383&app_name=douyin_web&live_id=1&device_platform=web&web_rid=123456789&msToken=' + b'a' * 188
+    for name, func in backends.items():
+        if not check_backend(func):
+            print(f'{name}: 不可用')
+            continue
+        assert func(sample) == python_sm3(sample)
+        number = 2000
+        cost = timeit.timeit(lambda: func(sample), number=number)
+        print(f'{name}: 测试向量通过，{number} 次 {len(sample)} 字节哈希耗时 {cost:.3f}s，'
+              f'每次 {cost / number * 1e6:.1f}us')
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+测试启动时导入模块的耗时和内存占用
+每次都在新的 python 进程中使用 -X importtime 导入，取多次运行的中位数，并列出耗时最多的模块
+用法: python scripts/import_benchmark.py [模块 ...] [--runs 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只在需要时才应该加载的模块
+HEAVY_MODULES = ['google.protobuf', 'dylr.core.dy_pb2', 'tkinter', 'jsengine', 'quickjs', 'websocket',
+                 'dylr.core.danmu_recorder']
+
+# 进程最大内存，单位：KB，Windows 没有 resource 模块，安装了 psutil 时使用 psutil，否则输出 -1 不统计
+CHILD_CODE = """
+import sys
+import {module}
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+except ImportError:
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        rss = getattr(info, 'peak_wset', info.rss) // 1024
+    except ImportError:
+        rss = -1
+print(rss)
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def run_once(module, cwd):
+    """
+    :return: (每个模块的累计导入耗时(微秒), 进程最大内存(KB)，无法获取时为 None, 已加载的重量级模块)
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    r = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD_CODE.format(module=module, heavy=HEAVY_MODULES)],
+                       capture_output=True, text=True, cwd=cwd, env=env)
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr[-2000:])
+    times = {}
+    for line in r.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    lines = r.stdout.split('\n')
+    rss = int(lines[0])
+    return times, rss if rss >= 0 else None, [m for m in lines[1].split(',') if m]
+
+
+def benchmark(module, runs, top):
+    # 在临时目录中运行，避免在项目中生成日志文件
+    with tempfile.TemporaryDirectory() as cwd:
+        results = [run_once(module, cwd) for _ in range(runs)]
+    total = statistics.median(r[0].get(module, 0) for r in results) / 1000
+    if results[0][1] is not None:
+        rss = statistics.median(r[1] for r in results) / 1024
+        print(f'{module}: 导入耗时 {total:.1f}ms，进程内存 {rss:.1f}MB(中位数，{runs} 次)')
+    else:
+        print(f'{module}: 导入耗时 {total:.1f}ms(中位数，{runs} 次)，没有 resource 模块和 psutil，不统计内存')
+    print(f'    已加载的重量级模块: {", ".join(results[0][2]) or "无"}')
+    slowest = sorted(results[0][0].items(), key=lambda kv: -kv[1])
+    slowest = [(name, t) for name, t in slowest if name != module and not name.startswith(module + '.')][:top]
+    for name, t in slowest:
+        print(f'    {t / 1000:8.1f}ms  {name}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='测试导入模块的耗时和内存占用')
+    parser.add_argument('modules', nargs='*', default=['dylr.core.app', 'dylr.core.danmu_recorder'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='列出累计耗时最多的模块数量')
+    args = parser.parse_args()
+    for m in args.modules:
+        benchmark(m, args.runs, args.top)
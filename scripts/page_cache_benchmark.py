@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+模拟同时录制多个直播间，比较开启 video_page_cache 前后的进程内存、系统页缓存和脏页
+每个直播间一个写入线程，以固定码率写入临时目录，每 0.5 秒读取一次 /proc/meminfo 和 /proc/self/status
+仅支持 Linux，结果受其他进程和内核脏页参数(vm.dirty_*)影响
+用法: python scripts/page_cache_benchmark.py [--streams 20] [--rate 1] [--seconds 60] [--sync-interval 8] [--dir 目录]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dylr.core.video_writer import VideoWriter, PageCacheFile, page_cache_supported
+
+
+def meminfo():
+    """ :return: {名称: KB} """
+    res = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            name, value = line.split(':')
+            res[name] = int(value.split()[0])
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                res['VmRSS'] = int(line.split()[1])
+    return res
+
+
+def stream(path, page_cache, rate, seconds, sync_interval, stop):
+    block = os.urandom(256 * 1024)
+    file = open(path, 'wb')
+    if page_cache:
+        file = PageCacheFile(file, sync_interval)
+    writer = VideoWriter(file, 8 * 1024 * 1024, name=os.path.basename(path))
+    interval = len(block) / rate
+    next_time = time.perf_counter()
+    end = next_time + seconds
+    while next_time < end and not stop.is_set():
+        writer.write(block)
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    writer.close()
+    stream.latency.append(writer.metrics['max_write_latency'])
+
+
+def run(page_cache, args):
+    stream.latency = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        os.sync()
+        base = meminfo()
+        stop = threading.Event()
+        threads = [threading.Thread(target=stream, args=(os.path.join(tmp, f'{i}.flv'), page_cache,
+                                                         args.rate * 1024 * 1024, args.seconds,
+                                                         args.sync_interval * 1024 * 1024, stop))
+                   for i in range(args.streams)]
+        for t in threads:
+            t.start()
+        peak = {'Dirty': 0, 'Writeback': 0, 'Cached': 0, 'VmRSS': 0}
+        while any(t.is_alive() for t in threads):
+            info = meminfo()
+            for k in peak:
+                value = info[k] - base[k] if k == 'Cached' else info[k]
+                peak[k] = max(peak[k], value)
+            time.sleep(0.5)
+        info = meminfo()
+    total = args.streams * args.rate * args.seconds
+    print(f'{"开启" if page_cache else "关闭"} video_page_cache，共写入 {total}MB:')
+    print(f'    峰值  脏页 {peak["Dirty"] / 1024:.0f}MB，回写中 {peak["Writeback"] / 1024:.0f}MB，'
+          f'页缓存增加 {peak["Cached"] / 1024:.0f}MB，进程内存 {peak["VmRSS"] / 1024:.0f}MB')
+    print(f'    结束时页缓存增加 {(info["Cached"] - base["Cached"]) / 1024:.0f}MB，'
+          f'单次写入最长 {max(stream.latency) * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比较开启 video_page_cache 前后的内存和页缓存占用')
+    parser.add_argument('--streams', type=int, default=20, help='同时录制的直播间数量')
+    parser.add_argument('--rate', type=int, default=1, help='每个直播间的码率，单位：MB/s')
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--sync-interval', type=int, default=8, help='同 video_sync_interval，单位：MB')
+    parser.add_argument('--dir', default=None, help='写入的目录，应与录制目录在同一磁盘，默认为系统临时目录')
+    args = parser.parse_args()
+    if not sys.platform.startswith('linux') or not page_cache_supported():
+        print('仅支持 Linux')
+        sys.exit(1)
+    run(False, args)
+    run(True, args)
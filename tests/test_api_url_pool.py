@@ -0,0 +1,67 @@
+# coding=utf-8
+"""
+预签名地址池的后台签名次数不应随检测次数增长
+用法: python -m pytest tests  或  python tests/test_api_url_pool.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dylr.core.app
+from dylr.core import config
+from dylr.core.api_url_pool import ApiUrlPool
+
+
+def test_signing_stays_flat_under_repeated_get():
+    saved = dict(config.configs)
+    max_age = 0.5
+    config.configs['api_url_max_age'] = max_age
+    config.configs['api_url_pool_size'] = 1
+    rooms = [str(i) for i in range(8)]
+    signs = []
+    lock = threading.Lock()
+
+    def build(room_id):
+        with lock:
+            signs.append(time.monotonic())
+        return f'url-{room_id}'
+
+    pool = ApiUrlPool(build)
+    try:
+        start = time.monotonic()
+        windows = 6
+        heap_sizes = []
+        # 模拟检测: 每 0.1 秒检测一遍所有直播间
+        while time.monotonic() - start < windows * max_age:
+            for room in rooms:
+                assert pool.get(room) == f'url-{room}'
+            heap_sizes.append(len(pool.expire_heap))
+            time.sleep(0.1)
+    finally:
+        pool.stop()
+        config.configs.clear()
+        config.configs.update(saved)
+    with lock:
+        counts = [sum(1 for t in signs if start + i * max_age <= t < start + (i + 1) * max_age)
+                  for i in range(windows)]
+    # 每个直播间每次检测最多补充一个地址，后台签名次数应与检测次数成正比，而不是逐渐增加
+    checks_per_window = max_age / 0.1 * len(rooms)
+    assert max(counts[1:]) <= checks_per_window * 1.5, counts
+    assert counts[-1] <= counts[1] * 1.5 + len(rooms), counts
+    assert max(heap_sizes) <= 2 * len(rooms) + 64, heap_sizes
+    assert len(pool.deadlines) <= len(rooms)
+    assert not pool.thread.is_alive()
+
+
+def test_default_max_age_outlasts_check_period():
+    # 默认配置下，检测间隔内不会在取用前替换地址
+    refresh = config.get_api_url_max_age() * ApiUrlPool.refresh_ratio
+    assert refresh >= config.get_check_period() + config.get_check_period_random_offset()
+
+if __name__ == '__main__':
+    test_signing_stays_flat_under_repeated_get()
+    test_default_max_age_outlasts_check_period()
+    print('ok')
@@ -0,0 +1,55 @@
+# coding=utf-8
+"""
+导出弹幕原始数据: 不覆盖录制的 xml，并且与录制时一样去除重复推送的消息
+用法: python -m pytest tests  或  python tests/test_danmu_capture.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dylr.core.app
+from dylr.core import danmu_capture
+from dylr.core.danmu_decoder import DanmuDecoder, MessageDedupe, build_sample_frames
+
+
+def _write_capture(path, frames, start_time=1700000000.0):
+    with open(path, 'wb') as f:
+        f.write(danmu_capture.file_header(start_time))
+        for i, frame in enumerate(frames):
+            f.write(danmu_capture.pack_frame(start_time + i, frame))
+
+
+def test_export_dedupes_and_keeps_live_xml():
+    frames = build_sample_frames(20)
+    expected = 0
+    decoder = DanmuDecoder(dedupe=MessageDedupe())
+    for frame in frames:
+        expected += len(decoder.decode(frame)[3])
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, '20260101_120000' + danmu_capture.EXTENSION)
+        live_xml = os.path.join(tmp, '20260101_120000.xml')
+        with open(live_xml, 'w', encoding='UTF-8') as f:
+            f.write('live')
+        # 重连后服务器再次推送断开前的 5 个数据包
+        _write_capture(raw, frames[:10] + frames[5:10] + frames[10:])
+
+        out = danmu_capture.export(raw, 'xml', workers=2, batch_size=4)
+        assert out != live_xml
+        with open(live_xml, encoding='UTF-8') as f:
+            assert f.read() == 'live'
+        with open(out, encoding='UTF-8') as f:
+            assert f.read().count('<d p=') == expected
+
+        out = danmu_capture.export(raw, 'jsonl', workers=2, batch_size=4)
+        with open(out, encoding='UTF-8') as f:
+            items = [json.loads(line) for line in f]
+        chats = [item for item in items if item['method'] == 'WebcastChatMessage']
+        assert len(chats) == expected
+
+
+if __name__ == '__main__':
+    test_export_dedupes_and_keeps_live_xml()
+    print('ok')
@@ -0,0 +1,44 @@
+# coding=utf-8
+"""
+直播间数据统计: 最后不满一个周期的一行按实际经过的时间计算速率
+用法: python -m pytest tests  或  python tests/test_danmu_stats.py
+"""
+import csv
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dylr.core.app
+from dylr.core import danmu_stats
+from dylr.core.danmu_decoder import DanmuDecoder, CHAT_METHOD, build_sample_frames
+
+
+def test_last_partial_period_uses_elapsed_time():
+    decoder = DanmuDecoder((CHAT_METHOD,))
+    chats = []
+    for frame in build_sample_frames(10):
+        chats.extend(decoder.decode(frame)[3])
+    start = 1700000000.0
+    interval = danmu_stats.DanmuStats.interval
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'a.stats.csv')
+        stats = danmu_stats.DanmuStats(filename, start)
+        # 一个完整周期，然后 4 秒的部分周期
+        for method, payload in chats:
+            stats.on_message(start + 1, method, payload)
+        for method, payload in chats:
+            stats.on_message(start + interval, method, payload)
+        stats.close(start + interval + 4)
+        with open(filename, encoding='UTF-8') as f:
+            rows = list(csv.DictReader(f))
+    assert len(rows) == 2
+    assert float(rows[0]['chats_per_sec']) == round(len(chats) / interval, 2)
+    assert float(rows[1]['chats_per_sec']) == round(len(chats) / 4, 2)
+    assert rows[1]['seconds'] == str(interval + 4)
+
+
+if __name__ == '__main__':
+    test_last_partial_period_uses_elapsed_time()
+    print('ok')
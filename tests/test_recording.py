@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+直播结束后，等弹幕文件全部写入并关闭才寻找高光片段；只保存原始数据时先导出为 xml
+用法: python -m pytest tests  或  python tests/test_recording.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dylr.core.app
+from dylr.core import config, danmu_capture, highlight
+from dylr.core.danmu_decoder import build_sample_frames
+from dylr.core.recording import Recording
+
+
+class _Room:
+    room_name = 'test'
+    room_id = '1'
+    record_danmu = True
+
+
+def test_highlight_waits_for_danmu_close():
+    saved = dict(config.configs)
+    old_start = highlight.start_highlight
+    started = []
+    config.configs['highlight'] = True
+    highlight.start_highlight = lambda room_name, start, end: started.append((room_name, start, end))
+    try:
+        recording = Recording(_Room())
+        recording.session_start = 1000.0
+        recording.danmu_recorder = object()
+        recording.on_session_end()
+        assert started == []
+        recording._on_danmu_closed()
+        assert started == [('test', 1000.0, recording.session_end)]
+
+        # 弹幕先结束，直播结束时立即处理
+        recording = Recording(_Room())
+        recording.session_start = 1000.0
+        recording.danmu_recorder = object()
+        recording._on_danmu_closed()
+        assert len(started) == 1
+        recording.on_session_end()
+        assert len(started) == 2
+    finally:
+        config.configs.clear()
+        config.configs.update(saved)
+        highlight.start_highlight = old_start
+
+
+def test_process_exports_raw_capture():
+    start = time.mktime(time.strptime('20260101_120000', '%Y%m%d_%H%M%S'))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('download/test')
+            with open('download/test/20260101_120000' + danmu_capture.EXTENSION, 'wb') as f:
+                f.write(danmu_capture.file_header(start))
+                for i, frame in enumerate(build_sample_frames(20)):
+                    f.write(danmu_capture.pack_frame(start + i, frame))
+            highlight.process('test', start, start + 60, clip=False)
+            assert os.path.exists('download/test/20260101_120000.export.xml')
+            assert os.path.exists('download/test/20260101_120000.export.highlights.csv')
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    test_highlight_waits_for_danmu_close()
+    test_process_exports_raw_capture()
+    print('ok')
@@ -0,0 +1,89 @@
+# coding=utf-8
+"""
+直播流写入文件: 压缩过的(Content-Encoding)直播流要解压后再写入
+用法: python -m pytest tests  或  python tests/test_video_ingest.py
+"""
+import gzip
+import http.server
+import io
+import os
+import sys
+import threading
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dylr.core.app
+from dylr.core import flv, video_ingest, video_writer
+
+DATA = flv.sample_stream(10)
+
+
+def _serve(encoding, chunked):
+    body = gzip.compress(DATA) if encoding == 'gzip' else DATA
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' if chunked else 'HTTP/1.0'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/x-flv')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(body), 65536):
+                data = body[i:i + 65536]
+                self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n' if chunked else data)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _download(encoding, chunked, ring_buffer):
+    server = _serve(encoding, chunked)
+    try:
+        resp = requests.get(f'http://127.0.0.1:{server.server_address[1]}/live.flv', stream=True, timeout=(5, 10))
+        out = io.BytesIO()
+        file = video_writer.VideoWriter(out, 1024 * 1024) if ring_buffer else out
+        res = video_ingest.copy_stream(resp, file, lambda: False, 16 * 1024, use_splice=False)
+        if ring_buffer:
+            file.flush()
+        data = out.getvalue()
+        if ring_buffer:
+            file.close()
+        resp.close()
+    finally:
+        server.shutdown()
+    return res, data
+
+
+def test_encoded_stream_is_decoded():
+    for chunked in (False, True):
+        for ring_buffer in (False, True):
+            res, data = _download('gzip', chunked, ring_buffer)
+            assert res == video_ingest.FINISHED
+            assert data == DATA, (chunked, ring_buffer, data[:4])
+
+
+def test_plain_stream():
+    for chunked in (False, True):
+        for ring_buffer in (False, True):
+            res, data = _download('', chunked, ring_buffer)
+            assert res == video_ingest.FINISHED
+            assert data == DATA, (chunked, ring_buffer)
+
+
+if __name__ == '__main__':
+    test_encoded_stream_is_decoded()
+    test_plain_stream()
+    print('ok')
@@ -0,0 +1,132 @@
+# coding=utf-8
+"""
+视频写入失败时不能当作直播流结束，并且总要通知插件、再次检测是否在直播
+用法: python -m pytest tests  或  python tests/test_video_recorder.py
+"""
+import errno
+import http.server
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dylr.core.app
+from dylr.core import config, flv, video_recorder
+from dylr.core.video_recorder import VideoRecorder
+from dylr.plugin import plugin
+
+
+class _Room:
+    room_name = 'test'
+    room_id = '1'
+
+
+class _RoomInfo:
+    def __init__(self, url):
+        self.url = url
+
+    def get_stream_url(self):
+        return self.url
+
+
+class _Recording:
+    def __init__(self):
+        self.refreshed = 0
+
+    def refresh_video_recorder(self):
+        self.refreshed += 1
+
+
+class _FailingFile:
+    def __init__(self, error):
+        self.error = error
+
+    def write(self, data):
+        raise self.error
+
+    def close(self):
+        pass
+
+
+def _serve(data):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/x-flv')
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _record(error, ring_buffer):
+    """ :return: (传给 _end_recording 的写入错误, on_live_end 调用次数, refresh 次数) """
+    server = _serve(flv.sample_stream(20))
+    saved = dict(config.configs)
+    old_open, old_end, old_live_end = VideoRecorder._open_file, VideoRecorder._end_recording, plugin.on_live_end
+    old_delay, cwd = video_recorder.WRITE_ERROR_RETRY_DELAY, os.getcwd()
+    ended = []
+    errors = []
+
+    def end_recording(self, filename, write_error):
+        errors.append(write_error)
+        old_end(self, filename, write_error)
+
+    config.configs.update({'video_ring_buffer': ring_buffer, 'video_fix_flv': False, 'video_splice': False})
+    VideoRecorder._open_file = staticmethod(lambda filename: _FailingFile(error))
+    VideoRecorder._end_recording = end_recording
+    video_recorder.WRITE_ERROR_RETRY_DELAY = 0
+    plugin.on_live_end = lambda room, f: ended.append(f)
+    recording = _Recording()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            url = f'http://127.0.0.1:{server.server_address[1]}/live.flv'
+            VideoRecorder(_Room(), _RoomInfo(url), recording).start_recording('download/test/a.flv')
+    finally:
+        os.chdir(cwd)
+        config.configs.clear()
+        config.configs.update(saved)
+        VideoRecorder._open_file, VideoRecorder._end_recording = old_open, old_end
+        plugin.on_live_end = old_live_end
+        video_recorder.WRITE_ERROR_RETRY_DELAY = old_delay
+        server.shutdown()
+    return errors, len(ended), recording.refreshed
+
+
+def test_writer_os_error_is_not_end_of_stream():
+    disk_full = OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    errors, ended, refreshed = _record(disk_full, 1)
+    assert errors == [disk_full]
+    assert ended == 1 and refreshed == 1
+
+
+def test_direct_write_os_error_is_not_end_of_stream():
+    disk_full = OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    errors, ended, refreshed = _record(disk_full, 0)
+    assert errors == [disk_full]
+    assert ended == 1 and refreshed == 1
+
+
+def test_write_exception_still_ends_recording():
+    bug = ValueError('bad tag')
+    errors, ended, refreshed = _record(bug, 0)
+    assert errors == [bug]
+    assert ended == 1 and refreshed == 1
+
+
+if __name__ == '__main__':
+    test_writer_os_error_is_not_end_of_stream()
+    test_direct_write_os_error_is_not_end_of_stream()
+    test_write_exception_still_ends_recording()
+    print('ok')